@@ -1,102 +1,390 @@
+import asyncio
 import os
 import json
-import google.generativeai as genai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 
-def configure_genai():
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        print("Warning: GOOGLE_API_KEY not found in environment variables")
-        return
-    genai.configure(api_key=api_key)
+from plan_cache import PLAN_CACHE, plan_cache_key
+from rule_planner import plan_mitigation
+from llm_client import LLMOverloaded, get_llm_client
+from plan_stream import PlanStreamParser
+
+# Prompt size limit, estimated at ~4 characters per token; larger plans are sharded
+PLAN_PROMPT_TOKEN_BUDGET = int(os.getenv("PLAN_PROMPT_TOKEN_BUDGET", "6000"))
+PLAN_MAX_PARALLEL_SHARDS = int(os.getenv("PLAN_MAX_PARALLEL_SHARDS", "8"))
+CHARS_PER_TOKEN = 4
+
+# See generate_mitigation_plan
+PLAN_MODES = ("llm", "rules", "hedged")
+PLAN_MODE = os.getenv("PLAN_MODE", "hedged")
+PLAN_LLM_BUDGET_S = float(os.getenv("PLAN_LLM_BUDGET_S", "8"))
+PLAN_HEDGE_ENRICH = os.getenv("PLAN_HEDGE_ENRICH", "1") != "0"
+
+# Gemini calls still running after their hedge fired (kept referenced until done)
+_HEDGED_TASKS = set()
+
+RISK_ORDER = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
+URGENCY_ORDER = {"high": 0, "medium": 1, "low": 2}
+TABLE_COLUMNS = "asset_id|name|type|capacity_kw|criticality|risk_level|reason|expected_impact"
+
+PROMPT_TEMPLATE = """You are an expert Distribution System Operator (DSO) Flexibility Orchestrator.
+Your goal is to manage grid congestion and prevent outages using Distributed Energy Resources (DERs) and Flexibility Services.
+
+Analyze the following grid scenario and identified risks.
+
+SCENARIO:
+Location: {location}
+Event: {event_type}
+Duration: {duration_hours} hours
+{shard_note}
+AT-RISK ASSETS AND IDENTIFIED RISKS (Grid Constraints), one per line:
+{columns}
+{table}
+
+TASK:
+Generate a Flexibility Dispatch Plan to address high and critical grid risks.
+Prioritize non-wires alternatives (Demand Response, Flexibility) over physical interventions.
+
+For each action, specify:
+- asset_id: The ID of the asset (feeder/substation) requiring relief
+- action_type: Specific flexibility service (MUST use one of: "dispatch_battery_discharge", "reduce_ev_load", "shift_hvac_load", "deploy_mobile_generator")
+- urgency: "low", "medium", or "high"
+- justification: Technical justification referencing load reduction (e.g., "Peak shaving required due to 110% projected loading")
+- target_time: A relative time string (e.g., "2025-11-26T10:00:00Z")
+
+RESPONSE FORMAT:
+Return ONLY a valid JSON object with two keys:
+1. "summary_text": A brief executive summary of the flexibility strategy.
+2. "mitigation_actions": A list of action objects matching the fields above.
 
-async def generate_mitigation_plan(request_data: Any) -> Dict[str, Any]:
+Example JSON:
+{{"summary_text": "Initiating peak shaving via VPP battery discharge to relieve substation overload...",
+"mitigation_actions": [{{"asset_id": "sub_1", "action_type": "dispatch_battery_discharge", "urgency": "high",
+"justification": "Projected load > 110% capacity due to AC spike", "target_time": "2025-11-26T14:00:00Z"}}]}}
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def at_risk_rows(risks: List[Any], assets: List[Any]) -> List[Tuple[Any, Optional[Any], str]]:
     """
-    Generate mitigation plan using Google Gemini.
-    request_data: Instance of AgentMitigationRequest (passed as object)
+    (risk, asset, table line) for every risk, most severe first.
+    Assets without a risk are left out of the prompt entirely.
+    """
+    by_id = {a.id: a for a in assets}
+    rows = []
+    for risk in sorted(risks, key=lambda r: RISK_ORDER.get(r.risk_level, len(RISK_ORDER))):
+        asset = by_id.get(risk.asset_id)
+        asset_cells = [asset.name, asset.type, asset.capacity_kw, asset.criticality] if asset else ["", "", "", ""]
+        line = "|".join(_cell(v) for v in [risk.asset_id, *asset_cells, risk.risk_level, risk.reason, risk.expected_impact])
+        rows.append((risk, asset, line))
+    return rows
+
+
+def build_prompt(scenario: Any, rows: List[Tuple[Any, Optional[Any], str]], shard: int = 0, shards: int = 1) -> str:
+    """Compact Gemini prompt for the given at-risk rows (see at_risk_rows)."""
+    shard_note = ""
+    if shards > 1:
+        shard_note = f"Part {shard + 1} of {shards}: plan only for the assets listed below.\n"
+    return PROMPT_TEMPLATE.format(
+        location=scenario.location,
+        event_type=scenario.event_type,
+        duration_hours=scenario.duration_hours,
+        shard_note=shard_note,
+        columns=TABLE_COLUMNS,
+        table="\n".join(line for _, _, line in rows),
+    )
+
+
+def shard_rows(scenario: Any, rows: List[Tuple[Any, Optional[Any], str]],
+               token_budget: int = PLAN_PROMPT_TOKEN_BUDGET) -> List[List[Tuple[Any, Optional[Any], str]]]:
+    """
+    Split rows into consecutive shards whose prompts each fit token_budget.
+    A single row larger than the budget still gets a shard of its own.
+    """
+    overhead = estimate_tokens(build_prompt(scenario, [], 0, 2))
+    room = max(token_budget - overhead, 1) * CHARS_PER_TOKEN
+    shards, current, used = [], [], 0
+    for row in rows:
+        size = len(row[2]) + 1
+        if current and used + size > room:
+            shards.append(current)
+            current, used = [], 0
+        current.append(row)
+        used += size
+    if current:
+        shards.append(current)
+    return shards
+
+
+def merge_plans(plans: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    configure_genai()
+    Combine shard plans into one. Actions for the same (asset_id, action_type)
+    are deduplicated, keeping the most urgent.
+    """
+    actions: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for plan in plans:
+        for action in plan.get("mitigation_actions", []):
+            key = (action.get("asset_id"), action.get("action_type"))
+            kept = actions.get(key)
+            if kept is None or (URGENCY_ORDER.get(action.get("urgency"), len(URGENCY_ORDER))
+                                < URGENCY_ORDER.get(kept.get("urgency"), len(URGENCY_ORDER))):
+                actions[key] = action
+    return {
+        "summary_text": " ".join(p["summary_text"].strip() for p in plans if p.get("summary_text")),
+        "mitigation_actions": list(actions.values()),
+    }
+
+
+def parse_plan_response(content: str) -> Dict[str, Any]:
+    """Extract and minimally validate the plan JSON from a model response."""
+    # Clean up markdown code blocks if present
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+        
+    result = json.loads(content)
     
-    # Extract data from request
+    # Validate structure minimally
+    if "summary_text" not in result or "mitigation_actions" not in result:
+        raise ValueError("Invalid response structure from AI")
+        
+    return result
+
+
+async def request_plan(prompt: str) -> Dict[str, Any]:
+    """Call the shared LLM client and parse its plan; raises on any failure."""
+    return parse_plan_response(await get_llm_client().generate(prompt))
+
+
+async def plan_shard(scenario: Any, rows: List[Tuple[Any, Optional[Any], str]],
+                     shard: int = 0, shards: int = 1) -> Dict[str, Any]:
+    """Plan one shard through PLAN_CACHE; raises on failure."""
+    prompt = build_prompt(scenario, rows, shard, shards)
+    key = plan_cache_key(
+        scenario, [risk for risk, _, _ in rows], [asset for _, asset, _ in rows if asset is not None],
+        get_llm_client().model_name
+    )
+    return await PLAN_CACHE.get_or_generate(key, lambda: request_plan(prompt))
+
+
+async def generate_llm_plan(request_data: Any) -> Dict[str, Any]:
+    """
+    Plan with Gemini; raises if no shard could be planned.
+
+    Only at-risk assets are sent, as a compact table. If that exceeds
+    PLAN_PROMPT_TOKEN_BUDGET the risks are sharded, planned in parallel and
+    merged. Each shard is served from PLAN_CACHE when possible.
+    """
     scenario = request_data.scenario
-    risks = request_data.risks
-    assets = request_data.assets
-    
-    # Construct prompt
-    prompt = f"""
-    You are an expert Distribution System Operator (DSO) Flexibility Orchestrator.
-    Your goal is to manage grid congestion and prevent outages using Distributed Energy Resources (DERs) and Flexibility Services.
-    
-    Analyze the following grid scenario and identified risks.
-    
-    SCENARIO:
-    Location: {scenario.location}
-    Event: {scenario.event_type}
-    Duration: {scenario.duration_hours} hours
-
-    ASSETS:
-    {json.dumps([a.model_dump() for a in assets], indent=2)}
-
-    IDENTIFIED RISKS (Grid Constraints):
-    {json.dumps([r.model_dump() for r in risks], indent=2)}
-
-    TASK:
-    Generate a Flexibility Dispatch Plan to address high and critical grid risks.
-    Prioritize non-wires alternatives (Demand Response, Flexibility) over physical interventions.
-
-    For each action, specify:
-    - asset_id: The ID of the asset (feeder/substation) requiring relief
-    - action_type: Specific flexibility service (MUST use one of: "dispatch_battery_discharge", "reduce_ev_load", "shift_hvac_load", "deploy_mobile_generator")
-    - urgency: "low", "medium", or "high"
-    - justification: Technical justification referencing load reduction (e.g., "Peak shaving required due to 110% projected loading")
-    - target_time: A relative time string (e.g., "2025-11-26T10:00:00Z")
-
-    RESPONSE FORMAT:
-    Return ONLY a valid JSON object with two keys:
-    1. "summary_text": A brief executive summary of the flexibility strategy.
-    2. "mitigation_actions": A list of action objects matching the fields above.
-
-    Example JSON:
-    {{
-        "summary_text": "Initiating peak shaving via VPP battery discharge to relieve substation overload...",
-        "mitigation_actions": [
-            {{
-                "asset_id": "sub_1",
-                "action_type": "dispatch_battery_discharge",
-                "urgency": "high",
-                "justification": "Projected load > 110% capacity due to AC spike",
-                "target_time": "2025-11-26T14:00:00Z"
-            }}
-        ]
-    }}
+    rows = at_risk_rows(request_data.risks, request_data.assets)
+    if not rows:
+        return {"summary_text": "No grid risks identified; no flexibility actions required.", "mitigation_actions": []}
+
+    shards = shard_rows(scenario, rows)
+    if len(shards) > 1:
+        print(f"Agent: Planning {len(rows)} risks in {len(shards)} shards")
+
+    semaphore = asyncio.Semaphore(PLAN_MAX_PARALLEL_SHARDS)
+
+    async def bounded(i: int, shard: List[Tuple[Any, Optional[Any], str]]) -> Dict[str, Any]:
+        async with semaphore:
+            return await plan_shard(scenario, shard, i, len(shards))
+
+    results = await asyncio.gather(*(bounded(i, shard) for i, shard in enumerate(shards)), return_exceptions=True)
+    plans = [r for r in results if not isinstance(r, BaseException)]
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if not plans:
+        raise errors[0]
+
+    plan = merge_plans(plans)
+    if errors:
+        print(f"Error calling Gemini for {len(errors)} of {len(shards)} shards: {errors[0]}")
+        plan["summary_text"] += f" (Plan incomplete: {len(errors)} of {len(shards)} shards failed.)"
+    return plan
+
+
+def _log_late_plan(task: "asyncio.Task") -> None:
+    _HEDGED_TASKS.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        print(f"Agent: Late Gemini plan failed: {task.exception()}")
+    else:
+        print("Agent: Late Gemini plan cached for subsequent requests")
+
+
+async def generate_mitigation_plan(request_data: Any, mode: Optional[str] = None,
+                                   llm_budget_s: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Generate mitigation plan using Google Gemini, the local rule planner, or both.
+    request_data: Instance of AgentMitigationRequest (passed as object)
+
+    mode (default PLAN_MODE):
+        "llm":    Gemini only; failures return an empty error plan, and
+                  LLMOverloaded (admission queue full) is raised
+        "rules":  rule-based plan only (no network, no API key)
+        "hedged": Gemini if it answers within llm_budget_s (default
+                  PLAN_LLM_BUDGET_S), otherwise the rule-based plan. A late
+                  Gemini call keeps running and lands in PLAN_CACHE, so a
+                  repeat of the request gets the enriched plan
+                  (PLAN_HEDGE_ENRICH=0 cancels it instead).
+
+    The returned dict carries "plan_source": "llm" or "rules", and
+    "error": True for the empty error plan of "llm" mode.
     """
+    mode = mode or PLAN_MODE
+    if mode == "rules":
+        return {**plan_mitigation(request_data.scenario, request_data.risks, request_data.assets), "plan_source": "rules"}
 
+    if mode == "llm":
+        try:
+            return {**await generate_llm_plan(request_data), "plan_source": "llm"}
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            print(f"Error calling Gemini: {e}")
+            # Fallback response
+            return {
+                "summary_text": f"Error generating AI plan: {str(e)}",
+                "mitigation_actions": [],
+                "plan_source": "llm",
+                "error": True
+            }
+
+    budget = PLAN_LLM_BUDGET_S if llm_budget_s is None else llm_budget_s
+    task = asyncio.ensure_future(generate_llm_plan(request_data))
     try:
-        # Use gemini-flash-latest which is generally available
-        model = genai.GenerativeModel('gemini-flash-latest')
-        response = await model.generate_content_async(prompt)
-        
-        # Extract JSON from response
-        content = response.text
-        # Clean up markdown code blocks if present
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-            
-        result = json.loads(content)
-        
-        # Validate structure minimally
-        if "summary_text" not in result or "mitigation_actions" not in result:
-            raise ValueError("Invalid response structure from AI")
-            
-        return result
-        
+        return {**await asyncio.wait_for(asyncio.shield(task), budget), "plan_source": "llm"}
+    except asyncio.TimeoutError:
+        print(f"Agent: Gemini missed the {budget:g}s budget, using the rule-based plan")
+        if PLAN_HEDGE_ENRICH:
+            _HEDGED_TASKS.add(task)
+            task.add_done_callback(_log_late_plan)
+        else:
+            task.cancel()
+    except Exception as e:
+        print(f"Error calling Gemini: {e}; using the rule-based plan")
+
+    return {**plan_mitigation(request_data.scenario, request_data.risks, request_data.assets), "plan_source": "rules"}
+
+
+async def _stream_shard(scenario: Any, rows: List[Tuple[Any, Optional[Any], str]], shard: int, shards: int,
+                        queue: "asyncio.Queue") -> None:
+    """Stream one shard's plan into queue as ("action", dict) / ("summary", str), then ("shard_done", None)."""
+    key = plan_cache_key(
+        scenario, [risk for risk, _, _ in rows], [asset for _, asset, _ in rows if asset is not None],
+        get_llm_client().model_name
+    )
+    try:
+        plan = await PLAN_CACHE.lookup(key)
+        if plan is not None:
+            for action in plan["mitigation_actions"]:
+                await queue.put(("action", action))
+            await queue.put(("summary", plan["summary_text"]))
+        else:
+            parser = PlanStreamParser()
+            plan = {"summary_text": "", "mitigation_actions": []}
+            async for chunk in get_llm_client().stream(build_prompt(scenario, rows, shard, shards)):
+                for kind, value in parser.feed(chunk):
+                    if kind == "action":
+                        plan["mitigation_actions"].append(value)
+                    else:
+                        plan["summary_text"] = value
+                    await queue.put((kind, value))
+            parser.close()
+            await PLAN_CACHE.store(key, plan)
+        await queue.put(("shard_done", None))
     except Exception as e:
-        print(f"Error calling Gemini: {e}")
-        # Fallback response
-        return {
-            "summary_text": f"Error generating AI plan: {str(e)}",
-            "mitigation_actions": []
-        }
+        await queue.put(("shard_error", e))
+
+
+async def stream_mitigation_plan(request_data: Any, mode: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Stream a mitigation plan as it is generated.
+
+    Yields ("action", dict) for each mitigation action as soon as the model
+    has finished writing it, ("summary", str) once the summary is complete
+    (after all shards when the request is sharded), then
+    ("done", {"plan_source": ..., "actions": n}). Actions repeated across
+    shards are emitted once. If the LLM fails before producing anything, the
+    rule-based plan is streamed instead, except in "llm" mode, which yields
+    ("error", message).
+    """
+    mode = mode or PLAN_MODE
+    scenario = request_data.scenario
+
+    async def rules_plan() -> AsyncIterator[Tuple[str, Any]]:
+        plan = plan_mitigation(scenario, request_data.risks, request_data.assets)
+        for action in plan["mitigation_actions"]:
+            yield "action", action
+        yield "summary", plan["summary_text"]
+        yield "done", {"plan_source": "rules", "actions": len(plan["mitigation_actions"])}
+
+    if mode == "rules":
+        async for event in rules_plan():
+            yield event
+        return
+
+    rows = at_risk_rows(request_data.risks, request_data.assets)
+    if not rows:
+        yield "summary", "No grid risks identified; no flexibility actions required."
+        yield "done", {"plan_source": "llm", "actions": 0}
+        return
+
+    shards = shard_rows(scenario, rows)
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(PLAN_MAX_PARALLEL_SHARDS)
+
+    async def bounded(i: int, shard: List[Tuple[Any, Optional[Any], str]]) -> None:
+        async with semaphore:
+            await _stream_shard(scenario, shard, i, len(shards), queue)
+
+    tasks = [asyncio.ensure_future(bounded(i, shard)) for i, shard in enumerate(shards)]
+    seen = set()
+    summaries: List[str] = []
+    errors: List[BaseException] = []
+    finished = 0
+    try:
+        while finished < len(shards):
+            kind, value = await queue.get()
+            if kind == "action":
+                key = (value.get("asset_id"), value.get("action_type"))
+                if key not in seen:
+                    seen.add(key)
+                    yield "action", value
+            elif kind == "summary":
+                if len(shards) == 1:
+                    yield "summary", value
+                summaries.append(value.strip())
+            else:
+                finished += 1
+                if kind == "shard_error":
+                    errors.append(value)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if errors and not seen and not summaries:
+        print(f"Error calling Gemini: {errors[0]}")
+        if mode == "llm":
+            yield "error", f"Error generating AI plan: {errors[0]}"
+            return
+        async for event in rules_plan():
+            yield event
+        return
 
+    if errors:
+        print(f"Error calling Gemini for {len(errors)} of {len(shards)} shards: {errors[0]}")
+        summaries.append(f"(Plan incomplete: {len(errors)} of {len(shards)} shards failed.)")
+    if len(shards) > 1 or errors:
+        yield "summary", " ".join(summaries)
+    yield "done", {"plan_source": "llm", "actions": len(seen)}
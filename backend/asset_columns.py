@@ -0,0 +1,305 @@
+"""
+Columnar binary asset format - memory-mapped, read-only, shared across workers.
+
+Layout of an `assets.columns/` directory:
+
+    manifest.json             rows, column schema, row key orders, source file stat, index params
+    <col>.npy                 bool / int64 / float64 values
+    <col>.offsets.npy         string columns: int64 offsets into <col>.data.bin
+    <col>.data.bin            string columns: UTF-8 blob
+    <col>.present.npy         only if some rows lack the key
+    <col>.intmask.npy         only for float columns that also hold JSON integers
+    rows.key_order.npy        only if rows differ in key order: index into the manifest's key_orders
+    table.<field>.npy         precomputed risk_engine.AssetTable columns
+    table.ids.*, table.feeds.*  AssetTable ids / feeds as string columns, whatever the source values' types
+    index.lat.npy             float64 coordinates, as used by the spatial index
+    index.lon.npy
+    index.order.npy           precomputed spatial_index.SpatialIndex layout
+    index.offsets.npy
+
+assets.json stays the source of truth; conversion is lossless both ways (values,
+integer/float distinction and each row's key order survive the round trip):
+
+    python asset_columns.py ../data/assets.json ../data/assets.columns
+    python asset_columns.py --to-json ../data/assets.columns assets.json
+"""
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import numpy as np
+
+from risk_engine import AssetTable
+from spatial_index import SpatialIndex
+
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+TABLE_FIELDS = ("type_code", "criticality_code", "flood_zone", "capacity_kw")
+_MISSING = object()
+
+
+class StringColumn:
+    """
+    Read-only view of a string column stored as offsets + UTF-8 blob.
+
+    Integer indexing decodes one value; array indexing returns a lighter view
+    over the same buffers, so slicing a mapped column never copies the blob.
+    """
+
+    __slots__ = ("offsets", "data", "present", "default", "rows")
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray, present: Optional[np.ndarray] = None,
+                 default: Any = None, rows: Optional[np.ndarray] = None):
+        self.offsets = offsets
+        self.data = data
+        self.present = present
+        self.default = default
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows) if self.rows is not None else len(self.offsets) - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            row = int(self.rows[key]) if self.rows is not None else int(key)
+            if self.present is not None and not self.present[row]:
+                return self.default
+            return bytes(self.data[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+        key = np.asarray(key)
+        rows = self.rows[key] if self.rows is not None else np.arange(len(self))[key]
+        return StringColumn(self.offsets, self.data, self.present, self.default, rows)
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _column_kind(values: List[Any]) -> str:
+    """Pick the narrowest lossless storage kind for a column's present values."""
+    if all(isinstance(v, bool) for v in values):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        if all(-2 ** 63 <= v < 2 ** 63 for v in values):
+            return "int"
+        return "json"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        # float64 holds integers exactly only up to 2**53
+        if all(isinstance(v, float) or -2 ** 53 <= v <= 2 ** 53 for v in values):
+            return "float"
+        return "json"
+    if all(isinstance(v, str) for v in values):
+        return "str"
+    return "json"
+
+
+def _write_strings(directory: Path, name: str, strings: List[str]) -> None:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(directory / f"{name}.offsets.npy", offsets)
+    (directory / f"{name}.data.bin").write_bytes(b"".join(encoded))
+
+
+def _write_string_column(directory: Path, name: str, values: List[Optional[str]]) -> None:
+    """String column whose None values are recorded as absent."""
+    _write_strings(directory, name, [v if v is not None else "" for v in values])
+    present = np.array([v is not None for v in values], dtype=bool)
+    if not present.all():
+        np.save(directory / f"{name}.present.npy", present)
+
+
+def write_columns(assets: List[Dict[str, Any]], directory: Path, source: Optional[Path] = None) -> None:
+    """
+    Write assets in the columnar layout.
+
+    The directory is built next to the target and swapped in at the end,
+    so readers never observe a half-written layout.
+    """
+    directory = Path(directory)
+    staging = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    names: List[str] = []
+    key_orders: Dict[Tuple[str, ...], int] = {}
+    row_orders = np.empty(len(assets), dtype=np.int32)
+    for i, row in enumerate(assets):
+        for key in row:
+            if key not in names:
+                names.append(key)
+        row_orders[i] = key_orders.setdefault(tuple(row), len(key_orders))
+    if len(key_orders) > 1:
+        np.save(staging / "rows.key_order.npy", row_orders)
+
+    columns = []
+    for name in names:
+        raw = [row.get(name, _MISSING) for row in assets]
+        present = np.array([v is not _MISSING for v in raw], dtype=bool)
+        values = [v for v in raw if v is not _MISSING]
+        kind = _column_kind(values)
+
+        if kind == "str" or kind == "json":
+            encode = (lambda v: v) if kind == "str" else json.dumps
+            _write_strings(staging, name, [encode(v) if v is not _MISSING else "" for v in raw])
+        else:
+            dtype = {"bool": bool, "int": np.int64, "float": np.float64}[kind]
+            filled = [v if v is not _MISSING else 0 for v in raw]
+            np.save(staging / f"{name}.npy", np.array(filled, dtype=dtype))
+            if kind == "float":
+                intmask = np.array([isinstance(v, int) for v in raw], dtype=bool)
+                if intmask.any():
+                    np.save(staging / f"{name}.intmask.npy", intmask)
+
+        if not present.all():
+            np.save(staging / f"{name}.present.npy", present)
+        columns.append({"name": name, "kind": kind})
+
+    # Precomputed risk engine columns and spatial index, so loading does no work.
+    # ids / feeds / coordinates get their own typed columns: the record columns
+    # above keep whatever JSON types the source has (null ids, numeric feeds, ...)
+    table = AssetTable.from_assets(assets)
+    for field in TABLE_FIELDS:
+        np.save(staging / f"table.{field}.npy", getattr(table, field))
+    _write_string_column(staging, "table.ids", [str(v) if v is not None else None for v in table.ids])
+    _write_string_column(staging, "table.feeds", [str(v) for v in table.feeds])
+    index = SpatialIndex.from_assets(assets)
+    np.save(staging / "index.lat.npy", index.lat)
+    np.save(staging / "index.lon.npy", index.lon)
+    np.save(staging / "index.order.npy", index.order)
+    np.save(staging / "index.offsets.npy", index.offsets)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "rows": len(assets),
+        "columns": columns,
+        "key_orders": [list(order) for order in key_orders],
+        "index": {
+            "min_lat": index.min_lat, "min_lon": index.min_lon, "cell_size": index.cell_size,
+            "n_rows": index.n_rows, "n_cols": index.n_cols,
+        },
+        "source": None,
+    }
+    if source is not None:
+        st = os.stat(source)
+        manifest["source"] = {"path": str(Path(source).name), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    (staging / MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+
+class ColumnarAssets:
+    """Memory-mapped columnar assets; behaves as a read-only sequence of dicts."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.manifest = json.loads((self.directory / MANIFEST).read_text())
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported asset column format: {self.manifest.get('format_version')}")
+        self._columns = {c["name"]: self._open_column(c["name"], c["kind"]) for c in self.manifest["columns"]}
+        # Layouts written before key orders were recorded use column order
+        self._key_orders = self.manifest.get("key_orders") or [list(self._columns)]
+        self._row_orders = self._load("rows.key_order.npy")
+
+    def _load(self, filename: str) -> Optional[np.ndarray]:
+        path = self.directory / filename
+        return np.load(path, mmap_mode="r") if path.exists() else None
+
+    def _open_column(self, name: str, kind: str) -> Dict[str, Any]:
+        column = {"kind": kind, "present": self._load(f"{name}.present.npy")}
+        if kind in ("str", "json"):
+            blob = self.directory / f"{name}.data.bin"
+            data = np.memmap(blob, dtype=np.uint8, mode="r") if blob.stat().st_size else np.empty(0, np.uint8)
+            column["strings"] = StringColumn(self._load(f"{name}.offsets.npy"), data, column["present"])
+        else:
+            column["values"] = self._load(f"{name}.npy")
+            column["intmask"] = self._load(f"{name}.intmask.npy")
+        return column
+
+    def __len__(self) -> int:
+        return self.manifest["rows"]
+
+    def _value(self, column: Dict[str, Any], i: int) -> Any:
+        present = column["present"]
+        if present is not None and not present[i]:
+            return _MISSING
+        kind = column["kind"]
+        if kind == "str":
+            return column["strings"][i]
+        if kind == "json":
+            return json.loads(column["strings"][i])
+        value = column["values"][i].item()
+        if kind == "float" and column["intmask"] is not None and column["intmask"][i]:
+            return int(value)
+        return value
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        order = self._key_orders[int(self._row_orders[i]) if self._row_orders is not None else 0]
+        row = {}
+        for name in order:
+            value = self._value(self._columns[name], i)
+            if value is not _MISSING:
+                row[name] = value
+        return row
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def string_column(self, name: str, default: Any = None) -> StringColumn:
+        """A derived string column (e.g. "table.ids"); absent rows read as `default`."""
+        strings = self._open_column(name, "str")["strings"]
+        return StringColumn(strings.offsets, strings.data, strings.present, default)
+
+    def asset_table(self) -> AssetTable:
+        """AssetTable backed directly by the mapped files."""
+        fields = {field: self._load(f"table.{field}.npy") for field in TABLE_FIELDS}
+        return AssetTable(ids=self.string_column("table.ids"), feeds=self.string_column("table.feeds", ""), **fields)
+
+    def spatial_index(self) -> SpatialIndex:
+        """SpatialIndex rebuilt from the stored layout without re-sorting."""
+        return SpatialIndex.from_layout(
+            self._load("index.lat.npy"), self._load("index.lon.npy"), order=self._load("index.order.npy"), offsets=self._load("index.offsets.npy"),
+            **self.manifest["index"]
+        )
+
+    def is_fresh(self, source: Path) -> bool:
+        """True if the layout was converted from `source` as it is on disk now."""
+        recorded = self.manifest.get("source")
+        if not recorded:
+            return False
+        st = os.stat(source)
+        return (recorded["mtime_ns"], recorded["size"]) == (st.st_mtime_ns, st.st_size)
+
+
+def convert_json_to_columns(json_path: Path, directory: Path) -> None:
+    with open(json_path, "r") as f:
+        assets = json.load(f)
+    write_columns(assets, directory, source=json_path)
+    print(f"Wrote {len(assets)} assets to {directory}")
+
+
+def convert_columns_to_json(directory: Path, json_path: Path) -> None:
+    assets = list(ColumnarAssets(directory))
+    with open(json_path, "w") as f:
+        json.dump(assets, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {len(assets)} assets to {json_path}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) == 3 and args[0] == "--to-json":
+        convert_columns_to_json(Path(args[1]), Path(args[2]))
+    elif len(args) == 2:
+        convert_json_to_columns(Path(args[0]), Path(args[1]))
+    else:
+        print(__doc__)
+        sys.exit(1)
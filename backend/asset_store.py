@@ -0,0 +1,191 @@
+"""
+Process-wide asset and scenario store.
+
+Data files are parsed once and re-parsed only when their mtime/size changes
+*and* the content hash differs. Each parse produces an immutable AssetSnapshot
+holding the columnar AssetTable, the spatial index and lazily built,
+pre-validated Pydantic models / JSON fragments shared by every request.
+
+If an up-to-date memory-mapped layout (see asset_columns.py) sits next to
+assets.json, it is opened instead of parsing the JSON.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from asset_columns import ColumnarAssets, MANIFEST
+from risk_engine import AssetTable
+from spatial_index import SpatialIndex
+
+
+def _digest(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class CachedFile:
+    """A parsed file that reloads only when its content actually changes."""
+
+    __slots__ = ("path", "loader", "_signature", "_digest", "_value", "_version", "_lock")
+
+    def __init__(self, path: Path, loader: Callable[[bytes], Any]):
+        self.path = Path(path)
+        self.loader = loader
+        self._signature: Optional[Tuple[int, int]] = None
+        self._digest: Optional[str] = None
+        self._value: Any = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _stat_signature(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self) -> Any:
+        """Return the parsed value, re-reading the file if it changed on disk."""
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return self._value
+
+        with self._lock:
+            signature = self._stat_signature()
+            if signature == self._signature:
+                return self._value
+
+            raw = self.path.read_bytes()
+            digest = _digest(raw)
+            if digest != self._digest:
+                # Parse before swapping so a bad write never leaves us empty-handed
+                self._value = self.loader(raw)
+                self._digest = digest
+                self._version += 1
+                print(f"AssetStore: Loaded {self.path.name} (v{self._version})")
+            self._signature = signature
+            return self._value
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+
+class AssetSnapshot:
+    """
+    One parsed version of assets.json.
+
+    Rows are shared between requests and must be treated as read-only.
+    """
+
+    __slots__ = ("records", "table", "index", "digest", "_models", "_fragments", "_lock")
+
+    def __init__(self, records: Sequence[Dict[str, Any]], table: Optional[AssetTable] = None,
+                 index: Optional[SpatialIndex] = None, digest: str = ""):
+        self.records = records
+        self.digest = digest  # Content hash of the file this snapshot was parsed from
+        self.table = table if table is not None else AssetTable.from_assets(records)
+        self.index = index if index is not None else SpatialIndex.from_assets(records)
+        self._models: Dict[type, list] = {}
+        self._fragments: Dict[type, List[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def select(self, location: str) -> Optional[np.ndarray]:
+        """Positions of assets inside `location`, or None for the whole fleet."""
+        return self.index.query_region(location)
+
+    @classmethod
+    def from_columns(cls, columns: ColumnarAssets, digest: str = "") -> "AssetSnapshot":
+        """Snapshot over a memory-mapped layout; rows are decoded on access."""
+        return cls(columns, columns.asset_table(), columns.spatial_index(), digest)
+
+    def rows(self, positions: Optional[np.ndarray] = None) -> Sequence[Dict[str, Any]]:
+        """Rows at positions; all rows as the snapshot's own sequence (mapped rows decode on access)."""
+        if positions is None:
+            return self.records
+        return [self.records[i] for i in positions.tolist()]
+
+    def coordinates(self, positions: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(lat, lon) arrays for the selected assets."""
+        if positions is None:
+            return self.index.lat, self.index.lon
+        return self.index.lat[positions], self.index.lon[positions]
+
+    def subtable(self, positions: Optional[np.ndarray] = None) -> AssetTable:
+        return self.table if positions is None else self.table.take(positions)
+
+    def _cached(self, cache: Dict[type, list], model_cls: type, build: Callable[[int], Any],
+                positions: Optional[np.ndarray]) -> list:
+        """Per-row memo: only rows that are actually requested get built."""
+        with self._lock:
+            slots = cache.get(model_cls)
+            if slots is None:
+                slots = cache[model_cls] = [None] * len(self.records)
+        wanted = range(len(slots)) if positions is None else positions.tolist()
+        out = []
+        for i in wanted:
+            item = slots[i]
+            if item is None:
+                item = slots[i] = build(i)
+            out.append(item)
+        return out
+
+    def models(self, model_cls: type, positions: Optional[np.ndarray] = None) -> list:
+        """Pre-validated `model_cls` instances, built at most once per row per snapshot."""
+        return self._cached(self._models, model_cls, lambda i: model_cls(**self.records[i]), positions)
+
+    def json_fragments(self, model_cls: type, positions: Optional[np.ndarray] = None) -> List[bytes]:
+        """Pre-serialized JSON for each asset as `model_cls`, built at most once per row per snapshot."""
+        def build(i: int) -> bytes:
+            return self.models(model_cls, np.array([i]))[0].model_dump_json().encode()
+        return self._cached(self._fragments, model_cls, build, positions)
+
+
+class AssetStore:
+    """Shared access point for assets.json and scenarios.json."""
+
+    def __init__(self, assets_file: Path, scenarios_file: Path, columns_dir: Optional[Path] = None):
+        self.assets_file = Path(assets_file)
+        self.columns_dir = Path(columns_dir) if columns_dir else self.assets_file.with_suffix(".columns")
+        self._assets = CachedFile(self.assets_file, lambda raw: AssetSnapshot(json.loads(raw), digest=_digest(raw)))
+        # Only the manifest is read; the column files are mapped, not parsed
+        self._columns = CachedFile(
+            self.columns_dir / MANIFEST,
+            lambda raw: AssetSnapshot.from_columns(ColumnarAssets(self.columns_dir), _digest(raw))
+        )
+        self._columns_error: Optional[str] = None
+        self._scenarios = CachedFile(scenarios_file, json.loads)
+
+    def _columns_fresh(self) -> bool:
+        try:
+            return self._columns.get().records.is_fresh(self.assets_file)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            # A stale, partial or incompatible layout must never fail requests; assets.json still works
+            error = f"{type(e).__name__}: {e}"
+            if error != self._columns_error:
+                print(f"AssetStore: Ignoring {self.columns_dir.name} ({error}); using {self.assets_file.name}")
+                self._columns_error = error
+            return False
+
+    def snapshot(self) -> AssetSnapshot:
+        """Current asset snapshot (reloaded if assets.json or its columnar layout changed)."""
+        if self._columns_fresh():
+            return self._columns.get()
+        return self._assets.get()
+
+    def assets(self, location: Optional[str] = None) -> Sequence[Dict[str, Any]]:
+        snapshot = self.snapshot()
+        return snapshot.rows(snapshot.select(location) if location else None)
+
+    def scenarios(self) -> Dict[str, Any]:
+        return self._scenarios.get()
+
+    def scenario(self, scenario_id: str) -> Optional[Dict[str, Any]]:
+        return self.scenarios().get(scenario_id)
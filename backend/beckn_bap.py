@@ -1,28 +1,105 @@
+import asyncio
 import uuid
-import httpx
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
+from http_client import get_http_client
+from transaction_store import TransactionStore, create_transaction_store
 from beckn_models import (
     Context, Intent, SearchRequest, SearchMessage,
     SelectRequest, SelectMessage, Order, Item,
-    ConfirmRequest, ConfirmMessage
+    ConfirmRequest, ConfirmMessage, OnSearchRequest
 )
 
-# --- In-Memory State Store (For Hackathon Simplicity) ---
-# In production, use Redis/Database
-# Structure: { transaction_id: { "status": "...", "catalog": ..., "quote": ..., "order": ... } }
-BAP_STATE = {}
+DOMAIN = "energy-grid"
+
+# --- Transaction State Store ---
+# Bounded, TTL-evicting store of TransactionRecords (see transaction_store.py);
+# shared between workers when BECKN_TX_DB is set
+TRANSACTION_STORE: TransactionStore = create_transaction_store()
+
+
+class TransactionRegistry:
+    """
+    Wakes flows waiting on a transaction status as soon as the callback lands.
+
+    Waiters hold a Future per (transaction, status); callbacks resolve them
+    through update_transaction, so an idle transaction costs no CPU.
+    """
+
+    def __init__(self):
+        self._waiters: Dict[str, Dict[str, List[asyncio.Future]]] = {}
+
+    def notify(self, transaction_id: str, status: str) -> None:
+        waiting = self._waiters.get(transaction_id, {}).pop(status, [])
+        for future in waiting:
+            if not future.done():
+                future.set_result(True)
+
+    async def wait_for_status(self, transaction_id: str, status: str, timeout: float) -> bool:
+        """True once the transaction reaches status, False if the deadline passes first."""
+        record = await TRANSACTION_STORE.get(transaction_id)
+        if record is not None and record.status == status:
+            return True
+        return await self.wait_for_update(transaction_id, status, timeout)
+
+    async def wait_for_update(self, transaction_id: str, status: str, timeout: float) -> bool:
+        """True on the next update to status (even if the transaction is already there), False on timeout."""
+        future = asyncio.get_running_loop().create_future()
+        by_status = self._waiters.setdefault(transaction_id, {})
+        by_status.setdefault(status, []).append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiting = by_status.get(status)
+            if waiting and future in waiting:
+                waiting.remove(future)
+                if not waiting:
+                    del by_status[status]
+            if not by_status:
+                self._waiters.pop(transaction_id, None)
+
+    def waiting(self) -> int:
+        return sum(len(w) for by_status in self._waiters.values() for w in by_status.values())
+
+
+TRANSACTIONS = TransactionRegistry()
+
+
+async def start_transaction(transaction_id: str, status: str, **fields: Any) -> None:
+    """Register a new transaction so its callbacks are accepted."""
+    await TRANSACTION_STORE.start(transaction_id, status, **fields)
+
+
+async def update_transaction(transaction_id: str, status: str, **fields: Any) -> bool:
+    """Record a callback for a known transaction and wake its waiters; False if unknown."""
+    if not await TRANSACTION_STORE.update(transaction_id, status, **fields):
+        return False
+    TRANSACTIONS.notify(transaction_id, status)
+    return True
+
+
+async def add_search_response(transaction_id: str, response: OnSearchRequest) -> bool:
+    """Record one BPP's on_search for a known search and wake its collector; False if unknown."""
+    context = response.context
+    bpp_id = context.bpp_id or context.bpp_uri or "unknown"
+    if not await TRANSACTION_STORE.add_response(transaction_id, "SEARCH_COMPLETED", bpp_id, response):
+        return False
+    TRANSACTIONS.notify(transaction_id, "SEARCH_COMPLETED")
+    return True
 
 class BecknClient:
-    def __init__(self, bap_id: str, bap_uri: str, bpp_uri: str):
+    def __init__(self, bap_id: str, bap_uri: str, bpp_uri: str, bpp_uris: Optional[List[str]] = None):
         self.bap_id = bap_id
         self.bap_uri = bap_uri
         self.bpp_uri = bpp_uri  # Target BPP (Gateway or Specific BPP)
+        self.bpp_uris = bpp_uris or [bpp_uri]  # Searches are broadcast to all of these
 
     def _create_context(self, action: str, transaction_id: str) -> Context:
         return Context(
-            domain="energy-grid",
+            domain=DOMAIN,
             action=action,
             bap_id=self.bap_id,
             bap_uri=self.bap_uri,
@@ -31,15 +108,12 @@ class BecknClient:
             timestamp=datetime.utcnow().isoformat()
         )
 
-    async def trigger_search(self, query: str, transaction_id: str) -> bool:
-        """Send /search request to BPP"""
+    async def trigger_search(self, query: str, transaction_id: str) -> int:
+        """Send /search request to every BPP; returns how many accepted it"""
         context = self._create_context("search", transaction_id)
         
         # Initialize state
-        BAP_STATE[transaction_id] = {
-            "status": "SEARCH_INITIATED", 
-            "last_update": datetime.utcnow()
-        }
+        await start_transaction(transaction_id, "SEARCH_INITIATED")
         
         payload = SearchRequest(
             context=context,
@@ -50,19 +124,24 @@ class BecknClient:
             )
         )
         
-        async with httpx.AsyncClient() as client:
-            try:
-                print(f"BAP: Sending search for '{query}'...")
-                resp = await client.post(f"{self.bpp_uri}/search", json=payload.model_dump())
-                if resp.status_code == 200:
-                    return True
-                print(f"BAP: Search failed with {resp.status_code}")
-                return False
-            except Exception as e:
-                print(f"BAP: Connection error: {e}")
-                return False
-
-    async def trigger_select(self, transaction_id: str, provider_id: str, item_id: str) -> bool:
+        body = payload.model_dump()
+        print(f"BAP: Sending search for '{query}' to {len(self.bpp_uris)} BPPs...")
+        sent = await asyncio.gather(*(self._send_search(bpp_uri, body) for bpp_uri in self.bpp_uris))
+        return sum(sent)
+
+    async def _send_search(self, bpp_uri: str, body: Dict[str, Any]) -> bool:
+        try:
+            resp = await get_http_client().post(f"{bpp_uri}/search", json=body)
+            if resp.status_code == 200:
+                return True
+            print(f"BAP: Search to {bpp_uri} failed with {resp.status_code}")
+            return False
+        except Exception as e:
+            print(f"BAP: Connection error ({bpp_uri}): {e}")
+            return False
+
+    async def trigger_select(self, transaction_id: str, provider_id: str, item_id: str,
+                             bpp_uri: Optional[str] = None) -> bool:
         """Send /select request"""
         context = self._create_context("select", transaction_id)
         
@@ -78,16 +157,15 @@ class BecknClient:
             )
         )
         
-        async with httpx.AsyncClient() as client:
-            try:
-                print(f"BAP: Sending select for item {item_id}...")
-                resp = await client.post(f"{self.bpp_uri}/select", json=payload.model_dump())
-                return resp.status_code == 200
-            except Exception as e:
-                print(f"BAP: Connection error: {e}")
-                return False
-
-    async def trigger_confirm(self, transaction_id: str, item_id: str) -> bool:
+        try:
+            print(f"BAP: Sending select for item {item_id}...")
+            resp = await get_http_client().post(f"{bpp_uri or self.bpp_uri}/select", json=payload.model_dump())
+            return resp.status_code == 200
+        except Exception as e:
+            print(f"BAP: Connection error: {e}")
+            return False
+
+    async def trigger_confirm(self, transaction_id: str, item_id: str, bpp_uri: Optional[str] = None) -> bool:
         """Send /confirm request"""
         context = self._create_context("confirm", transaction_id)
         
@@ -102,12 +180,11 @@ class BecknClient:
             )
         )
         
-        async with httpx.AsyncClient() as client:
-            try:
-                print(f"BAP: Sending confirm...")
-                resp = await client.post(f"{self.bpp_uri}/confirm", json=payload.model_dump())
-                return resp.status_code == 200
-            except Exception as e:
-                print(f"BAP: Connection error: {e}")
-                return False
+        try:
+            print(f"BAP: Sending confirm...")
+            resp = await get_http_client().post(f"{bpp_uri or self.bpp_uri}/confirm", json=payload.model_dump())
+            return resp.status_code == 200
+        except Exception as e:
+            print(f"BAP: Connection error: {e}")
+            return False
 
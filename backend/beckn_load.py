@@ -0,0 +1,201 @@
+"""
+Offline load driver for the Beckn flow.
+
+Starts the app (BAP and mock BPPs) on localhost:8000 inside this process,
+runs many concurrent execute_beckn_flow()s against the mock BPPs and reports
+throughput and p50/p95/p99 latency per stage (search, select, confirm, total)
+over all flows and per outcome (confirmed or each failure reason), and the
+faults each mock BPP injected. Nothing leaves the
+machine.
+
+Usage (from backend/):
+    python beckn_load.py --flows 2000 --concurrency 2000
+    python beckn_load.py --flows 1000 --bpps 3 --quorum 2 --search-latency uniform:0.5,3 \\
+        --drop-rate 0.02 --duplicate-rate 0.05 --reorder-rate 0.05 --error-rate 0.01 --seed 7
+    python bpp_inventory.py 50000 /tmp/offers.jsonl
+    python beckn_load.py --flows 2000 --concurrency 500 --bpps 4 --inventory /tmp/offers.jsonl
+
+Latency and fault options map onto the MOCK_BPP_* settings of mock_bpp.py;
+any other setting (HTTP_MAX_CONNECTIONS, BECKN_TX_MAX, ...) is read from the
+environment as usual.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Any
+
+ACTION_TYPES = ["shift_hvac_load", "reduce_ev_load", "dispatch_battery_discharge"]
+STAGES = ["search", "select", "confirm", "total"]
+
+# CLI option -> setting read by mock_bpp / beckn_service at import
+SETTINGS = {
+    "bpps": "MOCK_BPP_COUNT",
+    "search_latency": "MOCK_BPP_SEARCH_LATENCY",
+    "select_latency": "MOCK_BPP_SELECT_LATENCY",
+    "confirm_latency": "MOCK_BPP_CONFIRM_LATENCY",
+    "error_rate": "MOCK_BPP_ERROR_RATE",
+    "drop_rate": "MOCK_BPP_DROP_RATE",
+    "duplicate_rate": "MOCK_BPP_DUPLICATE_RATE",
+    "delay_rate": "MOCK_BPP_DELAY_RATE",
+    "reorder_rate": "MOCK_BPP_REORDER_RATE",
+    "delay_s": "MOCK_BPP_DELAY_S",
+    "seed": "MOCK_BPP_SEED",
+    "inventory": "MOCK_BPP_INVENTORY",
+    "top_k": "MOCK_BPP_TOP_K",
+    "quorum": "BECKN_SEARCH_QUORUM",
+    "deadline": "BECKN_SEARCH_DEADLINE_S",
+    "callback_timeout": "BECKN_CALLBACK_TIMEOUT_S",
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(timings: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for stage in STAGES:
+        values = sorted(timings.get(stage, []))
+        summary[stage] = {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else float("nan"),
+        }
+    return summary
+
+
+async def run_load(flows: int, concurrency: int, use_cache: bool, location: str) -> Dict[str, Any]:
+    import uvicorn
+    import main
+    from beckn_service import execute_beckn_flow
+    from mock_bpp import MOCK_BPPS
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=8000, log_level="warning",
+                                           access_log=False, lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            raise RuntimeError("Could not start the app on localhost:8000 (port in use?)")
+        await asyncio.sleep(0.05)
+
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    # outcome -> stage -> seconds; failed flows count too, so timeouts stay in the tail
+    timings: Dict[str, Dict[str, List[float]]] = {}
+    outcomes: Counter = Counter()
+
+    async def one(n: int) -> None:
+        async with semaphore:
+            stages: Dict[str, float] = {}
+            started = time.perf_counter()
+            result = await execute_beckn_flow(ACTION_TYPES[n % len(ACTION_TYPES)], location,
+                                              bypass_cache=not use_cache, timings=stages)
+            stages["total"] = time.perf_counter() - started
+        status = result.get("status", "failed")
+        outcome = status if status == "confirmed" else f"failed: {result.get('reason', 'unknown')}"
+        outcomes[outcome] += 1
+        by_stage = timings.setdefault(outcome, {stage: [] for stage in STAGES})
+        for stage, seconds in stages.items():
+            by_stage[stage].append(seconds)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(n) for n in range(flows)))
+    finally:
+        wall_s = time.perf_counter() - started
+        server.should_exit = True
+        await serving
+
+    return {
+        "flows": flows,
+        "concurrency": concurrency,
+        "cache": use_cache,
+        "wall_s": wall_s,
+        "throughput_per_s": outcomes["confirmed"] / wall_s if wall_s else 0.0,
+        "outcomes": dict(outcomes),
+        "stages": summarize({stage: [t for by_stage in timings.values() for t in by_stage[stage]] for stage in STAGES}),
+        "stages_by_outcome": {outcome: summarize(by_stage) for outcome, by_stage in sorted(timings.items())},
+        "bpps": [bpp.stats() for bpp in MOCK_BPPS],
+    }
+
+
+def print_stages(stages: Dict[str, Dict[str, float]]) -> None:
+    print(f"    {'stage':<8} {'n':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8}")
+    for stage, s in stages.items():
+        if s["n"]:
+            print(f"    {stage:<8} {s['n']:>6} {s['p50']:>8.3f} {s['p95']:>8.3f} {s['p99']:>8.3f} {s['max']:>8.3f}")
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    confirmed = report["outcomes"].get("confirmed", 0)
+    print(f"Beckn load: {report['flows']} flows, concurrency {report['concurrency']}, "
+          f"{len(report['bpps'])} BPP(s), catalog cache {'on' if report['cache'] else 'off'}")
+    print(f"  wall {report['wall_s']:.2f}s, throughput {report['throughput_per_s']:.1f} confirmed flows/s, "
+          f"confirmed {confirmed}/{report['flows']} ({100 * confirmed / max(report['flows'], 1):.1f}%)")
+    print("  latency of all flows (each stage counts the flows that ran it, failed or not):")
+    print_stages(report["stages"])
+    for outcome, stages in report["stages_by_outcome"].items():
+        print(f"  {outcome}: {report['outcomes'][outcome]}")
+        print_stages(stages)
+    for bpp in report["bpps"]:
+        injected = ", ".join(f"{k} {bpp[k]}" for k in ("requests", "errors", "callbacks", "dropped",
+                                                       "duplicated", "delayed", "reordered"))
+        print(f"  {bpp['bpp_id']}: {injected}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--flows", type=int, default=1000, help="flows to run [1000]")
+    parser.add_argument("--concurrency", type=int, default=1000, help="flows in flight at once [1000]")
+    parser.add_argument("--cache", action="store_true", help="use the catalog cache (default: every flow searches)")
+    parser.add_argument("--location", default="London")
+    parser.add_argument("--bpps", type=int, help="mock BPPs to broadcast searches to [1]")
+    parser.add_argument("--search-latency", help="e.g. const:2, uniform:0.5,3, normal:1,0.3, lognormal:0,0.5, exp:1")
+    parser.add_argument("--select-latency")
+    parser.add_argument("--confirm-latency")
+    parser.add_argument("--error-rate", type=float, help="share of requests answered with NACK/HTTP 500")
+    parser.add_argument("--drop-rate", type=float, help="share of callbacks never sent")
+    parser.add_argument("--duplicate-rate", type=float, help="share of callbacks sent twice")
+    parser.add_argument("--delay-rate", type=float, help="share of callbacks sent --delay-s late")
+    parser.add_argument("--reorder-rate", type=float, help="share of callbacks overtaken by the next one")
+    parser.add_argument("--delay-s", type=float)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--inventory", help="offers file for the mock BPPs (see bpp_inventory.py)")
+    parser.add_argument("--top-k", type=int, help="items per on_search catalog [20]")
+    parser.add_argument("--quorum", type=int, help="BECKN_SEARCH_QUORUM")
+    parser.add_argument("--deadline", type=float, help="BECKN_SEARCH_DEADLINE_S")
+    parser.add_argument("--callback-timeout", type=float, help="BECKN_CALLBACK_TIMEOUT_S (select/confirm)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the per-message BAP/BPP log")
+    args = parser.parse_args()
+
+    # Settings are read at import, so they go into the environment before the app is loaded
+    for option, setting in SETTINGS.items():
+        value = getattr(args, option)
+        if value is not None:
+            os.environ[setting] = str(value)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with log:
+        report = asyncio.run(run_load(args.flows, args.concurrency, args.cache, args.location))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import re
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -42,6 +43,7 @@ class Item(BaseModel):
     price: Optional[Price] = None
     category_id: Optional[str] = None
     fulfillment_id: Optional[str] = None
+    time: Optional[Dict[str, Any]] = None  # e.g. {"duration": "PT15M"}: lead time until dispatch
 
 class Provider(BaseModel):
     id: str
@@ -140,3 +142,18 @@ class BecknResponse(BaseModel):
     message: Ack
     error: Optional[Dict[str, Any]] = None
 
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+_DURATION = re.compile(r"^P(?:(\d+(?:\.\d+)?)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$")
+
+
+def parse_duration(value: Optional[str], default: float) -> float:
+    """Seconds in an ISO 8601 duration such as "PT30S" or "P1DT2H"; default if missing or invalid."""
+    match = _DURATION.match(value or "")
+    if not value or not match or not any(match.groups()):
+        return default
+    days, hours, minutes, seconds = (float(g) if g else 0.0 for g in match.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
@@ -1,78 +1,267 @@
 import asyncio
+import os
+import time
 import uuid
-from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional, Set, Tuple
 
-from beckn_bap import BecknClient, BAP_STATE
+from beckn_bap import BecknClient, DOMAIN, TRANSACTIONS, TRANSACTION_STORE, start_transaction, update_transaction
+from beckn_models import OnSearchRequest
+from catalog_cache import CATALOG_CACHE, CATALOG_CACHE_ENABLED
+from mock_bpp import MOCK_BPP_URIS
+from offer_book import OfferBook, BECKN_OFFER_STRATEGY
 
 # Configure Client
 # In production, these would be env vars
 BAP_ID = "deg-agent-bap"
 BAP_URI = "http://localhost:8000/beckn"  # Must be reachable by BPP
 BPP_URI = "http://localhost:8000/mock-bpp" # Target Gateway/BPP
+# Searches are broadcast to every BPP here (comma-separated); defaults to the mounted mock BPPs
+BPP_URIS = [uri for uri in os.getenv("BECKN_BPP_URIS", "").split(",") if uri] or MOCK_BPP_URIS
 
-client = BecknClient(BAP_ID, BAP_URI, BPP_URI)
+client = BecknClient(BAP_ID, BAP_URI, BPP_URI, BPP_URIS)
 
-async def poll_for_status(transaction_id: str, target_status: str, timeout: int = 10) -> bool:
-    """Poll state until status reached or timeout"""
-    start_time = datetime.utcnow()
-    while (datetime.utcnow() - start_time).total_seconds() < timeout:
-        state = BAP_STATE.get(transaction_id)
-        if state and state.get("status") == target_status:
-            return True
-        await asyncio.sleep(0.5)
-    return False
+# Seconds to wait for each BPP callback
+CALLBACK_TIMEOUT_S = float(os.getenv("BECKN_CALLBACK_TIMEOUT_S", "10"))
+# Beckn stages (searches, select+confirm) in flight per /beckn/execute call
+BECKN_CONCURRENCY = int(os.getenv("BECKN_CONCURRENCY", "16"))
+# A search returns once this many BPPs responded (0: every BPP that accepted it) or at the deadline
+BECKN_SEARCH_QUORUM = int(os.getenv("BECKN_SEARCH_QUORUM", "0"))
+BECKN_SEARCH_DEADLINE_S = float(os.getenv("BECKN_SEARCH_DEADLINE_S", str(CALLBACK_TIMEOUT_S)))
+# Responses arriving this long after a search returned still update the catalog cache
+BECKN_SEARCH_LATE_S = float(os.getenv("BECKN_SEARCH_LATE_S", "30"))
 
-async def execute_beckn_flow(action_type: str, location: str) -> Dict[str, Any]:
+# Late-response collectors still running after their search returned (kept referenced until done)
+_LATE_COLLECTORS = set()
+
+
+async def wait_for_status(transaction_id: str, target_status: str, timeout: float = CALLBACK_TIMEOUT_S) -> bool:
+    """Wait until the callback for target_status arrives, or the deadline passes"""
+    return await TRANSACTIONS.wait_for_status(transaction_id, target_status, timeout)
+
+async def _failed(transaction_id: str, reason: str) -> Dict[str, Any]:
+    """Mark the transaction finished (so it expires early) and build the failed result"""
+    await update_transaction(transaction_id, "FAILED")
+    return {"status": "failed", "reason": reason}
+
+def _lap(timings: Optional[Dict[str, float]], stage: str, started: float) -> float:
+    """Record the seconds since started for stage (when timing); returns now"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = now - started
+    return now
+
+
+async def collect_responses(transaction_id: str, on_response: Callable[[OnSearchRequest], None],
+                            seen: Set[str], quorum: int, deadline: float) -> None:
     """
-    Orchestrate the full Beckn flow for a single action:
-    Search -> (Wait) -> Select -> (Wait) -> Confirm -> (Wait)
+    Pass each new on_search of the transaction to on_response until `quorum`
+    BPPs (counting `seen`) have responded or the loop time reaches `deadline`.
+    Each callback wakes this loop once and only the responses of BPPs not in
+    `seen` are fetched (and, with SQLite, parsed).
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        responses = await TRANSACTION_STORE.new_responses(transaction_id, seen)
+        if responses is None:
+            return
+        for bpp_id, response in responses.items():
+            seen.add(bpp_id)
+            on_response(response)
+        remaining = deadline - loop.time()
+        if len(seen) >= quorum or remaining <= 0:
+            return
+        await TRANSACTIONS.wait_for_update(transaction_id, "SEARCH_COMPLETED", remaining)
+
+
+async def _collect_late(transaction_id: str, on_response: Callable[[OnSearchRequest], None],
+                        seen: Set[str], expected: int) -> None:
+    try:
+        await collect_responses(transaction_id, on_response, seen, expected,
+                                asyncio.get_running_loop().time() + BECKN_SEARCH_LATE_S)
+    finally:
+        await update_transaction(transaction_id, "CLOSED")
+
+
+async def search_catalog(action_type: str, location: str,
+                         on_response: Optional[Callable[[OnSearchRequest], None]] = None) -> Dict[str, Any]:
+    """
+    Search -> (Wait): broadcast to every BPP and collect on_search responses
+    until BECKN_SEARCH_QUORUM BPPs answered or BECKN_SEARCH_DEADLINE_S passed.
+
+    Returns {"status": "ok", "offers": OfferBook, "bpp_ids": [...]} or a failed
+    result. With on_response, every response (including ones arriving up to
+    BECKN_SEARCH_LATE_S after the search returned) is also passed to it.
     """
     transaction_id = str(uuid.uuid4())
-    print(f"Orchestrator: Starting flow {transaction_id} for {action_type}")
-    
-    # 1. Trigger Search
+    print(f"Orchestrator: Starting search {transaction_id} for {action_type} in {location}")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BECKN_SEARCH_DEADLINE_S
+
+    # 1. Trigger Search (start_transaction happens inside, before any callback can land)
     sent = await client.trigger_search(action_type, transaction_id)
     if not sent:
-        return {"status": "failed", "reason": "Search request failed"}
-        
-    # 2. Wait for on_search
-    if not await poll_for_status(transaction_id, "SEARCH_COMPLETED"):
-         return {"status": "failed", "reason": "Search timeout or no providers"}
-    
-    # 3. Process Catalog & Select Best
-    catalog = BAP_STATE[transaction_id].get("catalog")
-    if not catalog or not catalog.providers:
-         return {"status": "failed", "reason": "No providers returned in catalog"}
-         
-    # Simple logic: pick first item from first provider
-    provider = catalog.providers[0]
-    item = provider.items[0]
+        return await _failed(transaction_id, "Search request failed")
+
+    # 2. Collect on_search responses
+    book = OfferBook()
+
+    def add(response: OnSearchRequest) -> None:
+        book.add(response)
+        if on_response is not None:
+            on_response(response)
+
+    seen: Set[str] = set()
+    quorum = min(BECKN_SEARCH_QUORUM, sent) if BECKN_SEARCH_QUORUM > 0 else sent
+    await collect_responses(transaction_id, add, seen, quorum, deadline)
+    if not seen:
+        return await _failed(transaction_id, "Search timeout or no providers")
+    print(f"Orchestrator: Search {transaction_id}: {len(seen)}/{sent} BPPs responded, {len(book)} offers")
+
+    if on_response is not None and len(seen) < sent:
+        task = asyncio.ensure_future(_collect_late(transaction_id, on_response, seen, sent))
+        _LATE_COLLECTORS.add(task)
+        task.add_done_callback(_LATE_COLLECTORS.discard)
+    else:
+        # Orders run in transactions of their own, so the search is done here
+        await update_transaction(transaction_id, "CLOSED")
+    if not len(book):
+        return {"status": "failed", "reason": "No providers returned in catalog"}
+    return {"status": "ok", "offers": book, "bpp_ids": sorted(seen)}
+
+
+async def search_and_cache(action_type: str, location: str) -> Dict[str, Any]:
+    """Search, caching each BPP's response for as long as its context ttl allows."""
+    query = (DOMAIN, action_type, location)
+    if not CATALOG_CACHE_ENABLED:
+        return await search_catalog(action_type, location)
+    return await search_catalog(action_type, location, lambda response: CATALOG_CACHE.put(query, response))
+
+
+async def get_catalog(action_type: str, location: str, bypass_cache: bool = False) -> Dict[str, Any]:
+    """
+    Offers for (action_type, location): from CATALOG_CACHE when fresh, otherwise
+    from a search (shared with any concurrent search for the same query).
+    Hits close to expiry refresh the cache in the background.
+    """
+    query = (DOMAIN, action_type, location)
+    if bypass_cache or not CATALOG_CACHE_ENABLED:
+        return await search_and_cache(action_type, location)
+
+    book = CATALOG_CACHE.get(query)
+    if book is None or not len(book):
+        return await CATALOG_CACHE.search_once(query, lambda: search_and_cache(action_type, location))
+
+    if CATALOG_CACHE.should_refresh(query):
+        CATALOG_CACHE.refresh_in_background(query, lambda: search_and_cache(action_type, location))
+    return {"status": "ok", "offers": book, "bpp_ids": book.bpp_ids, "cached": True}
+
+
+async def order_from_catalog(search: Dict[str, Any], strategy: str = BECKN_OFFER_STRATEGY,
+                             timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Select -> (Wait) -> Confirm -> (Wait) for the best offer (by strategy:
+    price, eta or score) of a search from get_catalog, with the BPP that made it.
+
+    Each order runs in its own transaction, so several orders can be placed
+    from one search or cached catalog concurrently. With `timings`, the
+    seconds spent in the "select" and "confirm" stages are recorded there.
+    """
+    if search["status"] != "ok":
+        return search
+    # 3. Select Best Offer
+    offer = search["offers"].best(strategy)
+    if offer is None:
+        return {"status": "failed", "reason": "No providers returned in catalog"}
+    provider, item = offer.provider, offer.item
+    transaction_id = str(uuid.uuid4())
+    await start_transaction(transaction_id, "SEARCH_COMPLETED")
     
     # 4. Trigger Select
-    sent = await client.trigger_select(transaction_id, provider.id, item.id)
+    started = time.perf_counter()
+    sent = await client.trigger_select(transaction_id, provider.id, item.id, offer.bpp_uri)
     if not sent:
-        return {"status": "failed", "reason": "Select request failed"}
+        _lap(timings, "select", started)
+        return await _failed(transaction_id, "Select request failed")
         
     # 5. Wait for on_select
-    if not await poll_for_status(transaction_id, "SELECT_COMPLETED"):
-        return {"status": "failed", "reason": "Select timeout"}
+    selected = await wait_for_status(transaction_id, "SELECT_COMPLETED")
+    started = _lap(timings, "select", started)
+    if not selected:
+        return await _failed(transaction_id, "Select timeout")
         
     # 6. Trigger Confirm
-    sent = await client.trigger_confirm(transaction_id, item.id)
+    sent = await client.trigger_confirm(transaction_id, item.id, offer.bpp_uri)
     if not sent:
-        return {"status": "failed", "reason": "Confirm request failed"}
+        _lap(timings, "confirm", started)
+        return await _failed(transaction_id, "Confirm request failed")
         
     # 7. Wait for on_confirm
-    if not await poll_for_status(transaction_id, "CONFIRM_COMPLETED"):
-        return {"status": "failed", "reason": "Confirm timeout"}
+    confirmed = await wait_for_status(transaction_id, "CONFIRM_COMPLETED")
+    _lap(timings, "confirm", started)
+    if not confirmed:
+        return await _failed(transaction_id, "Confirm timeout")
         
     # Success!
-    confirmed_order = BAP_STATE[transaction_id].get("confirmed_order")
+    record = await TRANSACTION_STORE.get(transaction_id)
+    if record is None:
+        return await _failed(transaction_id, "Transaction expired")
+    confirmed_order = record.confirmed_order
     
     return {
         "status": "confirmed",
         "provider": provider.descriptor.name,
+        "bpp_id": offer.bpp_id,
+        "item_id": item.id,
+        "price": item.price.value if item.price else None,
         "details": f"Order ID: {confirmed_order.id}, State: {confirmed_order.state}",
         "transaction_id": transaction_id
     }
+
+
+async def execute_beckn_flow(action_type: str, location: str, bypass_cache: bool = False,
+                             strategy: str = BECKN_OFFER_STRATEGY,
+                             timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Orchestrate the full Beckn flow for a single action:
+    Search (or cached catalog) -> (Wait) -> Select -> (Wait) -> Confirm -> (Wait)
+
+    With `timings`, the seconds spent per stage ("search", "select",
+    "confirm") are recorded there.
+    """
+    started = time.perf_counter()
+    search = await get_catalog(action_type, location, bypass_cache)
+    _lap(timings, "search", started)
+    return await order_from_catalog(search, strategy, timings)
+
+
+async def execute_beckn_flows(requests: List[Tuple[str, str]], concurrency: int = BECKN_CONCURRENCY,
+                              bypass_cache: bool = False, strategy: str = BECKN_OFFER_STRATEGY) -> List[Dict[str, Any]]:
+    """
+    Run the Beckn flow for many (action_type, location) pairs concurrently.
+
+    Pairs with the same action_type and location share one catalog (cached or
+    searched); select/confirm then run per request. At most `concurrency`
+    Beckn stages are in flight at once. Results are in request order.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    searches: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def bounded_search(action_type: str, location: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await get_catalog(action_type, location, bypass_cache)
+
+    async def run(key: Tuple[str, str]) -> Dict[str, Any]:
+        search = await searches[key]
+        async with semaphore:
+            return await order_from_catalog(search, strategy)
+
+    for key in requests:
+        if key not in searches:
+            searches[key] = asyncio.ensure_future(bounded_search(*key))
+    if len(searches) < len(requests):
+        print(f"Orchestrator: {len(requests)} actions share {len(searches)} searches")
+    try:
+        return await asyncio.gather(*(run(key) for key in requests))
+    finally:
+        for task in searches.values():
+            task.cancel()
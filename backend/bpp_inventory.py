@@ -0,0 +1,277 @@
+"""
+Indexed offer inventory for the mock BPP.
+
+Offers are loaded once (from MOCK_BPP_INVENTORY, a JSON array or JSON Lines
+file, or the small built-in INVENTORY) and numbered in ascending price order,
+so every index below is already price-sorted:
+
+    category -> offer numbers
+    token    -> offer numbers (words of category, name, description, provider)
+    provider -> offer numbers
+
+The index is built once and shared; each mock BPP's Inventory adds
+pre-serialized JSON for every Item (with its own price factor and ETA) and
+provider header, so answering a search is index lookups plus a string join;
+no Pydantic objects are built per request.
+
+Intent queries (message.intent of /search):
+    item.descriptor.name    category id, or free text: offers containing all its known words
+    category.id             category id (takes precedence)
+    provider.id             only this provider's offers
+    item.price              {"minimum_value": .., "maximum_value": ..} (before the BPP's price factor)
+    item.page               {"offset": 0, "limit": MOCK_BPP_TOP_K}, limit capped at MOCK_BPP_MAX_LIMIT
+
+Results are the cheapest matching offers first; unmatched queries get the
+"fallback" category. The catalog descriptor reports the page, e.g.
+"Items 1-20 of 48213".
+
+Offer records: {"id", "name", "price", "category", "desc"?, "provider"?, "provider_id"?}.
+To write a synthetic inventory for load tests:
+    python bpp_inventory.py 50000 offers.jsonl
+"""
+
+import bisect
+import json
+import os
+import random
+import re
+import sys
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from beckn_models import Descriptor, Item, Price, Intent
+
+MOCK_BPP_INVENTORY = os.getenv("MOCK_BPP_INVENTORY", "")
+# Items per on_search page
+MOCK_BPP_TOP_K = int(os.getenv("MOCK_BPP_TOP_K", "20"))
+# Largest page a search may ask for through item.page.limit
+MOCK_BPP_MAX_LIMIT = int(os.getenv("MOCK_BPP_MAX_LIMIT", "500"))
+
+FALLBACK_CATEGORY = "fallback"
+
+# Provider behind each built-in category
+PROVIDERS = {
+    "dispatch_battery_discharge": "Tesla Virtual Power Plant",
+    "reduce_ev_load": "ChargePoint Network",
+    "shift_hvac_load": "Honeywell Smart Grid Solutions",
+}
+DEFAULT_PROVIDER = "Mock Provider Services"
+
+# Mock Data Inventory
+INVENTORY = {
+    "dispatch_battery_discharge": [
+        {"id": "vpp_discharge_500", "name": "Residential Battery Discharge (500kWh)", "price": "0.15", "desc": "Virtual Power Plant A"},
+        {"id": "comm_battery_1mw", "name": "Commercial Battery Export (1MW)", "price": "0.12", "desc": "Industrial Storage Unit"}
+    ],
+    "reduce_ev_load": [
+        {"id": "ev_curtail_lv1", "name": "EV Smart Charging Curtailment (Level 1)", "price": "0.10", "desc": "ChargePoint Network - 20% Reduction"},
+        {"id": "ev_curtail_lv2", "name": "EV Smart Charging Curtailment (Level 2)", "price": "0.25", "desc": "ChargePoint Network - 50% Reduction"}
+    ],
+    "shift_hvac_load": [
+        {"id": "hvac_shift_office", "name": "Commercial HVAC Load Shift", "price": "0.08", "desc": "Office Park Flex Program"},
+        {"id": "hvac_shift_retail", "name": "Retail Center Pre-Cooling", "price": "0.09", "desc": "Retail Flex Network"}
+    ],
+    "fallback": [
+        {"id": "generic_flex", "name": "General Flexibility Service", "price": "0.20", "desc": "Standard Demand Response"}
+    ]
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokens(text: str) -> List[str]:
+    """Lower-case alphanumeric words ("reduce_ev_load" -> reduce, ev, load)."""
+    return _TOKEN.findall(text.lower())
+
+
+def builtin_offers() -> List[Dict[str, Any]]:
+    return [{**offer, "category": category} for category, offers in INVENTORY.items() for offer in offers]
+
+
+@lru_cache(maxsize=None)
+def load_offers(path: str = MOCK_BPP_INVENTORY) -> Tuple[Dict[str, Any], ...]:
+    """Offer records from a JSON array or JSON Lines file; the built-in INVENTORY without a path."""
+    if not path:
+        return tuple(builtin_offers())
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        offers = json.loads(text)
+    else:
+        offers = [json.loads(line) for line in text.splitlines() if line.strip()]
+    print(f"BPP: Loaded {len(offers)} offers from {path}")
+    return tuple(offers)
+
+
+def _query_price(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _query_count(value: Any, default: int, upper: int) -> int:
+    """A client-supplied page offset / limit clamped to [0, upper]; default if it is not a number."""
+    try:
+        count = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return min(max(count, 0), upper)
+
+
+def _query_dict(mapping: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """mapping[key] if it is an object; intents are client input, so anything else counts as absent."""
+    value = mapping.get(key)
+    return value if isinstance(value, dict) else {}
+
+
+def _query_str(mapping: Dict[str, Any], key: str) -> str:
+    value = mapping.get(key)
+    return value if isinstance(value, str) else ""
+
+
+class OfferIndex:
+    """Offers numbered in ascending price order, with category, token and provider postings.
+
+    Every posting list is ascending by offer number and therefore by price, so a
+    price range is a bisection and the first matches are the cheapest.
+    """
+
+    def __init__(self, offers: Tuple[Dict[str, Any], ...]):
+        self.offers = sorted(offers, key=lambda o: float(o["price"]))
+        self.prices: List[float] = [float(o["price"]) for o in self.offers]
+        self.providers: List[str] = []  # offer number -> provider id
+        self.provider_names: Dict[str, str] = {}  # provider id -> name
+        # ("category", id) / ("token", word) / ("provider", id) -> offer numbers
+        self.postings: Dict[Tuple[str, str], List[int]] = {}
+        self._sets: Dict[Tuple[str, str], Set[int]] = {}
+        for n, offer in enumerate(self.offers):
+            category = offer["category"]
+            provider_id = offer.get("provider_id") or f"prov_{category}"
+            provider_name = self.provider_names.setdefault(
+                provider_id, offer.get("provider") or PROVIDERS.get(category, DEFAULT_PROVIDER))
+            self.providers.append(provider_id)
+            words = {*tokens(category), *tokens(offer["name"]), *tokens(offer.get("desc") or ""), *tokens(provider_name)}
+            for key in [("category", category), ("provider", provider_id), *(("token", w) for w in words)]:
+                self.postings.setdefault(key, []).append(n)
+
+    def __len__(self) -> int:
+        return len(self.offers)
+
+    def _posting_set(self, key: Tuple[str, str]) -> Set[int]:
+        if key not in self._sets:
+            self._sets[key] = set(self.postings[key])
+        return self._sets[key]
+
+    def _terms(self, intent: Intent) -> List[Tuple[str, str]]:
+        """Posting keys every match must be in: the category, else the known words of the query."""
+        category = _query_str(intent.category or {}, "id")
+        name = _query_str(_query_dict(intent.item or {}, "descriptor"), "name")
+        for key in [("category", category), ("category", name)]:
+            if key in self.postings:
+                terms = [key]
+                break
+        else:
+            terms = [key for key in {("token", w) for w in tokens(name)} if key in self.postings]
+        if not terms:
+            terms = [("category", FALLBACK_CATEGORY)]
+        provider_id = _query_str(intent.provider or {}, "id")
+        if provider_id:
+            terms.append(("provider", provider_id))
+        return terms
+
+    def search(self, intent: Intent) -> Tuple[List[int], int, int]:
+        """Matching offer numbers for the intent's page, cheapest first; returns (page, total, offset)."""
+        item = intent.item or {}
+        price = _query_dict(item, "price")
+        page = _query_dict(item, "page")
+        low, high = _query_price(price.get("minimum_value")), _query_price(price.get("maximum_value"))
+        offset = _query_count(page.get("offset"), 0, len(self.offers))
+        limit = _query_count(page.get("limit"), MOCK_BPP_TOP_K, MOCK_BPP_MAX_LIMIT)
+
+        terms = sorted(self._terms(intent), key=lambda key: len(self.postings.get(key, ())))
+        head = self.postings.get(terms[0], [])
+        # Offer numbers run in price order, so the price range is a range of offer numbers
+        first = bisect.bisect_left(self.prices, low) if low is not None else 0
+        last = bisect.bisect_right(self.prices, high) if high is not None else len(self.prices)
+        matches = head[bisect.bisect_left(head, first):bisect.bisect_left(head, last)]
+        for key in terms[1:]:
+            other = self._posting_set(key) if key in self.postings else set()
+            matches = [n for n in matches if n in other]
+        return matches[offset:offset + limit], len(matches), offset
+
+
+@lru_cache(maxsize=None)
+def load_index(path: str = MOCK_BPP_INVENTORY) -> OfferIndex:
+    """The index over load_offers(path), built once and shared by all mock BPPs."""
+    return OfferIndex(load_offers(path))
+
+
+class Inventory:
+    """One BPP's catalog: the shared index plus its own pre-serialized Items and provider headers."""
+
+    def __init__(self, index: OfferIndex, price_factor: float = 1.0, eta_minutes: int = 15,
+                 name_suffix: str = "", currency: str = "GBP"):
+        self.index = index
+        eta = {"duration": f"PT{eta_minutes}M"}
+        self._items: List[str] = [  # offer number -> Item JSON
+            Item(
+                id=offer["id"],
+                descriptor=Descriptor(name=offer["name"], short_desc=offer.get("desc")),
+                price=Price(currency=currency, value=f"{price * price_factor:.2f}"),
+                category_id=offer["category"],
+                fulfillment_id="ful_1",
+                time=eta,
+            ).model_dump_json()
+            for offer, price in zip(index.offers, index.prices)
+        ]
+        self._provider_headers: Dict[str, str] = {  # provider id -> '{"id":..,"descriptor":..,"items":['
+            provider_id: f'{{"id":{json.dumps(provider_id)},"descriptor":'
+                         f'{Descriptor(name=name + name_suffix).model_dump_json()},"items":['
+            for provider_id, name in index.provider_names.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def catalog_json(self, intent: Intent, name: str = "Mock BPP Catalog") -> str:
+        """Serialized Catalog answering the intent, assembled from the pre-serialized fragments."""
+        page, total, offset = self.index.search(intent)
+        by_provider: Dict[str, List[str]] = {}
+        for n in page:
+            by_provider.setdefault(self.index.providers[n], []).append(self._items[n])
+        shown = f"Items {offset + 1}-{offset + len(page)} of {total}" if page else f"No items of {total}"
+        descriptor = Descriptor(name=name, short_desc=shown).model_dump_json()
+        providers = ",".join(self._provider_headers[p] + ",".join(items) + "]}" for p, items in by_provider.items())
+        return f'{{"descriptor":{descriptor},"providers":[{providers}]}}'
+
+
+def generate_offers(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic offers across the built-in categories, for load tests."""
+    rng = random.Random(seed)
+    categories = [c for c in INVENTORY if c != FALLBACK_CATEGORY]
+    sizes = ["50kW", "100kW", "250kW", "500kW", "1MW", "2MW"]
+    offers = []
+    for n in range(count):
+        category = categories[n % len(categories)]
+        base = INVENTORY[category][n % len(INVENTORY[category])]
+        provider = n % 50
+        offers.append({
+            "id": f"{base['id']}_{n}",
+            "name": f"{base['name']} {rng.choice(sizes)} #{n}",
+            "desc": base["desc"],
+            "price": f"{rng.uniform(0.05, 0.40):.3f}",
+            "category": category,
+            "provider": f"{PROVIDERS[category]} Partner {provider}",
+            "provider_id": f"prov_{category}_{provider}",
+        })
+    return offers
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python bpp_inventory.py <count> <path.jsonl>")
+    with open(sys.argv[2], "w", encoding="utf-8") as out:
+        for offer in generate_offers(int(sys.argv[1])):
+            out.write(json.dumps(offer) + "\n")
+    print(f"Wrote {sys.argv[1]} offers to {sys.argv[2]}")
@@ -0,0 +1,181 @@
+"""
+Cache of provider catalogs returned by on_search.
+
+Entries are keyed by (domain, action_type, location, bpp_id) and hold one BPP's
+on_search response for as long as its context `ttl` allows (ISO 8601 duration,
+e.g. "PT30S"). Each (domain, action_type, location) query also keeps an
+OfferBook over its fresh responses, updated as responses arrive or expire, so
+a hit is ready for best-offer selection. When an entry is within
+CATALOG_REFRESH_AHEAD of expiring, a hit triggers one background re-search so
+that hot flows keep skipping the search stage. Concurrent misses for the same
+query share one search.
+
+Locations are free-form, so the cache holds at most CATALOG_MAX_QUERIES queries
+(least recently used evicted first), and a background sweeper started from the
+FastAPI lifespan drops expired responses of queries nobody asks for again.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+
+from beckn_models import OnSearchRequest, parse_duration as _parse_duration
+from offer_book import OfferBook
+
+CATALOG_DEFAULT_TTL_S = float(os.getenv("CATALOG_DEFAULT_TTL_S", "30"))
+# Refresh once less than this fraction of an entry's TTL is left
+CATALOG_REFRESH_AHEAD = float(os.getenv("CATALOG_REFRESH_AHEAD", "0.2"))
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "1") != "0"
+CATALOG_MAX_QUERIES = int(os.getenv("CATALOG_MAX_QUERIES", "1000"))
+CATALOG_SWEEP_S = float(os.getenv("CATALOG_SWEEP_S", "30"))
+
+Query = Tuple[str, str, str]  # (domain, action_type, location)
+
+
+def parse_duration(value: Optional[str], default: float = CATALOG_DEFAULT_TTL_S) -> float:
+    """Seconds in a context ttl; CATALOG_DEFAULT_TTL_S if missing or invalid."""
+    return _parse_duration(value, default)
+
+
+class CatalogEntry:
+    __slots__ = ("response", "bpp_id", "fetched", "expires")
+
+    def __init__(self, response: OnSearchRequest, bpp_id: str, ttl_s: float):
+        self.response = response
+        self.bpp_id = bpp_id
+        self.fetched = time.monotonic()
+        self.expires = self.fetched + ttl_s
+
+    def remaining(self, now: float) -> float:
+        return self.expires - now
+
+
+class CatalogCache:
+    def __init__(self, refresh_ahead: float = CATALOG_REFRESH_AHEAD, max_queries: int = CATALOG_MAX_QUERIES):
+        self.refresh_ahead = refresh_ahead
+        self.max_queries = max_queries
+        # query -> bpp_id -> entry, least recently used query first
+        self._entries: "OrderedDict[Query, Dict[str, CatalogEntry]]" = OrderedDict()
+        self._books: Dict[Query, OfferBook] = {}
+        self._inflight: Dict[Query, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def _expire(self, query: Query, now: float) -> int:
+        """Drop the query's expired responses (and the query once none are left); returns how many."""
+        by_bpp = self._entries[query]
+        book = self._books[query]
+        stale = [b for b, e in by_bpp.items() if e.remaining(now) <= 0]
+        for bpp_id in stale:
+            del by_bpp[bpp_id]
+            book.remove(bpp_id)
+        if not by_bpp:
+            del self._entries[query]
+            del self._books[query]
+        self.expired += len(stale)
+        return len(stale)
+
+    def get(self, query: Query) -> Optional[OfferBook]:
+        """Offers from the query's fresh responses (expired ones are dropped), or None."""
+        if query not in self._entries:
+            self.misses += 1
+            return None
+        self._expire(query, time.monotonic())
+        if query not in self._entries:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(query)
+        self.hits += 1
+        return self._books[query]
+
+    def put(self, query: Query, response: OnSearchRequest) -> None:
+        """Cache one BPP's response for its context ttl."""
+        ttl_s = parse_duration(response.context.ttl)
+        if ttl_s <= 0:
+            return
+        bpp_id = response.context.bpp_id or response.context.bpp_uri or "unknown"
+        self._entries.setdefault(query, {})[bpp_id] = CatalogEntry(response, bpp_id, ttl_s)
+        self._entries.move_to_end(query)
+        self._books.setdefault(query, OfferBook()).add(response)
+        while len(self._entries) > self.max_queries:
+            evicted, _ = self._entries.popitem(last=False)
+            del self._books[evicted]
+            self.evicted += 1
+
+    def sweep(self) -> int:
+        """Drop expired responses of every query; returns how many were dropped."""
+        now = time.monotonic()
+        return sum(self._expire(query, now) for query in list(self._entries))
+
+    def should_refresh(self, query: Query) -> bool:
+        now = time.monotonic()
+        return any(e.remaining(now) < self.refresh_ahead * (e.expires - e.fetched)
+                   for e in self._entries.get(query, {}).values())
+
+    async def search_once(self, query: Query, search: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `search` for the query, joining one already in flight."""
+        task = self._inflight.get(query)
+        if task is None:
+            task = self._inflight[query] = asyncio.ensure_future(search())
+            task.add_done_callback(lambda _: self._inflight.pop(query, None))
+        return await asyncio.shield(task)
+
+    def refresh_in_background(self, query: Query, search: Callable[[], Awaitable[Any]]) -> None:
+        """Start a refresh search unless one is already running."""
+        if query in self._inflight:
+            return
+        self.refreshes += 1
+        task = self._inflight[query] = asyncio.ensure_future(search())
+        task.add_done_callback(lambda _: self._inflight.pop(query, None))
+
+    def invalidate(self, domain: Optional[str] = None, action_type: Optional[str] = None,
+                   location: Optional[str] = None) -> int:
+        """Drop matching catalogs (None matches anything); returns how many were dropped."""
+        dropped = 0
+        for query in list(self._entries):
+            if all(want is None or want == have for want, have in zip((domain, action_type, location), query)):
+                dropped += len(self._entries.pop(query))
+                del self._books[query]
+        self.invalidations += dropped
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "enabled": CATALOG_CACHE_ENABLED,
+            "queries": len(self._entries),
+            "catalogs": sum(len(b) for b in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "max_queries": self.max_queries,
+            "entries": [
+                {"domain": q[0], "action_type": q[1], "location": q[2], "bpp_id": bpp_id,
+                 "expires_in_s": round(e.remaining(now), 1)}
+                for q, by_bpp in self._entries.items() for bpp_id, e in by_bpp.items()
+            ],
+        }
+
+
+CATALOG_CACHE = CatalogCache()
+
+
+async def sweep_periodically(cache: CatalogCache, interval_s: float = CATALOG_SWEEP_S) -> None:
+    """Background task: sweep the cache every interval_s until cancelled."""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            removed = cache.sweep()
+            if removed:
+                print(f"BAP: Expired {removed} cached catalogs")
+        except Exception as e:
+            print(f"BAP: Catalog sweep failed: {e}")
@@ -0,0 +1,170 @@
+"""
+Monte Carlo ensemble runner - risk-level probabilities under forecast uncertainty.
+
+Weather members are drawn around the scenario's deterministic forecast and
+evaluated in a process pool. Workers load the asset table themselves (from the
+shared ASSET_STORE, memory-mapped when the columnar layout is present), so tasks
+only carry a seed and a member count and return small per-asset count arrays.
+Each task also carries the digest of the parent's snapshot, so counts are never
+mapped onto the ids of a different asset file version.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from risk_engine import AssetTable, RISK_LEVELS, NO_RISK, risk_levels
+
+# Forecast spread (in production these would come from the forecast provider)
+TEMP_SIGMA_C = 1.5  # Std dev of peak temperature
+RAIN_SIGMA = 0.25  # Log-normal sigma of rainfall totals
+ENSEMBLE_WORKERS = int(os.getenv("ENSEMBLE_WORKERS", "0")) or os.cpu_count() or 1
+CHUNKS_PER_WORKER = 4
+# Largest ensemble one request may ask for (each member is a full risk evaluation)
+ENSEMBLE_MAX_MEMBERS = int(os.getenv("ENSEMBLE_MAX_MEMBERS", "100000"))
+
+_POOL: Optional[ProcessPoolExecutor] = None
+
+# Per-worker cache: (snapshot digest, location) -> AssetTable
+_WORKER_TABLES: Dict[tuple, AssetTable] = {}
+
+
+class SnapshotChanged(Exception):
+    """The asset file changed between the request's snapshot and a worker's."""
+
+
+def draw_members(event_type: str, weather_data: Dict[str, Any], n: int, rng: np.random.Generator) -> List[Dict[str, Any]]:
+    """Perturb the deterministic forecast into n weather members."""
+    members = []
+    if event_type == "heatwave":
+        temps = rng.normal(weather_data.get("max_temp_celsius", 0), TEMP_SIGMA_C, n)
+        for t in temps:
+            members.append({**weather_data, "max_temp_celsius": round(float(t), 1)})
+    elif event_type == "flood":
+        # Storm totals and peak intensity scale together, with some independent noise
+        scale = rng.lognormal(0, RAIN_SIGMA, n)
+        burst = scale * rng.lognormal(0, RAIN_SIGMA / 2, n)
+        total = weather_data.get("total_rainfall_mm", 0)
+        peak = weather_data.get("max_rainfall_per_hour_mm", 0)
+        for s, b in zip(scale, burst):
+            members.append({**weather_data, "total_rainfall_mm": round(float(total * s), 1),
+                            "max_rainfall_per_hour_mm": round(float(peak * b), 1)})
+    else:
+        members = [dict(weather_data) for _ in range(n)]
+    return members
+
+
+def _worker_table(location: str, digest: str) -> AssetTable:
+    from utils import ASSET_STORE  # Imported in the worker, not pickled from the parent
+    snapshot = ASSET_STORE.snapshot()
+    if snapshot.digest != digest:
+        raise SnapshotChanged(f"worker has asset snapshot {snapshot.digest}, request has {digest}")
+    key = (digest, location)
+    table = _WORKER_TABLES.get(key)
+    if table is None:
+        # A new snapshot means the asset file changed; drop tables built from older ones
+        for stale in [k for k in _WORKER_TABLES if k[0] != key[0]]:
+            del _WORKER_TABLES[stale]
+        table = _WORKER_TABLES[key] = snapshot.subtable(snapshot.select(location))
+    return table
+
+
+def run_members(event_type: str, weather_data: Dict[str, Any], location: str, digest: str,
+                seed: np.random.SeedSequence, n_members: int) -> np.ndarray:
+    """
+    Evaluate n_members perturbed forecasts (runs inside a pool worker).
+
+    Returns:
+        int32 array of shape (assets, len(RISK_LEVELS)) with level counts
+
+    Raises:
+        SnapshotChanged: if the worker's asset snapshot is not the one with `digest`
+    """
+    table = _worker_table(location, digest)
+    counts = np.zeros((len(table), len(RISK_LEVELS)), dtype=np.int32)
+    rows = np.arange(len(table))
+    for member in draw_members(event_type, weather_data, n_members, np.random.default_rng(seed)):
+        levels = risk_levels(event_type, member, table)
+        at_risk = levels != NO_RISK
+        counts[rows[at_risk], levels[at_risk]] += 1
+    return counts
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all ensemble requests (created on first use)."""
+    global _POOL
+    if _POOL is None:
+        # spawn: never fork a process that is running an event loop and threads
+        _POOL = ProcessPoolExecutor(max_workers=ENSEMBLE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _POOL
+
+
+def shutdown_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+async def _run_chunks(event_type: str, weather_data: Dict[str, Any], location: str, digest: str,
+                      members: int, seed: Optional[int]) -> List[np.ndarray]:
+    n_chunks = max(1, min(members, ENSEMBLE_WORKERS * CHUNKS_PER_WORKER))
+    sizes = [members // n_chunks + (1 if i < members % n_chunks else 0) for i in range(n_chunks)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    return await asyncio.gather(*(
+        loop.run_in_executor(pool, run_members, event_type, weather_data, location, digest, s, size)
+        for s, size in zip(seeds, sizes)
+    ))
+
+
+async def run_ensemble(event_type: str, weather_data: Dict[str, Any], location: str,
+                       members: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Run a Monte Carlo ensemble and return per-asset risk-level probabilities.
+
+    Args:
+        event_type: "heatwave" or "flood"
+        weather_data: Deterministic forecast the members are drawn around
+        location: Location whose assets are evaluated
+        members: Number of ensemble members
+        seed: Optional seed for reproducible ensembles
+
+    Returns:
+        One dict per asset with p_critical / p_high / p_medium / p_low / p_none,
+        most likely to go CRITICAL first
+
+    Raises:
+        SnapshotChanged: if the asset file kept changing while workers ran (retried once)
+    """
+    from utils import ASSET_STORE
+    for attempt in range(2):
+        snapshot = ASSET_STORE.snapshot()
+        try:
+            results = await _run_chunks(event_type, weather_data, location, snapshot.digest, members, seed)
+            break
+        except SnapshotChanged as e:
+            # The file changed mid-request; parent and workers reload it on the next snapshot()
+            print(f"Ensemble: Asset snapshot changed ({e}), {'retrying' if attempt == 0 else 'giving up'}")
+            if attempt == 1:
+                raise
+    table = snapshot.subtable(snapshot.select(location))
+
+    counts = np.sum(results, axis=0) if results else np.zeros((len(table), len(RISK_LEVELS)))
+    probabilities = counts / max(members, 1)
+    order = np.lexsort(tuple(-probabilities[:, k] for k in reversed(range(len(RISK_LEVELS)))))
+
+    return [
+        {
+            "asset_id": table.ids[i],
+            **{f"p_{level.lower()}": float(probabilities[i, k]) for k, level in enumerate(RISK_LEVELS)},
+            "p_none": float((members - counts[i].sum()) / max(members, 1)),
+        }
+        for i in order.tolist()
+    ]
@@ -0,0 +1,85 @@
+"""
+Process-wide pooled HTTP client for Beckn traffic.
+
+One httpx.AsyncClient is created in the FastAPI lifespan and shared by the BAP
+(outgoing search/select/confirm) and the mock BPP (on_* callbacks), so
+messages reuse warm keep-alive connections instead of opening a new one each.
+
+At most HTTP_MAX_CONNECTIONS requests enter the connection pool at once; the
+rest wait their turn on a semaphore. httpcore rescans every pooled connection
+for every queued request whenever one finishes, so letting thousands of
+requests queue inside the pool costs O(queued x connections) CPU per
+completion and stalls the event loop.
+
+Configuration (env):
+    HTTP_MAX_CONNECTIONS     [100]  total pooled connections
+    HTTP_MAX_KEEPALIVE       [20]   idle connections kept open
+    HTTP_KEEPALIVE_EXPIRY_S  [30]
+    HTTP_TIMEOUT_S           [10]   read/write/pool timeout
+    HTTP_CONNECT_TIMEOUT_S   [5]
+    HTTP_HTTP2               [0]    1 enables HTTP/2 (needs `pip install "httpx[http2]"`)
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "10"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "0") == "1"
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+class _AdmittingClient(httpx.AsyncClient):
+    """AsyncClient that admits at most max_in_flight requests into its pool."""
+
+    def __init__(self, max_in_flight: int, **kwargs):
+        super().__init__(**kwargs)
+        self._admission = asyncio.Semaphore(max(max_in_flight, 1))
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        async with self._admission:
+            return await super().send(request, **kwargs)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("Warning: HTTP_HTTP2=1 but the h2 package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def start_http_client() -> httpx.AsyncClient:
+    """Create the shared client (called from the app lifespan)."""
+    global _CLIENT
+    _CLIENT = _AdmittingClient(
+        HTTP_MAX_CONNECTIONS,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT_S, connect=HTTP_CONNECT_TIMEOUT_S),
+        http2=HTTP_HTTP2 and _http2_available(),
+    )
+    return _CLIENT
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client; created on first use when running outside the app lifespan."""
+    return _CLIENT if _CLIENT is not None and not _CLIENT.is_closed else start_http_client()
+
+
+async def stop_http_client() -> None:
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
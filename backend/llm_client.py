@@ -0,0 +1,246 @@
+"""
+Process-wide LLM client used by the mitigation agent.
+
+The backend model is created once (from the FastAPI lifespan) and shared by
+every request. Calls go through bounded admission: at most
+LLM_MAX_CONCURRENCY run at once, up to LLM_MAX_QUEUE more wait for a slot,
+and anything beyond that is rejected immediately with LLMOverloaded (HTTP 429
+at the API). Each call is capped at LLM_TIMEOUT_S.
+
+Backends implement LLMBackend. LLM_BACKEND selects one:
+    gemini  Google Gemini (needs GOOGLE_API_KEY)
+    stub    Local canned planner with LLM_STUB_LATENCY_S delay, for load tests
+"""
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Any, AsyncIterator, Optional
+
+import google.generativeai as genai
+
+from rule_planner import action_for
+
+# Use gemini-flash-latest which is generally available
+MODEL_NAME = "gemini-flash-latest"
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_STUB_LATENCY_S = float(os.getenv("LLM_STUB_LATENCY_S", "0.2"))
+
+
+class LLMOverloaded(Exception):
+    """Raised when the admission queue is full."""
+
+
+class LLMBackend(ABC):
+    """Interface for text-generation backends."""
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        """Complete text for the prompt."""
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Text chunks as the model produces them (default: one chunk)."""
+        yield await self.generate(prompt)
+
+    async def close(self) -> None:
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, model_name: str = MODEL_NAME):
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            print("Warning: GOOGLE_API_KEY not found in environment variables")
+        else:
+            genai.configure(api_key=api_key)
+        self.name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+class StubBackend(LLMBackend):
+    """
+    Answers like the planner prompt expects, without any network access:
+    one rule-mapped action per row of the prompt's risk table.
+    """
+
+    name = "stub"
+
+    # Characters per streamed chunk
+    STREAM_CHUNK = 64
+
+    def __init__(self, latency_s: float = LLM_STUB_LATENCY_S):
+        self.latency_s = latency_s
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency_s)
+        return self._answer(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # Spread the latency over the answer, like a model emitting tokens
+        text = self._answer(prompt)
+        chunks = [text[i:i + self.STREAM_CHUNK] for i in range(0, len(text), self.STREAM_CHUNK)]
+        for chunk in chunks:
+            await asyncio.sleep(self.latency_s / len(chunks))
+            yield chunk
+
+    def _answer(self, prompt: str) -> str:
+        event_type = ""
+        actions = []
+        for line in prompt.splitlines():
+            if line.startswith("Event:"):
+                event_type = line.split(":", 1)[1].strip()
+            cells = line.split("|")
+            if len(cells) != 8 or cells[0] == "asset_id":
+                continue
+            asset_id, _, asset_type, _, _, risk_level, reason, _ = cells
+            actions.append({
+                "asset_id": asset_id,
+                "action_type": action_for(asset_type, event_type),
+                "urgency": "high" if risk_level in ("CRITICAL", "HIGH") else "medium" if risk_level == "MEDIUM" else "low",
+                "justification": f"Stub plan for {risk_level} risk: {reason}",
+                "target_time": "2025-11-26T00:00:00Z",
+            })
+        return json.dumps({"summary_text": f"Stub plan with {len(actions)} actions.", "mitigation_actions": actions})
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+}
+
+
+class LLMClient:
+    """Shared backend behind a bounded admission queue and per-call timeouts."""
+
+    def __init__(self, backend: LLMBackend, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_queue: int = LLM_MAX_QUEUE, timeout_s: float = LLM_TIMEOUT_S):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._admitted = 0  # running + waiting
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.name
+
+    @property
+    def saturated(self) -> bool:
+        """True when a new call would be rejected."""
+        return self._admitted >= self.max_concurrency + self.max_queue
+
+    async def generate(self, prompt: str, timeout_s: Optional[float] = None) -> str:
+        """Run one call; raises LLMOverloaded, asyncio.TimeoutError or the backend's error."""
+        if self.saturated:
+            self.rejected += 1
+            raise LLMOverloaded(f"LLM queue full ({self._admitted} calls admitted)")
+        self._admitted += 1
+        try:
+            async with self._slots:
+                try:
+                    text = await asyncio.wait_for(self.backend.generate(prompt), timeout_s or self.timeout_s)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise
+                except Exception:
+                    self.failed += 1
+                    raise
+                self.completed += 1
+                return text
+        finally:
+            self._admitted -= 1
+
+    async def stream(self, prompt: str, timeout_s: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream one call's text chunks under the same admission limits.
+        The timeout applies to the wait for each chunk.
+        """
+        if self.saturated:
+            self.rejected += 1
+            raise LLMOverloaded(f"LLM queue full ({self._admitted} calls admitted)")
+        self._admitted += 1
+        try:
+            async with self._slots:
+                chunks = self.backend.stream(prompt).__aiter__()
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout_s or self.timeout_s)
+                        except StopAsyncIteration:
+                            break
+                        yield chunk
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise
+                except Exception:
+                    self.failed += 1
+                    raise
+                finally:
+                    await chunks.aclose()
+                self.completed += 1
+        finally:
+            self._admitted -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "timeout_s": self.timeout_s,
+            "admitted": self._admitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+_CLIENT: Optional[LLMClient] = None
+
+
+def start_llm_client(backend: Optional[LLMBackend] = None) -> LLMClient:
+    """Create the shared client (called from the app lifespan)."""
+    global _CLIENT
+    if backend is None:
+        if LLM_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown LLM_BACKEND {LLM_BACKEND!r}; expected one of {', '.join(BACKENDS)}")
+        backend = BACKENDS[LLM_BACKEND]()
+    _CLIENT = LLMClient(backend)
+    print(f"LLM: Using {backend.name} backend (concurrency {_CLIENT.max_concurrency}, queue {_CLIENT.max_queue})")
+    return _CLIENT
+
+
+def get_llm_client() -> LLMClient:
+    """The shared client; created on first use when running outside the app lifespan."""
+    return _CLIENT if _CLIENT is not None else start_llm_client()
+
+
+async def stop_llm_client() -> None:
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.close()
+        _CLIENT = None
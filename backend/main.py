@@ -3,34 +3,71 @@ Extreme Weather Resilience Agent - Backend API
 FastAPI application for risk simulation and AI agent orchestration
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
+import asyncio
+import base64
+import hashlib
+import json
+import numpy as np
 
 # Load environment variables
 load_dotenv()
 
-from utils import load_assets
-from weather import get_weather_for_scenario
-from risk_engine import simulate_risk
-from agent_service import generate_mitigation_plan
-from beckn_service import execute_beckn_flow
+from utils import ASSET_STORE
+from weather import (
+    fetch_weather_for_scenario, get_hourly_weather_for_scenario, get_weather_for_predefined_scenario, WEATHER_CACHE
+)
+from risk_engine import simulate_risk, iter_risks, risk_levels, NO_RISK, iter_hourly_risk, summarize_hourly_risk
+from weather_grid import get_gridded_hourly_weather
+from ensemble import run_ensemble, shutdown_pool, SnapshotChanged, ENSEMBLE_MAX_MEMBERS
+from agent_service import generate_mitigation_plan, stream_mitigation_plan, PLAN_MODES
+from plan_session import replan, PLAN_SESSIONS
+from http_client import start_http_client, stop_http_client
+from llm_client import LLMOverloaded, start_llm_client, stop_llm_client, get_llm_client
+from plan_cache import PLAN_CACHE
+from beckn_service import execute_beckn_flows
 from beckn_models import OnSearchRequest, OnSelectRequest, OnConfirmRequest, BecknResponse, Ack
-from beckn_bap import BAP_STATE
-from mock_bpp import router as mock_bpp_router
+from beckn_bap import update_transaction, add_search_response, DOMAIN, TRANSACTION_STORE, TRANSACTIONS
+from catalog_cache import CATALOG_CACHE, sweep_periodically as sweep_catalogs_periodically
+from offer_book import OFFER_STRATEGIES
+from transaction_store import sweep_periodically
+from mock_bpp import routers as mock_bpp_routers
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared LLM and HTTP clients, created once per process
+    start_llm_client()
+    start_http_client()
+    # Callbacks applied by other workers wake this worker's waiting flows
+    TRANSACTION_STORE.listen(TRANSACTIONS.notify)
+    sweeper = asyncio.create_task(sweep_periodically(TRANSACTION_STORE))
+    catalog_sweeper = asyncio.create_task(sweep_catalogs_periodically(CATALOG_CACHE))
+    yield
+    sweeper.cancel()
+    catalog_sweeper.cancel()
+    TRANSACTION_STORE.close()
+    await stop_http_client()
+    await stop_llm_client()
+    shutdown_pool()
+
 
 app = FastAPI(
     title="Extreme Weather Resilience Agent API",
     description="AI agent for DEG asset risk simulation and mitigation orchestration",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
-# Include Mock BPP Router
-app.include_router(mock_bpp_router)
+# Include Mock BPP Routers (MOCK_BPP_COUNT distinct providers)
+for mock_bpp_router in mock_bpp_routers:
+    app.include_router(mock_bpp_router)
 
 # CORS middleware for frontend connection
 app.add_middleware(
@@ -72,7 +109,58 @@ class RiskResult(BaseModel):
 class ScenarioResponse(BaseModel):
     scenario: ScenarioRequest
     assets: List[Asset]
-    risks: List[RiskResult]
+    risks: List[RiskResult]  # Risks of the assets on this page
+    next_cursor: Optional[str] = None  # Set when asset_limit left assets for another page
+
+
+class AssetRiskTimeline(BaseModel):
+    asset_id: str
+    peak_risk_level: str  # "MEDIUM", "HIGH", "CRITICAL"
+    first_at_risk: Optional[str]  # ISO timestamp of first hour at any risk
+    first_critical: Optional[str]  # ISO timestamp of first CRITICAL hour
+    critical_hours: int
+
+
+class ScenarioTimelineResponse(BaseModel):
+    scenario: ScenarioRequest
+    timeline: List[AssetRiskTimeline]
+
+
+class EnsembleRequest(BaseModel):
+    scenario: ScenarioRequest
+    members: int = 1000  # Number of perturbed weather forecasts
+    seed: Optional[int] = None  # Set for reproducible ensembles
+
+
+class AssetRiskProbability(BaseModel):
+    asset_id: str
+    p_critical: float
+    p_high: float
+    p_medium: float
+    p_low: float
+    p_none: float
+
+
+class EnsembleResponse(BaseModel):
+    scenario: ScenarioRequest
+    members: int
+    probabilities: List[AssetRiskProbability]
+
+
+class BatchScenarioRequest(BaseModel):
+    scenario_ids: List[str] = []  # Keys of data/scenarios.json
+    scenarios: List[ScenarioRequest] = []  # Inline scenarios, keyed "inline:<index>"
+
+
+class BatchScenarioResult(BaseModel):
+    scenario: Optional[ScenarioRequest] = None
+    risks: List[RiskResult] = []
+    error: Optional[str] = None
+    status_code: int = 200  # 404 unknown scenario id, 422 invalid scenario
+
+
+class BatchScenarioResponse(BaseModel):
+    results: Dict[str, BatchScenarioResult]
 
 
 class MitigationAction(BaseModel):
@@ -81,6 +169,7 @@ class MitigationAction(BaseModel):
     urgency: str  # "low", "medium", "high"
     justification: str
     target_time: str  # ISO format
+    provenance: Optional[str] = None  # Session plans: "reused" or "new"
 
 
 class AgentMitigationRequest(BaseModel):
@@ -92,6 +181,9 @@ class AgentMitigationRequest(BaseModel):
 class AgentMitigationResponse(BaseModel):
     summary_text: str
     mitigation_actions: List[MitigationAction]
+    plan_source: Optional[str] = None  # "llm" or "rules"
+    session_id: Optional[str] = None
+    replanned_assets: Optional[List[str]] = None
 
 
 class BecknServiceResult(BaseModel):
@@ -111,10 +203,16 @@ class BecknExecutionLog(BaseModel):
     service_type: str
     provider: Optional[str]
     status: str  # "searched", "confirmed", "failed"
+    bpp_id: Optional[str] = None
+    price: Optional[str] = None
 
 
 class BecknExecutionRequest(BaseModel):
     actions: List[MitigationAction]
+    location: str = "London"
+    bypass_catalog_cache: bool = False  # Always search (the result still refreshes the cache)
+    invalidate_catalog_cache: bool = False  # Drop cached catalogs for these actions first
+    offer_strategy: Optional[str] = None  # "price" | "eta" | "score" (default BECKN_OFFER_STRATEGY)
 
 
 class BecknExecutionResponse(BaseModel):
@@ -132,95 +230,450 @@ def root():
         "status": "running",
         "endpoints": {
             "scenario": "/scenario/run",
+            "timeline": "/scenario/timeline",
+            "ensemble": "/scenario/ensemble",
+            "batch": "/scenario/batch",
+            "weather_cache": "/weather/cache",
             "agent": "/agent/mitigate",
-            "beckn": "/beckn/execute"
+            "agent_stream": "/agent/mitigate/stream",
+            "plan_cache": "/agent/cache",
+            "llm": "/agent/llm",
+            "beckn": "/beckn/execute",
+            "beckn_catalogs": "/beckn/catalogs",
+            "beckn_transactions": "/beckn/transactions"
         }
     }
 
 
+# Lines per chunk written by streaming responses
+STREAM_BATCH_LINES = 256
+
+
+def query_key(scenario: ScenarioRequest, only_at_risk: bool) -> str:
+    """Hash of everything that decides which assets a /scenario/run page lists."""
+    query = json.dumps([scenario.model_dump(), only_at_risk], sort_keys=True)
+    return hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+
+
+def encode_cursor(offset: int, query: str, snapshot: str) -> str:
+    cursor = {"o": offset, "q": query, "s": snapshot}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str], query: str, snapshot: str) -> int:
+    """Offset in a cursor issued for the same query and asset snapshot."""
+    if not cursor:
+        return 0
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = decoded["o"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid asset_cursor")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid asset_cursor")
+    if decoded.get("q") != query:
+        raise HTTPException(status_code=400, detail="asset_cursor belongs to a different scenario or filter")
+    if decoded.get("s") != snapshot:
+        raise HTTPException(status_code=409, detail="Assets changed since asset_cursor was issued; start again")
+    return offset
+
+
+def stream_scenario_ndjson(scenario: ScenarioRequest, risk_iter, asset_fragments, next_cursor: Optional[str]):
+    """
+    NDJSON body for /scenario/run?stream=true:
+    one "scenario" line, "risk" lines CRITICAL-first, "asset" lines, then an "end" line.
+    """
+    batch = [json.dumps({"type": "scenario", "scenario": scenario.model_dump()}).encode()]
+    for risk in risk_iter:
+        batch.append(json.dumps({"type": "risk", "risk": risk}).encode())
+        if len(batch) >= STREAM_BATCH_LINES:
+            yield b"\n".join(batch) + b"\n"
+            batch = []
+    for fragment in asset_fragments:
+        batch.append(b'{"type": "asset", "asset": ' + fragment + b"}")
+        if len(batch) >= STREAM_BATCH_LINES:
+            yield b"\n".join(batch) + b"\n"
+            batch = []
+    batch.append(json.dumps({"type": "end", "next_cursor": next_cursor}).encode())
+    yield b"\n".join(batch) + b"\n"
+
+
 @app.post("/scenario/run", response_model=ScenarioResponse)
-async def run_scenario(scenario: ScenarioRequest):
+async def run_scenario(scenario: ScenarioRequest, stream: bool = False, only_at_risk: bool = False,
+                       asset_limit: Optional[int] = None, asset_cursor: Optional[str] = None):
     """
     Run risk simulation for a given weather scenario.
     
     Loads DEG assets for the location, fetches weather data, and runs risk simulation.
+    
+    Query options:
+        stream: write NDJSON lines as results are produced instead of one document
+        only_at_risk: leave out assets that have no risk
+        asset_limit / asset_cursor: page through the asset list; the response
+            carries next_cursor while more assets remain, and each page's risks
+            cover only that page's assets. A cursor is rejected with 400 for a
+            different scenario or only_at_risk, and 409 once the assets changed.
     """
-    # Load assets for the location
-    assets_data = load_assets(scenario.location)
+    if asset_limit is not None and asset_limit < 1:
+        raise HTTPException(status_code=422, detail="asset_limit must be at least 1")
+    
+    # Select assets for the location from the shared snapshot
+    snapshot = ASSET_STORE.snapshot()
+    positions = snapshot.select(scenario.location)
+    table = snapshot.subtable(positions)
+    if positions is None:
+        positions = np.arange(len(snapshot))
     
     # Get weather data for the scenario
-    weather_data = get_weather_for_scenario(scenario)
+    weather_data = await fetch_weather_for_scenario(scenario)
+    
+    if only_at_risk:
+        positions = positions[risk_levels(scenario.event_type, weather_data, table) != NO_RISK]
+    
+    # Page through the asset list; cursors only work for the query and snapshot they came from
+    query = query_key(scenario, only_at_risk)
+    start = decode_cursor(asset_cursor, query, snapshot.digest)
+    stop = len(positions) if asset_limit is None else min(start + asset_limit, len(positions))
+    page = positions[start:stop]
+    next_cursor = encode_cursor(stop, query, snapshot.digest) if stop < len(positions) else None
+    
+    # Risks are paged with the assets
+    page_table = table if start == 0 and stop == len(positions) else snapshot.subtable(page)
+    
+    if stream:
+        def asset_fragments():
+            for chunk_start in range(0, len(page), STREAM_BATCH_LINES):
+                yield from snapshot.json_fragments(Asset, page[chunk_start:chunk_start + STREAM_BATCH_LINES])
+        
+        return StreamingResponse(
+            stream_scenario_ndjson(scenario, iter_risks(scenario.event_type, weather_data, page_table),
+                                   asset_fragments(), next_cursor),
+            media_type="application/x-ndjson"
+        )
     
     # Run risk simulation
-    risk_results = simulate_risk(scenario.event_type, weather_data, assets_data)
+    risk_results = simulate_risk(scenario.event_type, weather_data, page_table)
     
-    # Convert to Pydantic models
-    assets = [Asset(**asset) for asset in assets_data]
+    # Asset models are validated once per snapshot
+    assets = snapshot.models(Asset, page)
     risks = [RiskResult(**risk) for risk in risk_results]
     
     return ScenarioResponse(
         scenario=scenario,
         assets=assets,
-        risks=risks
+        risks=risks,
+        next_cursor=next_cursor
+    )
+
+
+# Longest /scenario/timeline window (each hour is a full risk evaluation)
+TIMELINE_MAX_HOURS = int(os.getenv("TIMELINE_MAX_HOURS", "720"))
+
+
+def simulate_timeline(scenario: ScenarioRequest) -> List[Dict[str, Any]]:
+    """Hourly risk summary per asset (CPU-bound; run off the event loop)."""
+    snapshot = ASSET_STORE.snapshot()
+    positions = snapshot.select(scenario.location)
+    table = snapshot.subtable(positions)
+    
+    # Per-asset microclimate from the local weather grid if it covers the window,
+    # otherwise the city-wide mock series
+    lat, lon = snapshot.coordinates(positions)
+    series = get_gridded_hourly_weather(scenario, lat, lon) or get_hourly_weather_for_scenario(scenario)
+    
+    return summarize_hourly_risk(iter_hourly_risk(series, table), table)
+
+
+@app.post("/scenario/timeline", response_model=ScenarioTimelineResponse)
+async def run_scenario_timeline(scenario: ScenarioRequest):
+    """
+    Run an hour-by-hour risk simulation over the scenario's duration.
+    
+    Streams hourly risk states through a running summary, so the response reports
+    when each asset first goes at-risk / CRITICAL and for how long.
+    """
+    if scenario.duration_hours < 0:
+        raise HTTPException(status_code=422, detail="duration_hours must not be negative")
+    if scenario.duration_hours > TIMELINE_MAX_HOURS:
+        raise HTTPException(status_code=422, detail=f"duration_hours must be at most {TIMELINE_MAX_HOURS}")
+    
+    timeline = await asyncio.to_thread(simulate_timeline, scenario)
+    
+    return ScenarioTimelineResponse(
+        scenario=scenario,
+        timeline=[AssetRiskTimeline(**entry) for entry in timeline]
+    )
+
+
+@app.post("/scenario/ensemble", response_model=EnsembleResponse)
+async def run_scenario_ensemble(request: EnsembleRequest):
+    """
+    Run a Monte Carlo ensemble around the scenario's forecast.
+    
+    Members are evaluated across CPU cores; returns P(level) per asset.
+    """
+    if request.members < 1:
+        raise HTTPException(status_code=422, detail="members must be at least 1")
+    if request.members > ENSEMBLE_MAX_MEMBERS:
+        raise HTTPException(status_code=422, detail=f"members must be at most {ENSEMBLE_MAX_MEMBERS}")
+    
+    scenario = request.scenario
+    weather_data = await fetch_weather_for_scenario(scenario)
+    
+    try:
+        probabilities = await run_ensemble(
+            scenario.event_type, weather_data, scenario.location, request.members, request.seed
+        )
+    except SnapshotChanged:
+        raise HTTPException(status_code=409, detail="Asset data changed during the ensemble run; retry")
+    
+    return EnsembleResponse(
+        scenario=scenario,
+        members=request.members,
+        probabilities=[AssetRiskProbability(**p) for p in probabilities]
     )
 
 
+# Scenarios simulated at once by /scenario/batch (numpy releases the GIL in the rules)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "0")) or os.cpu_count() or 1
+
+
+@app.post("/scenario/batch", response_model=BatchScenarioResponse)
+async def run_scenario_batch(request: BatchScenarioRequest, stream: bool = False):
+    """
+    Run many scenarios against one asset snapshot concurrently.
+    
+    Results are keyed by scenario id (or "inline:<index>"). With ?stream=true,
+    each result is written as an NDJSON line as soon as it finishes. A bad
+    scenario id gets its own error result (status_code 404 / 422); the rest
+    of the batch still runs.
+    """
+    if len(set(request.scenario_ids)) != len(request.scenario_ids):
+        raise HTTPException(status_code=422, detail="scenario_ids must not contain duplicates")
+    
+    snapshot = ASSET_STORE.snapshot()
+    tables = {}  # location -> AssetTable, selected once per batch
+    
+    def table_for(location: str):
+        if location not in tables:
+            tables[location] = snapshot.subtable(snapshot.select(location))
+        return tables[location]
+    
+    # (key, scenario, weather_data) or (key, None, error result)
+    jobs = []
+    for scenario_id in request.scenario_ids:
+        predefined = ASSET_STORE.scenario(scenario_id)
+        if predefined is None:
+            jobs.append((scenario_id, None, BatchScenarioResult(
+                error=f"Unknown scenario id: {scenario_id}", status_code=404)))
+            continue
+        missing = [field for field in ScenarioRequest.model_fields if field not in predefined]
+        if missing:
+            jobs.append((scenario_id, None, BatchScenarioResult(
+                error=f"Scenario {scenario_id} is missing {', '.join(missing)}", status_code=422)))
+            continue
+        try:
+            scenario = ScenarioRequest(**{field: predefined[field] for field in ScenarioRequest.model_fields})
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            jobs.append((scenario_id, None, BatchScenarioResult(
+                error=f"Invalid scenario {scenario_id}: {error}", status_code=422)))
+            continue
+        jobs.append((scenario_id, scenario, get_weather_for_predefined_scenario(predefined)))
+    inline_weather = await asyncio.gather(*(fetch_weather_for_scenario(s) for s in request.scenarios))
+    for i, (scenario, weather_data) in enumerate(zip(request.scenarios, inline_weather)):
+        jobs.append((f"inline:{i}", scenario, weather_data))
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def run_job(key: str, scenario: Optional[ScenarioRequest], weather_or_error: Any):
+        if scenario is None:
+            return key, weather_or_error
+        async with semaphore:
+            risks = await asyncio.to_thread(
+                simulate_risk, scenario.event_type, weather_or_error, table_for(scenario.location)
+            )
+        return key, BatchScenarioResult(scenario=scenario, risks=[RiskResult(**r) for r in risks])
+    
+    tasks = [asyncio.ensure_future(run_job(*job)) for job in jobs]
+    
+    if stream:
+        async def ndjson():
+            for next_done in asyncio.as_completed(tasks):
+                key, result = await next_done
+                yield json.dumps({"key": key, **result.model_dump()}) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    
+    return BatchScenarioResponse(results=dict(await asyncio.gather(*tasks)))
+
+
+@app.get("/weather/cache")
+def weather_cache_stats():
+    """Weather cache size and hit/miss/coalesce counters."""
+    return WEATHER_CACHE.stats()
+
+
 @app.post("/agent/mitigate", response_model=AgentMitigationResponse)
-async def get_mitigation_plan(request: AgentMitigationRequest):
+async def get_mitigation_plan(request: AgentMitigationRequest, mode: Optional[str] = None,
+                              llm_budget_s: Optional[float] = None, session_id: Optional[str] = None):
     """
     Call AI agent to generate mitigation plan based on risk results.
     
-    Uses Google Gemini to analyze scenario and risks.
+    Uses Google Gemini to analyze scenario and risks, hedged by the local
+    rule-based planner.
+
+    Query options:
+    - mode: "llm", "rules" or "hedged" (default PLAN_MODE)
+    - llm_budget_s: seconds to wait for Gemini in hedged mode before
+      returning the rule-based plan (default PLAN_LLM_BUDGET_S)
+    - session_id: re-plan incrementally against this session's previous
+      plan; only assets whose risks changed are sent to the planner and
+      each action is marked "reused" or "new"
+
+    Returns 429 in llm mode when the LLM admission queue is full (hedged
+    mode answers with the rule-based plan instead).
     """
+    if mode is not None and mode not in PLAN_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(PLAN_MODES)}")
+
     # Call Agent Service
-    agent_result = await generate_mitigation_plan(request)
+    try:
+        if session_id:
+            agent_result = await replan(session_id, request, mode)
+        else:
+            agent_result = await generate_mitigation_plan(request, mode, llm_budget_s)
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     
     # Convert dict result to Pydantic model
     return AgentMitigationResponse(**agent_result)
 
 
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/agent/mitigate/stream")
+async def stream_mitigation_plan_sse(request: AgentMitigationRequest, mode: Optional[str] = None):
+    """
+    Server-Sent Events version of /agent/mitigate.
+
+    Events, in order:
+    - action:  one MitigationAction, sent as soon as the model has finished writing it
+    - summary: {"summary_text": ...}
+    - done:    {"plan_source": "llm" | "rules", "actions": n}
+    - error:   {"detail": ...} (llm mode only; other modes fall back to the rule-based plan)
+    """
+    if mode is not None and mode not in PLAN_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(PLAN_MODES)}")
+    if mode == "llm" and get_llm_client().saturated:
+        raise HTTPException(status_code=429, detail="LLM queue full", headers={"Retry-After": "1"})
+
+    async def events():
+        async for kind, value in stream_mitigation_plan(request, mode):
+            if kind == "action":
+                try:
+                    action = MitigationAction(**value)
+                except Exception as e:
+                    print(f"Agent: Skipping malformed action {value}: {e}")
+                    continue
+                yield sse_event("action", action.model_dump())
+            elif kind == "summary":
+                yield sse_event("summary", {"summary_text": value})
+            elif kind == "error":
+                yield sse_event("error", {"detail": value})
+            else:
+                yield sse_event(kind, value)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.delete("/agent/session/{session_id}")
+def drop_plan_session(session_id: str):
+    """Forget a re-planning session; the next call with this id plans from scratch."""
+    if not PLAN_SESSIONS.drop(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    return {"session_id": session_id, "dropped": True}
+
+
+@app.get("/agent/cache")
+def plan_cache_stats():
+    """Mitigation plan cache sizes and counters (memory and disk tiers)."""
+    return PLAN_CACHE.stats()
+
+
+@app.get("/agent/llm")
+def llm_client_stats():
+    """Shared LLM client: backend, admission limits and call counters."""
+    return get_llm_client().stats()
+
+
 @app.post("/beckn/execute", response_model=BecknExecutionResponse)
 async def execute_beckn_services(request: BecknExecutionRequest):
     """
     Simulate Beckn-style service search and confirmation for mitigation actions.
     """
-    logs = []
-    
-    # Process each action
-    for action in request.actions:
-        # Execute Beckn flow (Search -> Select -> Confirm)
-        # We assume "location" is implicitly known or passed (using "London" default here for simplicity 
-        # or we could extract from action if needed, but action doesn't have location. 
-        # Real implementation would pass context.)
-        result = await execute_beckn_flow(action.action_type, "London")
-        
-        # Create log entry
-        log_entry = BecknExecutionLog(
+    # Execute Beckn flows (Search -> Select -> Confirm) concurrently; actions of
+    # the same type share one search. Location defaults to London as actions
+    # do not carry one.
+    if request.offer_strategy is not None and request.offer_strategy not in OFFER_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"offer_strategy must be one of {', '.join(OFFER_STRATEGIES)}")
+    flows = [(action.action_type, request.location) for action in request.actions]
+    if request.invalidate_catalog_cache:
+        for action_type, location in set(flows):
+            CATALOG_CACHE.invalidate(DOMAIN, action_type, location)
+    options = {"strategy": request.offer_strategy} if request.offer_strategy else {}
+    results = await execute_beckn_flows(flows, bypass_cache=request.bypass_catalog_cache, **options)
+
+    # Create log entries, in action order
+    logs = [
+        BecknExecutionLog(
             asset_id=action.asset_id,
             service_type=action.action_type,
             provider=result.get("provider"),
-            status=result.get("status", "failed")
+            status=result.get("status", "failed"),
+            bpp_id=result.get("bpp_id"),
+            price=result.get("price")
         )
-        logs.append(log_entry)
+        for action, result in zip(request.actions, results)
+    ]
         
     return BecknExecutionResponse(
         log=logs
     )
 
 
+@app.get("/beckn/catalogs")
+def beckn_catalog_cache_stats():
+    """Cached provider catalogs and hit/miss/refresh counters."""
+    return CATALOG_CACHE.stats()
+
+
+@app.delete("/beckn/catalogs")
+def invalidate_beckn_catalogs(action_type: Optional[str] = None, location: Optional[str] = None):
+    """Drop cached catalogs (all, or those matching action_type / location)."""
+    return {"dropped": CATALOG_CACHE.invalidate(DOMAIN, action_type, location)}
+
+
+@app.get("/beckn/transactions")
+async def beckn_transaction_stats():
+    """BAP transaction store: live entries and eviction/expiry counters."""
+    return await TRANSACTION_STORE.stats()
+
+
 # ============================================================================
 # BAP Callbacks (Received from BPP)
 # ============================================================================
 
 @app.post("/beckn/on_search", response_model=BecknResponse)
 async def on_search(request: OnSearchRequest):
-    """Callback for search results"""
+    """Callback for search results (one per BPP the search was broadcast to)"""
     tx_id = request.context.transaction_id
-    if tx_id in BAP_STATE:
-        BAP_STATE[tx_id]["status"] = "SEARCH_COMPLETED"
-        BAP_STATE[tx_id]["catalog"] = request.message.catalog
-        BAP_STATE[tx_id]["last_update"] = datetime.utcnow()
-        print(f"BAP: Received on_search for {tx_id}")
+    if await add_search_response(tx_id, request):
+        print(f"BAP: Received on_search for {tx_id} from {request.context.bpp_id}")
     else:
         print(f"BAP: Received on_search for unknown tx {tx_id}")
     return BecknResponse(message=Ack())
@@ -229,11 +682,9 @@ async def on_search(request: OnSearchRequest):
 async def on_select(request: OnSelectRequest):
     """Callback for selection quote"""
     tx_id = request.context.transaction_id
-    if tx_id in BAP_STATE:
-        BAP_STATE[tx_id]["status"] = "SELECT_COMPLETED"
-        BAP_STATE[tx_id]["quote"] = request.message.order.quote
-        BAP_STATE[tx_id]["order"] = request.message.order # Update order with quote
-        BAP_STATE[tx_id]["last_update"] = datetime.utcnow()
+    # Update order with quote
+    if await update_transaction(tx_id, "SELECT_COMPLETED", quote=request.message.order.quote, order=request.message.order,
+                          context=request.context):
         print(f"BAP: Received on_select for {tx_id}")
     return BecknResponse(message=Ack())
 
@@ -241,10 +692,7 @@ async def on_select(request: OnSelectRequest):
 async def on_confirm(request: OnConfirmRequest):
     """Callback for confirmation"""
     tx_id = request.context.transaction_id
-    if tx_id in BAP_STATE:
-        BAP_STATE[tx_id]["status"] = "CONFIRM_COMPLETED"
-        BAP_STATE[tx_id]["confirmed_order"] = request.message.order
-        BAP_STATE[tx_id]["last_update"] = datetime.utcnow()
+    if await update_transaction(tx_id, "CONFIRM_COMPLETED", confirmed_order=request.message.order, context=request.context):
         print(f"BAP: Received on_confirm for {tx_id}")
     return BecknResponse(message=Ack())
 
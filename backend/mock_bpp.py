@@ -1,125 +1,218 @@
 from fastapi import APIRouter, BackgroundTasks
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 from datetime import datetime
 import asyncio
-import httpx
+import os
+import random
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Union
 
+from http_client import get_http_client
+from bpp_inventory import Inventory, load_index
 from beckn_models import (
     SearchRequest, SelectRequest, ConfirmRequest, 
-    BecknResponse, Ack, OnSearchRequest, OnSearchMessage,
+    BecknResponse, Ack,
     OnSelectRequest, OnSelectMessage, OnConfirmRequest, OnConfirmMessage,
-    Catalog, Descriptor, Provider, Item, Price, Quote, Order, Fulfillment,
+    Price, Quote, Order,
     Context
 )
 
-router = APIRouter(prefix="/mock-bpp", tags=["Mock BPP"])
-
-# Mock Data Inventory
-INVENTORY = {
-    "dispatch_battery_discharge": [
-        {"id": "vpp_discharge_500", "name": "Residential Battery Discharge (500kWh)", "price": "0.15", "desc": "Virtual Power Plant A"},
-        {"id": "comm_battery_1mw", "name": "Commercial Battery Export (1MW)", "price": "0.12", "desc": "Industrial Storage Unit"}
-    ],
-    "reduce_ev_load": [
-        {"id": "ev_curtail_lv1", "name": "EV Smart Charging Curtailment (Level 1)", "price": "0.10", "desc": "ChargePoint Network - 20% Reduction"},
-        {"id": "ev_curtail_lv2", "name": "EV Smart Charging Curtailment (Level 2)", "price": "0.25", "desc": "ChargePoint Network - 50% Reduction"}
-    ],
-    "shift_hvac_load": [
-        {"id": "hvac_shift_office", "name": "Commercial HVAC Load Shift", "price": "0.08", "desc": "Office Park Flex Program"},
-        {"id": "hvac_shift_retail", "name": "Retail Center Pre-Cooling", "price": "0.09", "desc": "Retail Flex Network"}
-    ],
-    "fallback": [
-        {"id": "generic_flex", "name": "General Flexibility Service", "price": "0.20", "desc": "Standard Demand Response"}
-    ]
-}
+MOCK_BPP_BASE_URL = "http://localhost:8000"
+# Number of distinct mock providers mounted at /mock-bpp, /mock-bpp-2, ...
+MOCK_BPP_COUNT = int(os.getenv("MOCK_BPP_COUNT", "1"))
+
+# Processing time before each callback, as "<distribution>:<seconds>", e.g.
+# const:2, uniform:0.5,3, normal:1,0.3, lognormal:0,0.5 (of ln seconds), exp:1 (mean).
+# Unset: search const:2 (per provider profile), select and confirm const:1
+MOCK_BPP_LATENCY = {action: os.getenv(f"MOCK_BPP_{action.upper()}_LATENCY", "")
+                    for action in ("search", "select", "confirm")}
+# Fault injection, each a probability: per request (error) or per callback
+MOCK_BPP_ERROR_RATE = float(os.getenv("MOCK_BPP_ERROR_RATE", "0"))  # NACK with HTTP 500, no callback
+MOCK_BPP_DROP_RATE = float(os.getenv("MOCK_BPP_DROP_RATE", "0"))  # callback never sent
+MOCK_BPP_DUPLICATE_RATE = float(os.getenv("MOCK_BPP_DUPLICATE_RATE", "0"))  # callback sent twice
+MOCK_BPP_DELAY_RATE = float(os.getenv("MOCK_BPP_DELAY_RATE", "0"))  # callback sent MOCK_BPP_DELAY_S late
+MOCK_BPP_REORDER_RATE = float(os.getenv("MOCK_BPP_REORDER_RATE", "0"))  # callback held until after the next one
+MOCK_BPP_DELAY_S = float(os.getenv("MOCK_BPP_DELAY_S", "5"))
+# Seed for reproducible runs (provider n uses seed + n)
+MOCK_BPP_SEED = os.getenv("MOCK_BPP_SEED", "")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class Latency:
+    """A latency distribution parsed from a spec such as "uniform:0.5,3"."""
+
+    PARAMS = {"const": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+
+    def __init__(self, spec: str):
+        name, _, params = spec.partition(":")
+        try:
+            values = [float(p) for p in params.split(",")] if params else []
+        except ValueError:
+            values = []
+        if self.PARAMS.get(name) != len(values):
+            raise ValueError(f"Invalid latency {spec!r}; expected one of const:2, uniform:0.5,3, "
+                             f"normal:1,0.3, lognormal:0,0.5, exp:1")
+        self.spec = spec
+        self.name = name
+        self.params = values
+
+    def sample(self, rng: random.Random) -> float:
+        a = self.params
+        if self.name == "uniform":
+            value = rng.uniform(a[0], a[1])
+        elif self.name == "normal":
+            value = rng.gauss(a[0], a[1])
+        elif self.name == "lognormal":
+            value = rng.lognormvariate(a[0], a[1])
+        elif self.name == "exp":
+            value = rng.expovariate(1 / a[0]) if a[0] > 0 else 0.0
+        else:
+            value = a[0]
+        return max(value, 0.0)
+
+
+class MockFaults:
+    """How often a mock provider misbehaves; see the MOCK_BPP_*_RATE settings."""
+
+    def __init__(self, error_rate: float = MOCK_BPP_ERROR_RATE, drop_rate: float = MOCK_BPP_DROP_RATE,
+                 duplicate_rate: float = MOCK_BPP_DUPLICATE_RATE, delay_rate: float = MOCK_BPP_DELAY_RATE,
+                 reorder_rate: float = MOCK_BPP_REORDER_RATE, delay_s: float = MOCK_BPP_DELAY_S):
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.duplicate_rate = duplicate_rate
+        self.delay_rate = delay_rate
+        self.reorder_rate = reorder_rate
+        self.delay_s = delay_s
+
+
+class MockBPP:
+    """One mock provider: its identity, how its offers differ from the others' and how it misbehaves."""
+
+    def __init__(self, prefix: str = "/mock-bpp", bpp_id: str = "mock-bpp-london", price_factor: float = 1.0,
+                 eta_minutes: int = 15, search_latency_s: float = 2.0, name_suffix: str = "",
+                 faults: Optional[MockFaults] = None, seed: Optional[int] = None):
+        self.prefix = prefix
+        self.bpp_id = bpp_id
+        self.bpp_uri = f"{MOCK_BPP_BASE_URL}{prefix}"
+        self.price_factor = price_factor
+        self.eta_minutes = eta_minutes
+        self.name_suffix = name_suffix
+        self.inventory = Inventory(load_index(), price_factor, eta_minutes, name_suffix)
+        defaults = {"search": f"const:{search_latency_s}", "select": "const:1", "confirm": "const:1"}
+        self.latency = {action: Latency(MOCK_BPP_LATENCY[action] or spec) for action, spec in defaults.items()}
+        self.faults = faults or MockFaults()
+        self.rng = random.Random(seed)
+        self._held: Optional[asyncio.Event] = None  # Callback waiting to be overtaken
+        self.counters = {"requests": 0, "errors": 0, "callbacks": 0, "dropped": 0,
+                         "duplicated": 0, "delayed": 0, "reordered": 0}
+
+    def respond(self, context: Context, action: str) -> Context:
+        response_context = context.model_copy()
+        response_context.action = action
+        response_context.bpp_id = self.bpp_id
+        response_context.bpp_uri = self.bpp_uri
+        response_context.timestamp = datetime.utcnow().isoformat()
+        return response_context
+
+    async def wait(self, action: str) -> None:
+        """Simulate processing time for action"""
+        await asyncio.sleep(self.latency[action].sample(self.rng))
+
+    def reject(self) -> bool:
+        """Count a request; True if it should be answered with an error"""
+        self.counters["requests"] += 1
+        if self.rng.random() < self.faults.error_rate:
+            self.counters["errors"] += 1
+            return True
+        return False
+
+    async def send_callback(self, target_uri: str, payload: Union[BaseModel, str]) -> None:
+        """POST a callback (a model or already serialized JSON) to the BAP, dropping, delaying,
+        duplicating or reordering it as configured"""
+        faults, rng = self.faults, self.rng
+        self.counters["callbacks"] += 1
+        if rng.random() < faults.drop_rate:
+            self.counters["dropped"] += 1
+            print(f"BPP {self.bpp_id}: Dropping callback to {target_uri}")
+            return
+        if rng.random() < faults.delay_rate:
+            self.counters["delayed"] += 1
+            await asyncio.sleep(faults.delay_s)
+        reorder = self._held is None and rng.random() < faults.reorder_rate
+        if reorder:
+            # Let the next callback overtake this one (waiting at most delay_s for it)
+            self.counters["reordered"] += 1
+            self._held = held = asyncio.Event()
+            try:
+                await asyncio.wait_for(held.wait(), faults.delay_s)
+            except asyncio.TimeoutError:
+                pass
+            if self._held is held:
+                self._held = None
+        copies = 2 if rng.random() < faults.duplicate_rate else 1
+        if copies > 1:
+            self.counters["duplicated"] += 1
+        body = payload if isinstance(payload, str) else payload.model_dump_json()
+        for _ in range(copies):
+            try:
+                await get_http_client().post(target_uri, content=body, headers=JSON_HEADERS)
+            except Exception as e:
+                print(f"BPP: Callback failed: {e}")
+        if not reorder and self._held is not None:
+            self._held.set()
+            self._held = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bpp_id": self.bpp_id,
+            "latency": {action: latency.spec for action, latency in self.latency.items()},
+            "faults": vars(self.faults),
+            **self.counters,
+        }
+
+
+# Price factor, ETA (minutes) and search latency of mock providers 2, 3, ...
+# (the first keeps the original catalog)
+_EXTRA_PROFILES = [(0.85, 45, 2.5), (1.15, 5, 1.5), (0.95, 30, 3.0)]
+
+
+def mock_bpps(count: int = MOCK_BPP_COUNT) -> List[MockBPP]:
+    seed = int(MOCK_BPP_SEED) if MOCK_BPP_SEED else None
+    bpps = [MockBPP(seed=seed)]
+    for n in range(2, count + 1):
+        price_factor, eta_minutes, latency = _EXTRA_PROFILES[(n - 2) % len(_EXTRA_PROFILES)]
+        bpps.append(MockBPP(f"/mock-bpp-{n}", f"mock-bpp-london-{n}", price_factor, eta_minutes, latency, f" #{n}",
+                            seed=seed + n if seed is not None else None))
+    return bpps
+
+
+MOCK_BPPS = mock_bpps()
+MOCK_BPP_URIS = [bpp.bpp_uri for bpp in MOCK_BPPS]
 
 # --- Background Tasks (Simulating Async Processing) ---
 
-async def process_search(request: SearchRequest):
+async def process_search(request: SearchRequest, bpp: MockBPP):
     """Simulate search processing and send callback"""
-    await asyncio.sleep(2)  # Simulate network/db latency
-    
-    # Extract query
-    intent = request.message.intent
-    query_item_name = ""
-    if intent.item and "descriptor" in intent.item:
-         query_item_name = intent.item["descriptor"].get("name", "")
-    
-    # Match inventory (simple string match or fallback)
-    matched_items = []
-    
-    # Simplified matching logic
-    inv_key = "fallback"
-    provider_name = "Mock Provider Services"
-    
-    for key in INVENTORY.keys():
-        if key in query_item_name:
-            inv_key = key
-            # Set specific provider names based on service type
-            if key == "dispatch_battery_discharge":
-                provider_name = "Tesla Virtual Power Plant"
-            elif key == "reduce_ev_load":
-                provider_name = "ChargePoint Network"
-            elif key == "shift_hvac_load":
-                provider_name = "Honeywell Smart Grid Solutions"
-            break
-            
-    for prod in INVENTORY[inv_key]:
-        matched_items.append(Item(
-            id=prod["id"],
-            descriptor=Descriptor(name=prod["name"], short_desc=prod["desc"]),
-            price=Price(currency="GBP", value=prod["price"]),
-            fulfillment_id="ful_1"
-        ))
+    await bpp.wait("search")  # Simulate network/db latency
     
-    # Construct Response
-    response_context = request.context.model_copy()
-    response_context.action = "on_search"
-    response_context.bpp_id = "mock-bpp-london"
-    response_context.bpp_uri = "http://localhost:8000/mock-bpp"
-    response_context.timestamp = datetime.utcnow().isoformat()
-    
-    catalog = Catalog(
-        descriptor=Descriptor(name="Mock BPP Catalog"),
-        providers=[
-            Provider(
-                id=f"prov_{inv_key}",
-                descriptor=Descriptor(name=provider_name),
-                items=matched_items
-            )
-        ]
-    )
-    
-    on_search_payload = OnSearchRequest(
-        context=response_context,
-        message=OnSearchMessage(catalog=catalog)
-    )
+    # Match the intent against the indexed inventory; the catalog comes back already serialized
+    catalog = bpp.inventory.catalog_json(request.message.intent)
+    response_context = bpp.respond(request.context, "on_search")
+    on_search_payload = f'{{"context":{response_context.model_dump_json()},"message":{{"catalog":{catalog}}}}}'
     
     # Send Callback
-    async with httpx.AsyncClient() as client:
-        try:
-            # The BAP URI from the request context
-            target_uri = f"{request.context.bap_uri}/on_search" 
-            # If local dev, ensure we hit the right endpoint
-            if "localhost" in request.context.bap_uri and "/beckn" not in target_uri:
-                 # Fix potential path issue if bap_uri is just base url
-                 pass 
-                 
-            print(f"BPP: Sending on_search to {target_uri}")
-            await client.post(target_uri, json=on_search_payload.model_dump())
-        except Exception as e:
-            print(f"BPP: Callback failed: {e}")
-
-async def process_select(request: SelectRequest):
+    # The BAP URI from the request context
+    target_uri = f"{request.context.bap_uri}/on_search"
+    print(f"BPP: Sending on_search to {target_uri}")
+    await bpp.send_callback(target_uri, on_search_payload)
+
+async def process_select(request: SelectRequest, bpp: MockBPP):
     """Simulate selection and quote generation"""
-    await asyncio.sleep(1)
+    await bpp.wait("select")
     
-    response_context = request.context.model_copy()
-    response_context.action = "on_select"
-    response_context.bpp_id = "mock-bpp-london"
-    response_context.bpp_uri = "http://localhost:8000/mock-bpp"
-    response_context.timestamp = datetime.utcnow().isoformat()
+    response_context = bpp.respond(request.context, "on_select")
     
     # Generate Quote
     order_items = request.message.order.items or []
@@ -142,23 +235,15 @@ async def process_select(request: SelectRequest):
         )
     )
     
-    async with httpx.AsyncClient() as client:
-        try:
-            target_uri = f"{request.context.bap_uri}/on_select"
-            print(f"BPP: Sending on_select to {target_uri}")
-            await client.post(target_uri, json=on_select_payload.model_dump())
-        except Exception as e:
-            print(f"BPP: Callback failed: {e}")
+    target_uri = f"{request.context.bap_uri}/on_select"
+    print(f"BPP: Sending on_select to {target_uri}")
+    await bpp.send_callback(target_uri, on_select_payload)
 
-async def process_confirm(request: ConfirmRequest):
+async def process_confirm(request: ConfirmRequest, bpp: MockBPP):
     """Simulate order confirmation"""
-    await asyncio.sleep(1)
+    await bpp.wait("confirm")
     
-    response_context = request.context.model_copy()
-    response_context.action = "on_confirm"
-    response_context.bpp_id = "mock-bpp-london"
-    response_context.bpp_uri = "http://localhost:8000/mock-bpp"
-    response_context.timestamp = datetime.utcnow().isoformat()
+    response_context = bpp.respond(request.context, "on_confirm")
     
     # Create confirmed order
     order = request.message.order
@@ -170,32 +255,54 @@ async def process_confirm(request: ConfirmRequest):
         message=OnConfirmMessage(order=order)
     )
     
-    async with httpx.AsyncClient() as client:
-        try:
-            target_uri = f"{request.context.bap_uri}/on_confirm"
-            print(f"BPP: Sending on_confirm to {target_uri}")
-            await client.post(target_uri, json=on_confirm_payload.model_dump())
-        except Exception as e:
-            print(f"BPP: Callback failed: {e}")
+    target_uri = f"{request.context.bap_uri}/on_confirm"
+    print(f"BPP: Sending on_confirm to {target_uri}")
+    await bpp.send_callback(target_uri, on_confirm_payload)
 
 
 # --- Endpoints ---
 
-@router.post("/search", response_model=BecknResponse)
-async def search(request: SearchRequest, background_tasks: BackgroundTasks):
-    print(f"BPP: Received search request: {request.message.intent}")
-    background_tasks.add_task(process_search, request)
-    return BecknResponse(message=Ack())
+def _injected_error(action: str) -> JSONResponse:
+    response = BecknResponse(message=Ack(status="NACK"),
+                             error={"code": "MOCK-500", "message": f"Injected {action} failure"})
+    return JSONResponse(status_code=500, content=response.model_dump())
+
+
+def create_router(bpp: MockBPP) -> APIRouter:
+    """Beckn endpoints of one mock provider, mounted at bpp.prefix."""
+    router = APIRouter(prefix=bpp.prefix, tags=["Mock BPP"])
+
+    @router.post("/search", response_model=BecknResponse)
+    async def search(request: SearchRequest, background_tasks: BackgroundTasks):
+        print(f"BPP {bpp.bpp_id}: Received search request: {request.message.intent}")
+        if bpp.reject():
+            return _injected_error("search")
+        background_tasks.add_task(process_search, request, bpp)
+        return BecknResponse(message=Ack())
+
+    @router.post("/select", response_model=BecknResponse)
+    async def select(request: SelectRequest, background_tasks: BackgroundTasks):
+        print(f"BPP {bpp.bpp_id}: Received select request")
+        if bpp.reject():
+            return _injected_error("select")
+        background_tasks.add_task(process_select, request, bpp)
+        return BecknResponse(message=Ack())
+
+    @router.post("/confirm", response_model=BecknResponse)
+    async def confirm(request: ConfirmRequest, background_tasks: BackgroundTasks):
+        print(f"BPP {bpp.bpp_id}: Received confirm request")
+        if bpp.reject():
+            return _injected_error("confirm")
+        background_tasks.add_task(process_confirm, request, bpp)
+        return BecknResponse(message=Ack())
+
+    @router.get("/stats")
+    def stats():
+        """Latency and fault settings, and how many requests/callbacks were affected."""
+        return bpp.stats()
 
-@router.post("/select", response_model=BecknResponse)
-async def select(request: SelectRequest, background_tasks: BackgroundTasks):
-    print(f"BPP: Received select request")
-    background_tasks.add_task(process_select, request)
-    return BecknResponse(message=Ack())
+    return router
 
-@router.post("/confirm", response_model=BecknResponse)
-async def confirm(request: ConfirmRequest, background_tasks: BackgroundTasks):
-    print(f"BPP: Received confirm request")
-    background_tasks.add_task(process_confirm, request)
-    return BecknResponse(message=Ack())
 
+routers = [create_router(bpp) for bpp in MOCK_BPPS]
+router = routers[0]
@@ -0,0 +1,113 @@
+"""
+Offers collected from the on_search responses of one or more BPPs.
+
+Every catalog item becomes an Offer carrying the BPP it came from (so select
+and confirm go back to that BPP), its price and its ETA (the item's
+`time.duration`). Offers are kept in one sorted index per strategy, so adding
+or removing a BPP's response costs O(items log n) comparisons and the best
+offer is the head of an index:
+
+    price  lowest price
+    eta    earliest dispatch
+    score  price + BECKN_OFFER_ETA_WEIGHT * ETA minutes (currency per minute of delay)
+
+A BPP that responds again replaces its previous offers.
+"""
+
+import bisect
+import itertools
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from beckn_models import OnSearchRequest, Provider, Item, parse_duration
+
+OFFER_STRATEGIES = ("price", "eta", "score")
+BECKN_OFFER_STRATEGY = os.getenv("BECKN_OFFER_STRATEGY", "score")
+BECKN_OFFER_ETA_WEIGHT = float(os.getenv("BECKN_OFFER_ETA_WEIGHT", "0.005"))
+
+
+def _price(item: Item) -> float:
+    try:
+        return float(item.price.value)
+    except (AttributeError, TypeError, ValueError):
+        return math.inf
+
+
+def _eta_s(item: Item) -> float:
+    duration = (item.time or {}).get("duration")
+    return parse_duration(duration, default=math.inf)
+
+
+class Offer:
+    __slots__ = ("bpp_id", "bpp_uri", "provider", "item", "price", "eta_s", "score", "seq")
+
+    def __init__(self, bpp_id: str, bpp_uri: Optional[str], provider: Provider, item: Item,
+                 eta_weight: float = BECKN_OFFER_ETA_WEIGHT):
+        self.bpp_id = bpp_id
+        self.bpp_uri = bpp_uri
+        self.provider = provider
+        self.item = item
+        self.price = _price(item)
+        self.eta_s = _eta_s(item)
+        self.score = self.price + (eta_weight * self.eta_s / 60 if eta_weight else 0.0)
+        self.seq = 0  # Position in insertion order, set by OfferBook
+
+    def key(self, strategy: str) -> Tuple[float, float]:
+        """Sort key for a strategy; ties go to the other criterion."""
+        if strategy == "price":
+            return self.price, self.eta_s
+        if strategy == "eta":
+            return self.eta_s, self.price
+        return self.score, self.price
+
+
+class OfferBook:
+    def __init__(self, eta_weight: float = BECKN_OFFER_ETA_WEIGHT):
+        self.eta_weight = eta_weight
+        self._by_bpp: Dict[str, List[Offer]] = {}
+        # strategy -> [(key, seq, offer)] in ascending key order; seq keeps Offers out of comparisons
+        self._index: Dict[str, List[Tuple[Tuple[float, float], int, Offer]]] = {s: [] for s in OFFER_STRATEGIES}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._index["price"])
+
+    @property
+    def bpp_ids(self) -> List[str]:
+        return list(self._by_bpp)
+
+    def add(self, response: OnSearchRequest) -> int:
+        """Index one BPP's on_search response; returns how many offers it added."""
+        context = response.context
+        bpp_id = context.bpp_id or context.bpp_uri or "unknown"
+        if bpp_id in self._by_bpp:
+            self.remove(bpp_id)
+        offers = [
+            Offer(bpp_id, context.bpp_uri, provider, item, self.eta_weight)
+            for provider in response.message.catalog.providers
+            for item in provider.items or []
+        ]
+        self._by_bpp[bpp_id] = offers
+        for offer in offers:
+            offer.seq = next(self._seq)
+            for strategy, index in self._index.items():
+                bisect.insort(index, (offer.key(strategy), offer.seq, offer))
+        return len(offers)
+
+    def remove(self, bpp_id: str) -> int:
+        """Drop a BPP's offers; returns how many were dropped."""
+        offers = self._by_bpp.pop(bpp_id, [])
+        for offer in offers:
+            for strategy, index in self._index.items():
+                # (key, seq) sorts just before its (key, seq, offer) entry, and seq is unique
+                del index[bisect.bisect_left(index, (offer.key(strategy), offer.seq))]
+        return len(offers)
+
+    def best(self, strategy: str = BECKN_OFFER_STRATEGY) -> Optional[Offer]:
+        index = self._index.get(strategy, self._index["score"])
+        return index[0][2] if index else None
+
+    def ranked(self, strategy: str = BECKN_OFFER_STRATEGY, limit: Optional[int] = None) -> List[Offer]:
+        index = self._index.get(strategy, self._index["score"])
+        return [entry[2] for entry in index[:limit]]
@@ -0,0 +1,161 @@
+"""
+Content-addressed cache for AI mitigation plans.
+
+Plans are keyed by a SHA-256 over the canonical JSON of (model, scenario, risks,
+assets), so identical requests (or prompt shards) hit regardless of list order.
+Two tiers: an in-memory LRU (which also coalesces concurrent identical requests
+into one LLM call) and an optional SQLite file that survives restarts.
+Only successful plans are ever stored.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Callable, Awaitable, Iterable, Optional
+
+from async_cache import AsyncTTLCache
+
+PLAN_CACHE_TTL_S = float(os.getenv("PLAN_CACHE_TTL_S", "3600"))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "256"))
+PLAN_CACHE_MAX_BYTES = int(os.getenv("PLAN_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Empty disables the on-disk tier
+PLAN_CACHE_DB = os.getenv("PLAN_CACHE_DB", "")
+PLAN_CACHE_DISK_MAX_BYTES = int(os.getenv("PLAN_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def _dump(model: Any) -> Any:
+    return model.model_dump() if hasattr(model, "model_dump") else model
+
+
+def plan_cache_key(scenario: Any, risks: Iterable[Any], assets: Iterable[Any], model_name: str) -> str:
+    """Canonical hash of a planning request (or one shard of it) plus the model that plans it."""
+    payload = {
+        "model": model_name,
+        "scenario": _dump(scenario),
+        "risks": sorted((_dump(r) for r in risks), key=lambda r: json.dumps(r, sort_keys=True)),
+        "assets": sorted((_dump(a) for a in assets), key=lambda a: json.dumps(a, sort_keys=True)),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class SqlitePlanStore:
+    """On-disk plan tier with TTL and a total-size cap (least recently used evicted first)."""
+
+    def __init__(self, path: Path, ttl_seconds: float, max_bytes: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " expires REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS plans_last_access ON plans (last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE plans SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, plan: Dict[str, Any]) -> None:
+        value = json.dumps(plan)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans (key, value, size, expires, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + self.ttl_seconds, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM plans WHERE expires <= ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM plans").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM plans ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM plans").fetchone()
+        return {"path": str(self.path), "entries": count, "bytes": size, "max_bytes": self.max_bytes}
+
+
+class PlanCache:
+    """Memory tier in front of an optional disk tier."""
+
+    def __init__(self, memory: AsyncTTLCache, disk: Optional[SqlitePlanStore] = None):
+        self.memory = memory
+        self.disk = disk
+        self.disk_hits = 0
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Return the cached plan for key, or run `generate` once for all concurrent callers.
+        `generate` must raise on failure so error fallbacks are never cached.
+        """
+        async def fetch() -> Dict[str, Any]:
+            if self.disk is not None:
+                plan = await asyncio.to_thread(self.disk.get, key)
+                if plan is not None:
+                    self.disk_hits += 1
+                    return plan
+            plan = await generate()
+            if self.disk is not None:
+                await asyncio.to_thread(self.disk.put, key, plan)
+            return plan
+
+        return await self.memory.get(key, fetch)
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached plan from either tier, without generating one."""
+        plan = self.memory.peek(key)
+        if plan is None and self.disk is not None:
+            plan = await asyncio.to_thread(self.disk.get, key)
+            if plan is not None:
+                self.disk_hits += 1
+                self.memory.put(key, plan)
+        return plan
+
+    async def store(self, key: str, plan: Dict[str, Any]) -> None:
+        """Store a complete plan assembled outside get_or_generate (e.g. from a stream)."""
+        self.memory.put(key, plan)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, plan)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+PLAN_CACHE = PlanCache(
+    AsyncTTLCache(PLAN_CACHE_TTL_S, PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_MAX_BYTES),
+    SqlitePlanStore(Path(PLAN_CACHE_DB), PLAN_CACHE_TTL_S, PLAN_CACHE_DISK_MAX_BYTES) if PLAN_CACHE_DB else None,
+)
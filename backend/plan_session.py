@@ -0,0 +1,169 @@
+"""
+Incremental re-planning sessions.
+
+A session remembers the risks and actions of the last plan for a scenario.
+When the scenario is re-run (e.g. after a forecast update), the new request is
+diffed per asset against that state: actions for assets whose risks and asset
+data are unchanged are reused, actions for assets that dropped out of risk are
+removed, and only added or changed assets are sent to the planner. Each action
+in the merged plan carries provenance "reused" or "new".
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Set
+
+from agent_service import generate_mitigation_plan
+
+PLAN_SESSION_TTL_S = float(os.getenv("PLAN_SESSION_TTL_S", "21600"))
+PLAN_SESSION_MAX = int(os.getenv("PLAN_SESSION_MAX", "1024"))
+
+
+def _signature(risks: List[Any], asset: Optional[Any]) -> str:
+    """Everything about one asset that its actions depend on."""
+    return json.dumps({
+        "risks": sorted((r.model_dump() for r in risks), key=lambda r: json.dumps(r, sort_keys=True)),
+        "asset": asset.model_dump() if asset is not None else None,
+    }, sort_keys=True)
+
+
+class PlanSession:
+    __slots__ = ("scenario", "signatures", "actions", "summary_text", "plan_source", "touched", "lock")
+
+    def __init__(self):
+        self.scenario: Optional[Dict[str, Any]] = None
+        self.signatures: Dict[str, Optional[str]] = {}  # asset_id -> signature (None: replan next time)
+        self.actions: Dict[str, List[Dict[str, Any]]] = {}  # asset_id -> actions
+        self.summary_text = ""
+        self.plan_source: Optional[str] = None
+        self.touched = time.monotonic()
+        self.lock = asyncio.Lock()
+
+
+class PlanSessionStore:
+    """Sessions by id, expiring after PLAN_SESSION_TTL_S idle, least recently used evicted beyond the cap."""
+
+    def __init__(self, ttl_seconds: float = PLAN_SESSION_TTL_S, max_sessions: int = PLAN_SESSION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, PlanSession]" = OrderedDict()
+
+    def get(self, session_id: str) -> PlanSession:
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None or now - session.touched > self.ttl_seconds:
+            session = self._sessions[session_id] = PlanSession()
+        self._sessions.move_to_end(session_id)
+        session.touched = now
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+PLAN_SESSIONS = PlanSessionStore()
+
+
+async def replan(session_id: str, request_data: Any, mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Plan request_data incrementally against the session's previous plan.
+
+    A changed scenario (location, event, window) invalidates every previous
+    action. Assets planned by the rule-based fallback are replanned on the
+    next call, so they pick up an LLM plan once one is available.
+
+    Returns:
+        Plan dict as from generate_mitigation_plan, plus "session_id" and
+        "replanned_assets"; every action has "provenance": "reused" | "new".
+    """
+    session = PLAN_SESSIONS.get(session_id)
+    async with session.lock:
+        scenario = request_data.scenario.model_dump()
+        if scenario != session.scenario:
+            session.signatures.clear()
+            session.actions.clear()
+
+        assets = {a.id: a for a in request_data.assets}
+        risks_by_asset: Dict[str, List[Any]] = {}
+        for risk in request_data.risks:
+            risks_by_asset.setdefault(risk.asset_id, []).append(risk)
+
+        signatures = {
+            asset_id: _signature(risks, assets.get(asset_id)) for asset_id, risks in risks_by_asset.items()
+        }
+        changed: Set[str] = {
+            asset_id for asset_id, sig in signatures.items() if session.signatures.get(asset_id) != sig
+        }
+        removed = set(session.actions) - set(signatures)
+
+        plan_source = session.plan_source
+        failed = False
+        new_actions: Dict[str, List[Dict[str, Any]]] = {}
+        delta_summary = ""
+        if changed:
+            delta = request_data.model_copy(update={
+                "risks": [r for r in request_data.risks if r.asset_id in changed],
+                "assets": [a for a in request_data.assets if a.id in changed],
+            })
+            plan = await generate_mitigation_plan(delta, mode)
+            plan_source = plan.get("plan_source")
+            failed = bool(plan.get("error"))
+            delta_summary = plan["summary_text"]
+            for action in plan["mitigation_actions"]:
+                # Ignore anything the planner proposed outside the delta
+                if action.get("asset_id") in changed:
+                    new_actions.setdefault(action["asset_id"], []).append({**action, "provenance": "new"})
+
+        for asset_id in removed:
+            session.actions.pop(asset_id, None)
+            session.signatures.pop(asset_id, None)
+        for asset_id in changed:
+            session.actions[asset_id] = new_actions.get(asset_id, [])
+            # Error plans and rule fallbacks are replanned on the next call
+            retry = failed or (plan_source == "rules" and mode != "rules")
+            session.signatures[asset_id] = None if retry else signatures[asset_id]
+        session.scenario = scenario
+        session.plan_source = plan_source
+
+        actions: List[Dict[str, Any]] = []
+        reused = 0
+        for asset_id, asset_actions in session.actions.items():
+            for action in asset_actions:
+                if asset_id in changed:
+                    actions.append(action)
+                else:
+                    actions.append({**action, "provenance": "reused"})
+                    reused += 1
+            # Stored actions are reused from the next call on
+            session.actions[asset_id] = [{**a, "provenance": "reused"} for a in asset_actions]
+
+        if changed:
+            summary = delta_summary
+            if reused:
+                summary += f" Reused {reused} actions for {len(signatures) - len(changed)} unchanged assets."
+            if not failed:
+                session.summary_text = summary
+        elif signatures:
+            summary = session.summary_text
+        else:
+            summary = "No grid risks identified; no flexibility actions required."
+        if removed:
+            summary += f" Cleared actions for {len(removed)} assets no longer at risk."
+
+        print(f"Agent: Session {session_id}: {len(changed)} assets replanned, {reused} actions reused, "
+              f"{len(removed)} assets cleared")
+        return {
+            "summary_text": summary,
+            "mitigation_actions": actions,
+            "plan_source": plan_source,
+            "session_id": session_id,
+            "replanned_assets": sorted(changed),
+        }
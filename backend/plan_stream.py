@@ -0,0 +1,105 @@
+"""
+Incremental parser for streamed mitigation plans.
+
+Feeds on model output as it arrives and reports each element of
+"mitigation_actions" as soon as its closing brace is seen, and "summary_text"
+as soon as its closing quote is seen, without waiting for the rest of the
+document. Anything before the first "{" (e.g. a ```json fence) is ignored.
+"""
+
+import json
+from typing import List, Tuple, Any, Optional
+
+
+class PlanStreamParser:
+    """
+    Usage:
+        parser = PlanStreamParser()
+        for chunk in stream:
+            for kind, value in parser.feed(chunk):   # ("action", dict) / ("summary", str)
+                ...
+        parser.close()  # raises ValueError if the document was incomplete
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0  # Next unread character in _buf
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start: Optional[int] = None
+        self._expect_key = False  # Next top-level string is a key
+        self._key: Optional[str] = None  # Current top-level key
+        self._item_start: Optional[int] = None  # Start of the action object being read
+        self.done = False
+        self.summary_seen = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        self._buf += text
+        buf = self._buf
+        i = self._pos
+        while i < len(buf) and not self.done:
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        value = json.loads(buf[self._string_start:i + 1])
+                        if self._expect_key:
+                            self._key = value
+                        elif self._key == "summary_text":
+                            self.summary_seen = True
+                            events.append(("summary", value))
+            elif c == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = i
+            elif c == "{":
+                if not self._stack:
+                    self._expect_key = True
+                elif self._stack == ["{", "["] and self._key == "mitigation_actions":
+                    self._item_start = i
+                self._stack.append(c)
+            elif c == "[":
+                if self._stack:
+                    self._stack.append(c)
+            elif c in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if c == "}" and self._item_start is not None and self._stack == ["{", "["]:
+                    events.append(("action", json.loads(buf[self._item_start:i + 1])))
+                    self._item_start = None
+                if not self._stack and c == "}":
+                    self.done = True
+            elif len(self._stack) == 1:
+                if c == ":":
+                    self._expect_key = False
+                elif c == ",":
+                    self._expect_key = True
+            i += 1
+        self._pos = i
+        self._compact()
+        return events
+
+    def _compact(self) -> None:
+        """Drop consumed text that no pending string or action still needs."""
+        keep = min(p for p in (self._item_start, self._string_start if self._in_string else None, self._pos)
+                   if p is not None)
+        if keep:
+            self._buf = self._buf[keep:]
+            self._pos -= keep
+            if self._item_start is not None:
+                self._item_start -= keep
+            if self._string_start is not None:
+                self._string_start = self._string_start - keep if self._in_string else None
+
+    def close(self) -> None:
+        if not self.done:
+            raise ValueError("Incomplete plan JSON from AI")
+        if not self.summary_seen:
+            raise ValueError("Invalid response structure from AI")
@@ -2,7 +2,12 @@
 Risk engine - calculates risk levels for DEG assets based on weather scenarios.
 """
 
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Union, Iterator, Iterable
+
+import numpy as np
+
+from weather import HourlyWeatherSeries
 
 
 def calculate_risk_for_asset(asset: Dict[str, Any], weather_data: Dict[str, Any], event_type: str) -> Dict[str, Any]:
@@ -116,9 +121,12 @@ def calculate_risk_for_asset(asset: Dict[str, Any], weather_data: Dict[str, Any]
     return None
 
 
-def simulate_risk(event_type: str, weather_data: Dict[str, Any], assets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def simulate_risk_reference(event_type: str, weather_data: Dict[str, Any], assets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Run risk simulation for all assets.
+    Run risk simulation for all assets, one asset dict at a time.
+    
+    Reference implementation for the columnar engine; kept for
+    cross-checking and small ad-hoc asset lists.
     
     Args:
         event_type: "heatwave" or "flood"
@@ -141,3 +149,360 @@ def simulate_risk(event_type: str, weather_data: Dict[str, Any], assets: List[Di
     
     return risks
 
+
+# ============================================================================
+# Columnar (NumPy) engine
+# ============================================================================
+
+RISK_LEVELS = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+NO_RISK = 99  # Sorts after every real level, same as the reference risk_order
+
+ASSET_TYPE_CODES = {"substation": 0, "ev_hub": 1, "solar_farm": 2}
+OTHER_TYPE = 3
+CRITICALITY_CODES = {"low": 0, "medium": 1, "high": 2}
+
+TYPE_SUBSTATION = ASSET_TYPE_CODES["substation"]
+TYPE_EV_HUB = ASSET_TYPE_CODES["ev_hub"]
+TYPE_SOLAR_FARM = ASSET_TYPE_CODES["solar_farm"]
+CRITICALITY_HIGH = CRITICALITY_CODES["high"]
+
+
+class AssetTable:
+    """
+    Column-oriented view of an asset list.
+    
+    Numeric columns drive the risk rules; `ids` and `feeds` are only touched
+    for assets that end up with a risk.
+    """
+
+    __slots__ = ("ids", "type_code", "criticality_code", "flood_zone", "capacity_kw", "feeds")
+
+    def __init__(self, ids: np.ndarray, type_code: np.ndarray, criticality_code: np.ndarray,
+                 flood_zone: np.ndarray, capacity_kw: np.ndarray, feeds: np.ndarray):
+        self.ids = ids
+        self.type_code = type_code
+        self.criticality_code = criticality_code
+        self.flood_zone = flood_zone
+        self.capacity_kw = capacity_kw
+        self.feeds = feeds
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, positions: np.ndarray) -> "AssetTable":
+        """Sub-table holding only the rows at `positions`."""
+        return AssetTable(*(getattr(self, name)[positions] for name in self.__slots__))
+
+    @classmethod
+    def from_assets(cls, assets: List[Dict[str, Any]]) -> "AssetTable":
+        """Build a table from asset dictionaries (same defaults as calculate_risk_for_asset)."""
+        return cls(
+            ids=np.array([a.get("id") for a in assets], dtype=object),
+            type_code=np.fromiter(
+                (ASSET_TYPE_CODES.get(a.get("type", ""), OTHER_TYPE) for a in assets),
+                dtype=np.int8, count=len(assets)
+            ),
+            criticality_code=np.fromiter(
+                (CRITICALITY_CODES.get(a.get("criticality", "medium"), -1) for a in assets),
+                dtype=np.int8, count=len(assets)
+            ),
+            flood_zone=np.fromiter(
+                (bool(a.get("flood_zone", False)) for a in assets),
+                dtype=bool, count=len(assets)
+            ),
+            capacity_kw=np.fromiter(
+                (float(a.get("capacity_kw", 0) or 0) for a in assets),
+                dtype=np.float64, count=len(assets)
+            ),
+            feeds=np.array([a.get("feeds") or "" for a in assets], dtype=object),
+        )
+
+
+def _heatwave_levels(table: AssetTable, max_temp: Any, duration_hours: Any):
+    """
+    Heatwave rules as masks.
+    
+    `max_temp` and `duration_hours` may be scalars or per-asset arrays, so the
+    same rules serve the whole-event and the hourly simulations.
+    
+    Returns:
+        (level, outcome) int8 arrays; outcome indexes the heatwave outcome table
+    """
+    max_temp = np.asarray(max_temp)
+    duration_hours = np.asarray(duration_hours)
+
+    n = len(table)
+    level = np.full(n, NO_RISK, dtype=np.int8)
+    outcome = np.zeros(n, dtype=np.int8)
+
+    hot = max_temp >= 35
+    sustained = hot & (max_temp >= 37) & (duration_hours >= 48)
+    elevated = hot & ~sustained & (max_temp >= 36)
+    mild = hot & ~sustained & ~elevated
+
+    is_sub = table.type_code == TYPE_SUBSTATION
+    is_ev = table.type_code == TYPE_EV_HUB
+    is_solar = table.type_code == TYPE_SOLAR_FARM
+
+    def assign(mask, lvl, out):
+        mask = np.broadcast_to(mask, n)
+        level[mask] = lvl
+        outcome[mask] = out
+
+    assign(is_sub & sustained, 0, 0)
+    assign(is_sub & elevated, 1, 1)
+    assign(is_sub & mild, 2, 2)
+    # MEDIUM substations escalate to HIGH on critical feeders
+    assign(is_sub & mild & (table.criticality_code == CRITICALITY_HIGH), 1, 3)
+    assign(is_ev & sustained, 1, 4)
+    assign(is_ev & elevated, 2, 5)
+    assign(is_solar & hot & (max_temp >= 37), 2, 6)
+
+    return level, outcome
+
+
+def _heatwave_rules(table: AssetTable, weather_data: Dict[str, Any]):
+    """Return (level, outcome index, outcome table) arrays for a heatwave."""
+    max_temp = weather_data.get("max_temp_celsius", 0)
+    duration_hours = weather_data.get("duration_hours", 0)
+
+    outcomes = [
+        (f"Projected Load > 120% Capacity (A/C Spike at {max_temp}°C)",
+         "Immediate feeder overload risk, potential thermal runaway"),
+        ("Projected Load > 105% Capacity (High A/C Demand)",
+         "Transformer aging acceleration, voltage sag risk"),
+        ("Projected Load approaching 95% Capacity",
+         "Monitor reserve margins"),
+        ("Projected Load approaching 95% Capacity (critical feeder)",
+         "Monitor reserve margins"),
+        ("Coincident Peak Contributor: EV Charging + Grid Stress",
+         "Local feeder congestion likely during evening peak"),
+        ("Potential Peak Contributor",
+         "Monitor coincident load"),
+        ("Thermal derating: PV efficiency drop predicted",
+         "Reduced local generation capacity (~5-10%)"),
+    ]
+
+    level, outcome = _heatwave_levels(table, max_temp, duration_hours)
+    return level, outcome, outcomes
+
+
+def _flood_levels(table: AssetTable, total_rainfall: Any, max_rainfall_per_hour: Any):
+    """
+    Flood rules as masks; rainfall values may be scalars or per-asset arrays.
+    
+    Returns:
+        (level, outcome) int8 arrays; outcome indexes the flood outcome table
+    """
+    total_rainfall = np.asarray(total_rainfall)
+    max_rainfall_per_hour = np.asarray(max_rainfall_per_hour)
+
+    n = len(table)
+    level = np.full(n, NO_RISK, dtype=np.int8)
+    outcome = np.zeros(n, dtype=np.int8)
+
+    def assign(mask, lvl, out):
+        mask = np.broadcast_to(mask, n)
+        level[mask] = lvl
+        outcome[mask] = out
+
+    in_zone = table.flood_zone
+    out_zone = ~in_zone
+
+    zone_critical = (total_rainfall >= 60) & (max_rainfall_per_hour >= 10)
+    zone_high = ~zone_critical & (total_rainfall >= 40)
+    heavy = (total_rainfall >= 80) & (max_rainfall_per_hour >= 15)
+    moderate = ~heavy & (total_rainfall >= 60)
+
+    assign(in_zone & zone_critical, 0, 0)
+    assign(in_zone & zone_high, 1, 1)
+    assign(out_zone & heavy, 1, 2)
+    assign(out_zone & moderate, 2, 3)
+
+    # All electrical assets at risk from flooding
+    electrical = (table.type_code == TYPE_SUBSTATION) | (table.type_code == TYPE_EV_HUB)
+    assign(electrical & (level == NO_RISK) & (total_rainfall >= 50), 2, 4)
+
+    return level, outcome
+
+
+def _flood_rules(table: AssetTable, weather_data: Dict[str, Any]):
+    """Return (level, outcome index, outcome table) arrays for a flood."""
+    total_rainfall = weather_data.get("total_rainfall_mm", 0)
+    max_rainfall_per_hour = weather_data.get("max_rainfall_per_hour_mm", 0)
+
+    outcomes = [
+        (f"Located in flood zone, forecast {total_rainfall}mm rainfall",
+         "Flooding risk, equipment damage possible"),
+        (f"Located in flood zone, forecast {total_rainfall}mm rainfall",
+         "High flood risk, prepare protective measures"),
+        (f"Heavy rainfall forecast: {total_rainfall}mm",
+         "Flash flooding possible, monitor drainage"),
+        (f"Forecast {total_rainfall}mm rainfall",
+         "Monitor local flooding conditions"),
+        (f"Forecast {total_rainfall}mm rainfall may affect electrical infrastructure",
+         "Water ingress risk to electrical equipment"),
+    ]
+
+    level, outcome = _flood_levels(table, total_rainfall, max_rainfall_per_hour)
+    return level, outcome, outcomes
+
+
+RULES = {
+    "heatwave": _heatwave_rules,
+    "flood": _flood_rules,
+}
+
+
+def risk_levels(event_type: str, weather_data: Dict[str, Any], table: AssetTable) -> np.ndarray:
+    """Per-asset risk level codes (index into RISK_LEVELS, NO_RISK if none)."""
+    rules = RULES.get(event_type)
+    if rules is None:
+        return np.full(len(table), NO_RISK, dtype=np.int8)
+    return rules(table, weather_data)[0]
+
+
+def iter_risks(event_type: str, weather_data: Dict[str, Any], table: AssetTable) -> Iterator[Dict[str, Any]]:
+    """
+    Yield RiskResult dictionaries CRITICAL-first, one at a time.
+    
+    Only the per-asset level arrays are materialised, so callers can stream
+    results for very large fleets.
+    """
+    rules = RULES.get(event_type)
+    if rules is None or len(table) == 0:
+        return
+
+    level, outcome, outcomes = rules(table, weather_data)
+
+    # Stable sort keeps asset order within a level, like list.sort in the reference
+    order = np.argsort(level, kind="stable")
+    order = order[level[order] != NO_RISK]
+
+    ids = table.ids
+    feeds = table.feeds
+    for i in order.tolist():
+        reason, expected_impact = outcomes[outcome[i]]
+        if feeds[i]:
+            expected_impact += f" affecting {feeds[i]}"
+        yield {
+            "asset_id": ids[i],
+            "risk_level": RISK_LEVELS[level[i]],
+            "reason": reason,
+            "expected_impact": expected_impact
+        }
+
+
+def simulate_risk_columnar(event_type: str, weather_data: Dict[str, Any], table: AssetTable) -> List[Dict[str, Any]]:
+    """
+    Run risk simulation over an AssetTable using masked array operations.
+    
+    Produces the same results, in the same order, as simulate_risk_reference.
+    """
+    return list(iter_risks(event_type, weather_data, table))
+
+
+def simulate_risk(event_type: str, weather_data: Dict[str, Any],
+                  assets: Union[List[Dict[str, Any]], AssetTable]) -> List[Dict[str, Any]]:
+    """
+    Run risk simulation for all assets.
+    
+    Args:
+        event_type: "heatwave" or "flood"
+        weather_data: Weather data dictionary
+        assets: List of asset dictionaries, or a prebuilt AssetTable
+    
+    Returns:
+        List of RiskResult dictionaries (CRITICAL first)
+    """
+    table = assets if isinstance(assets, AssetTable) else AssetTable.from_assets(assets)
+    return simulate_risk_columnar(event_type, weather_data, table)
+
+
+# ============================================================================
+# Hourly simulation
+# ============================================================================
+
+HOT_HOUR_THRESHOLD_C = 35  # Same gate the heatwave rules start from
+
+
+class HourlyRiskState:
+    """Risk level of every asset at one hour of the forecast horizon."""
+
+    __slots__ = ("hour", "timestamp", "levels")
+
+    def __init__(self, hour: int, timestamp: datetime, levels: np.ndarray):
+        self.hour = hour
+        self.timestamp = timestamp
+        self.levels = levels  # int8 per asset, NO_RISK where the asset is fine
+
+
+def iter_hourly_risk(series: HourlyWeatherSeries, table: AssetTable) -> Iterator[HourlyRiskState]:
+    """
+    Stream per-hour, per-asset risk levels over the series horizon.
+    
+    Running state (consecutive hot hours, cumulative and peak hourly rainfall)
+    is one array per asset updated in place each hour, so memory stays O(assets)
+    regardless of horizon length.
+    """
+    n = len(table)
+    hot_hours = np.zeros(n, dtype=np.int32)
+    cumulative_rain = np.zeros(n, dtype=np.float64)
+    peak_rain = np.zeros(n, dtype=np.float64)
+
+    for hour, timestamp, temp, rain in series.hours():
+        if series.event_type == "heatwave":
+            is_hot = np.broadcast_to(np.asarray(temp) >= HOT_HOUR_THRESHOLD_C, n)
+            hot_hours += 1
+            hot_hours[~is_hot] = 0
+            levels, _ = _heatwave_levels(table, temp, hot_hours)
+        elif series.event_type == "flood":
+            cumulative_rain += rain
+            np.maximum(peak_rain, rain, out=peak_rain)
+            levels, _ = _flood_levels(table, cumulative_rain, peak_rain)
+        else:
+            levels = np.full(n, NO_RISK, dtype=np.int8)
+        yield HourlyRiskState(hour, timestamp, levels)
+
+
+def summarize_hourly_risk(states: Iterable[HourlyRiskState], table: AssetTable) -> List[Dict[str, Any]]:
+    """
+    Fold an hourly stream into one timeline entry per asset that was ever at risk.
+    
+    Returns:
+        List of dicts with peak level, first at-risk / first CRITICAL timestamps
+        and hours spent at CRITICAL, ordered by peak level (CRITICAL first)
+    """
+    n = len(table)
+    peak = np.full(n, NO_RISK, dtype=np.int8)
+    first_at_risk = np.full(n, -1, dtype=np.int32)
+    first_critical = np.full(n, -1, dtype=np.int32)
+    critical_hours = np.zeros(n, dtype=np.int32)
+    timestamps = {}
+
+    for state in states:
+        levels = state.levels
+        at_risk = levels != NO_RISK
+        critical = levels == 0
+        if at_risk.any() or critical.any():
+            timestamps[state.hour] = state.timestamp
+        first_at_risk[at_risk & (first_at_risk < 0)] = state.hour
+        first_critical[critical & (first_critical < 0)] = state.hour
+        critical_hours += critical
+        np.minimum(peak, levels, out=peak)
+
+    def at(hour: int):
+        return timestamps[hour].isoformat() if hour >= 0 else None
+
+    order = np.argsort(peak, kind="stable")
+    order = order[peak[order] != NO_RISK]
+    return [
+        {
+            "asset_id": table.ids[i],
+            "peak_risk_level": RISK_LEVELS[peak[i]],
+            "first_at_risk": at(first_at_risk[i]),
+            "first_critical": at(first_critical[i]),
+            "critical_hours": int(critical_hours[i]),
+        }
+        for i in order.tolist()
+    ]
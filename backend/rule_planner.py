@@ -0,0 +1,109 @@
+"""
+Deterministic rule-based mitigation planner.
+
+Maps each RiskResult to one of the four flexibility services by asset type
+and event, with urgency and a target time derived from the risk level and the
+scenario start. No network or API key is needed, so it is the offline
+fallback (and hedge) for the Gemini planner in agent_service.py.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any
+
+from weather import parse_start_date
+
+# Risk level -> (urgency, hours before the event starts to act)
+LEVEL_POLICY = {
+    "CRITICAL": ("high", 2),
+    "HIGH": ("high", 1),
+    "MEDIUM": ("medium", 0),
+}
+# LOW risks are monitored, not dispatched
+
+# (asset type, event type) -> action_type; "*" matches any event
+ACTION_RULES = {
+    ("substation", "heatwave"): "shift_hvac_load",
+    ("substation", "flood"): "deploy_mobile_generator",
+    ("ev_hub", "*"): "reduce_ev_load",
+    ("solar_farm", "heatwave"): "dispatch_battery_discharge",
+    ("solar_farm", "flood"): "deploy_mobile_generator",
+}
+DEFAULT_ACTION = "dispatch_battery_discharge"
+
+# Extra action for CRITICAL heat stress on a substation: cut the peak, not just shift it
+CRITICAL_EXTRA = {
+    ("substation", "heatwave"): "dispatch_battery_discharge",
+}
+
+JUSTIFICATIONS = {
+    "shift_hvac_load": "Shift HVAC demand out of the peak to relieve projected thermal overload",
+    "dispatch_battery_discharge": "Discharge aggregated VPP batteries for peak shaving and local supply",
+    "reduce_ev_load": "Curtail or defer EV charging to keep the hub within rated capacity",
+    "deploy_mobile_generator": "Stage a mobile generator to maintain supply if the asset trips or is isolated",
+}
+
+
+def action_for(asset_type: str, event_type: str) -> str:
+    return ACTION_RULES.get((asset_type, event_type)) or ACTION_RULES.get((asset_type, "*")) or DEFAULT_ACTION
+
+
+def plan_mitigation(scenario: Any, risks: List[Any], assets: List[Any]) -> Dict[str, Any]:
+    """
+    Build a mitigation plan (AgentMitigationResponse shape) from rules alone.
+
+    Args:
+        scenario: ScenarioRequest
+        risks: RiskResult list
+        assets: Asset list (used for asset types; unknown assets get the default action)
+
+    Returns:
+        {"summary_text": str, "mitigation_actions": [dict, ...]}, most urgent first
+    """
+    types = {a.id: a.type for a in assets}
+    try:
+        start = parse_start_date(scenario.start_date)
+    except ValueError:
+        # Not ISO 8601: time the actions from the current hour rather than fail
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    actions: List[Dict[str, Any]] = []
+    seen = set()
+    counts = {level: 0 for level in LEVEL_POLICY}
+    for risk in risks:
+        policy = LEVEL_POLICY.get(risk.risk_level)
+        if policy is None:
+            continue
+        urgency, lead_hours = policy
+        counts[risk.risk_level] += 1
+        key = (types.get(risk.asset_id, ""), scenario.event_type)
+        action_types = [action_for(*key)]
+        extra = CRITICAL_EXTRA.get(key) if risk.risk_level == "CRITICAL" else None
+        if extra and extra not in action_types:
+            action_types.append(extra)
+
+        target_time = (start - timedelta(hours=lead_hours)).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        for action_type in action_types:
+            if (risk.asset_id, action_type) in seen:
+                continue
+            seen.add((risk.asset_id, action_type))
+            actions.append({
+                "asset_id": risk.asset_id,
+                "action_type": action_type,
+                "urgency": urgency,
+                "justification": f"{JUSTIFICATIONS[action_type]} ({risk.risk_level}: {risk.reason})",
+                "target_time": target_time,
+            })
+
+    actions.sort(key=lambda a: (a["target_time"], a["urgency"] != "high"))
+    return {"summary_text": _summary(scenario, counts, len(actions)), "mitigation_actions": actions}
+
+
+def _summary(scenario: Any, counts: Dict[str, int], n_actions: int) -> str:
+    if not n_actions:
+        return f"No medium or higher grid risks for the {scenario.event_type} in {scenario.location}; assets remain under monitoring."
+    at_risk = ", ".join(f"{n} {level.lower()}" for level, n in counts.items() if n)
+    return (
+        f"Rule-based flexibility plan for the {scenario.event_type} in {scenario.location}: "
+        f"{n_actions} actions covering {at_risk} risk assets, prioritising demand-side flexibility "
+        f"before the event begins."
+    )
@@ -0,0 +1,146 @@
+"""
+Spatial index over asset locations - regional filtering and weather-cell lookup.
+
+Assets are bucketed into a uniform lat/lon grid and stored sorted by cell id
+(CSR layout: one `offsets` entry per cell). A bounding-box query touches one
+contiguous slice per grid row, so regional queries stay cheap on very large fleets.
+"""
+
+from typing import List, Dict, Any, Tuple, Optional
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Named regions as (min_lat, min_lon, max_lat, max_lon)
+REGIONS: Dict[str, Tuple[float, float, float, float]] = {
+    "london": (51.28, -0.51, 51.70, 0.34),
+    "manchester": (53.34, -2.42, 53.57, -2.09),
+    "birmingham": (52.38, -2.03, 52.61, -1.72),
+}
+
+TARGET_ASSETS_PER_CELL = 16
+
+
+def get_region(location: str) -> Optional[Tuple[float, float, float, float]]:
+    """Look up a named region's bounding box (case-insensitive)."""
+    return REGIONS.get(location.strip().lower()) if location else None
+
+
+def haversine_km(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+    """Great-circle distance in km; arguments may be scalars or arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class SpatialIndex:
+    """
+    Uniform-grid index over asset positions.
+
+    Query methods return positions into the asset list the index was built
+    from (sorted ascending), so callers can slice an AssetTable or list with them.
+    """
+
+    __slots__ = ("lat", "lon", "min_lat", "min_lon", "cell_size", "n_rows", "n_cols", "order", "offsets")
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, cell_size: Optional[float] = None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        n = len(self.lat)
+
+        if n:
+            self.min_lat, max_lat = float(self.lat.min()), float(self.lat.max())
+            self.min_lon, max_lon = float(self.lon.min()), float(self.lon.max())
+        else:
+            self.min_lat = max_lat = self.min_lon = max_lon = 0.0
+
+        if cell_size is None:
+            # Aim for TARGET_ASSETS_PER_CELL on average over the data extent
+            extent = max(max_lat - self.min_lat, max_lon - self.min_lon, 1e-6)
+            cells_per_side = max(1, int(np.sqrt(max(n, 1) / TARGET_ASSETS_PER_CELL)))
+            cell_size = extent / cells_per_side
+        self.cell_size = float(cell_size)
+        self.n_rows = int((max_lat - self.min_lat) // self.cell_size) + 1
+        self.n_cols = int((max_lon - self.min_lon) // self.cell_size) + 1
+
+        rows, cols = self._cells(self.lat, self.lon)
+        cell_ids = rows * self.n_cols + cols
+        self.order = np.argsort(cell_ids, kind="stable").astype(np.int64)
+        counts = np.bincount(cell_ids, minlength=self.n_rows * self.n_cols)
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    @classmethod
+    def from_assets(cls, assets: List[Dict[str, Any]], cell_size: Optional[float] = None) -> "SpatialIndex":
+        """Build an index from asset dictionaries with `lat` / `lon` keys."""
+        lat = np.fromiter((a["lat"] for a in assets), dtype=np.float64, count=len(assets))
+        lon = np.fromiter((a["lon"] for a in assets), dtype=np.float64, count=len(assets))
+        return cls(lat, lon, cell_size)
+
+    @classmethod
+    def from_layout(cls, lat: np.ndarray, lon: np.ndarray, order: np.ndarray, offsets: np.ndarray,
+                    min_lat: float, min_lon: float, cell_size: float, n_rows: int, n_cols: int) -> "SpatialIndex":
+        """Rebuild an index from a previously computed layout (e.g. memory-mapped arrays)."""
+        index = cls.__new__(cls)
+        index.lat, index.lon = lat, lon
+        index.order, index.offsets = order, offsets
+        index.min_lat, index.min_lon, index.cell_size = min_lat, min_lon, cell_size
+        index.n_rows, index.n_cols = n_rows, n_cols
+        return index
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def _cells(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.clip(((lat - self.min_lat) // self.cell_size).astype(np.int64), 0, self.n_rows - 1)
+        cols = np.clip(((lon - self.min_lon) // self.cell_size).astype(np.int64), 0, self.n_cols - 1)
+        return rows, cols
+
+    def query_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Positions of assets inside the bounding box (inclusive)."""
+        if len(self) == 0 or min_lat > max_lat or min_lon > max_lon:
+            return np.empty(0, dtype=np.int64)
+
+        (r0, r1), (c0, c1) = self._cells(np.array([min_lat, max_lat]), np.array([min_lon, max_lon]))
+        # Each grid row contributes one contiguous slice of the sorted order
+        first = np.arange(r0, r1 + 1) * self.n_cols
+        starts = self.offsets[first + c0]
+        stops = self.offsets[first + c1 + 1]
+        candidates = np.concatenate([self.order[s:e] for s, e in zip(starts, stops)]) if len(starts) else self.order[:0]
+
+        lat = self.lat[candidates]
+        lon = self.lon[candidates]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return np.sort(candidates[inside])
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Positions of assets within radius_km of (lat, lon)."""
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        candidates = self.query_bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        near = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates]) <= radius_km
+        return candidates[near]
+
+    def query_region(self, location: str) -> Optional[np.ndarray]:
+        """Positions of assets inside a named region, or None if the region is unknown."""
+        bbox = get_region(location)
+        if bbox is None:
+            return None
+        return self.query_bbox(*bbox)
+
+    def weather_cells(self, origin_lat: float, origin_lon: float,
+                      lat_step: float, lon_step: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bulk-map every asset to its cell in a regular weather grid.
+
+        Args:
+            origin_lat, origin_lon: Coordinates of grid cell (0, 0)
+            lat_step, lon_step: Grid spacing in degrees (lat_step may be negative
+                for north-up grids)
+
+        Returns:
+            (row, col) integer arrays, one entry per asset
+        """
+        rows = np.floor((self.lat - origin_lat) / lat_step).astype(np.int64)
+        cols = np.floor((self.lon - origin_lon) / lon_step).astype(np.int64)
+        return rows, cols
@@ -0,0 +1,74 @@
+"""Round trips through the columnar layout must reproduce assets.json exactly."""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from asset_columns import ColumnarAssets, write_columns
+from asset_store import AssetStore, AssetSnapshot
+from risk_engine import AssetTable
+
+ASSETS_FILE = Path(__file__).resolve().parents[2] / "data" / "assets.json"
+
+# Nulls, mixed types per column, empty lists / objects, missing keys and varying key order
+ODD_ASSETS = [
+    {"id": "A", "type": "substation", "lat": 51.5, "lon": -0.1, "feeds": "Zone A", "capacity_kw": 5000},
+    {"id": None, "type": "ev_hub", "lat": 51, "lon": 0, "feeds": None, "capacity_kw": 2.5},
+    {"lon": 0.2, "lat": 52.25, "id": 7, "feeds": ["Zone B", "Zone C"], "tags": []},
+    {"id": "D", "lat": -33.9, "lon": 151.2, "feeds": "", "tags": {}, "flood_zone": True, "capacity_kw": None},
+    {"id": "E", "lat": 0.0, "lon": 0.0, "big": 2 ** 70, "tags": [1, "two", None], "note": "naïve ✓"},
+]
+
+
+def round_trip(assets, tmp_path):
+    directory = tmp_path / "assets.columns"
+    write_columns(assets, directory)
+    return ColumnarAssets(directory)
+
+
+def assert_same_json(columns, assets):
+    # Compare serialized forms so int/float and key order differences fail too
+    assert json.dumps(list(columns)) == json.dumps(assets)
+
+
+def test_assets_file_round_trip(tmp_path):
+    with open(ASSETS_FILE) as f:
+        assets = json.load(f)
+    assert_same_json(round_trip(assets, tmp_path), assets)
+
+
+def test_odd_values_round_trip(tmp_path):
+    assert_same_json(round_trip(ODD_ASSETS, tmp_path), ODD_ASSETS)
+
+
+def test_empty_round_trip(tmp_path):
+    assert list(round_trip([], tmp_path)) == []
+
+
+def test_table_and_index_match_json_snapshot(tmp_path):
+    columns = round_trip(ODD_ASSETS, tmp_path)
+    mapped = AssetSnapshot.from_columns(columns)
+    parsed = AssetSnapshot(ODD_ASSETS)
+    assert list(mapped.table.ids) == [str(v) if v is not None else None for v in parsed.table.ids]
+    assert list(mapped.table.feeds) == [str(v) for v in parsed.table.feeds]
+    for field in ("type_code", "criticality_code", "flood_zone", "capacity_kw"):
+        np.testing.assert_array_equal(getattr(mapped.table, field), getattr(parsed.table, field))
+    np.testing.assert_array_equal(mapped.index.lat, parsed.index.lat)
+    np.testing.assert_array_equal(mapped.index.lon, parsed.index.lon)
+    assert mapped.select("London").tolist() == parsed.select("London").tolist()
+
+
+def test_store_falls_back_to_json_on_bad_layout(tmp_path):
+    assets_file = tmp_path / "assets.json"
+    assets_file.write_text(json.dumps(ODD_ASSETS))
+    (tmp_path / "scenarios.json").write_text("{}")
+    write_columns(ODD_ASSETS, tmp_path / "assets.columns", source=assets_file)
+    store = AssetStore(assets_file, tmp_path / "scenarios.json")
+    assert isinstance(store.snapshot().records, ColumnarAssets)
+
+    # Corrupt a column, and touch the manifest so the store reloads the layout
+    (tmp_path / "assets.columns" / "table.ids.offsets.npy").write_bytes(b"not numpy")
+    manifest = tmp_path / "assets.columns" / "manifest.json"
+    manifest.write_text(manifest.read_text() + "\n")
+    assert store.snapshot().records == ODD_ASSETS
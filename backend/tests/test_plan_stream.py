@@ -0,0 +1,82 @@
+"""PlanStreamParser must report what json.loads sees, however the stream is chunked."""
+
+import json
+import random
+
+import pytest
+
+from plan_stream import PlanStreamParser
+
+PLAN = {
+    "mitigation_actions": [
+        {
+            "action_type": "dispatch_battery_discharge",
+            "target_asset_id": "SUB_001",
+            "description": 'Discharge {"brace"} and [bracket] text, a \\ backslash, "quotes" and a tab\t.',
+            "parameters": {"power_kw": 500, "window": {"start": "16:00", "end": "20:00"}, "zones": ["A", "B"]},
+        },
+        {"action_type": "reduce_ev_load", "target_asset_id": "EV_002", "description": "Curtail to 50% – café \U0001F50B"},
+        {"action_type": "shift_hvac_load", "target_asset_id": "SUB_003", "description": "", "parameters": {}},
+    ],
+    "summary_text": 'Three actions; "mitigation_actions": [{}] inside a string must not count.\nSecond line.',
+}
+
+DOCUMENTS = [
+    json.dumps(PLAN),
+    json.dumps(PLAN, indent=2, ensure_ascii=False),
+    "```json\n" + json.dumps({"summary_text": PLAN["summary_text"], **PLAN}, indent=1) + "\n```",
+    json.dumps({"note": {"mitigation_actions": [{"decoy": True}]}, **PLAN}),
+]
+
+
+def parse(chunks):
+    parser = PlanStreamParser()
+    actions, summaries = [], []
+    for chunk in chunks:
+        for kind, value in parser.feed(chunk):
+            (actions if kind == "action" else summaries).append(value)
+    parser.close()
+    return actions, summaries
+
+
+def expected(document):
+    plan = json.loads(document[document.index("{"):document.rindex("}") + 1])
+    return plan["mitigation_actions"], [plan["summary_text"]]
+
+
+def split_at(document, cuts):
+    bounds = [0, *sorted(cuts), len(document)]
+    return [document[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_whole_document(document):
+    assert parse([document]) == expected(document)
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_every_two_way_split(document):
+    # Covers splits inside strings, between a backslash and what it escapes, and inside nested objects
+    for cut in range(len(document) + 1):
+        assert parse(split_at(document, [cut])) == expected(document), cut
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_one_character_chunks(document):
+    assert parse(list(document)) == expected(document)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_splits(seed):
+    rng = random.Random(seed)
+    document = DOCUMENTS[seed % len(DOCUMENTS)]
+    cuts = rng.sample(range(1, len(document)), rng.randint(1, 40))
+    assert parse(split_at(document, cuts)) == expected(document)
+
+
+def test_incomplete_document_raises():
+    document = json.dumps(PLAN)
+    with pytest.raises(ValueError):
+        parse([document[:-1]])
+    with pytest.raises(ValueError):
+        parse([json.dumps({"mitigation_actions": PLAN["mitigation_actions"]})])
@@ -0,0 +1,65 @@
+"""The columnar engine must match simulate_risk_reference result for result."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from risk_engine import AssetTable, simulate_risk_columnar, simulate_risk_reference
+
+ASSETS_FILE = Path(__file__).resolve().parents[2] / "data" / "assets.json"
+
+# Values on and either side of every rule threshold
+HEATWAVES = [
+    {"max_temp_celsius": t, "duration_hours": h}
+    for t in (34.9, 35, 35.5, 36, 36.5, 37, 40) for h in (24, 47, 48, 72)
+] + [{}]
+FLOODS = [
+    {"total_rainfall_mm": total, "max_rainfall_per_hour_mm": peak}
+    for total in (39, 40, 49, 50, 59, 60, 79, 80, 120) for peak in (9, 10, 14, 15, 30)
+] + [{}]
+WEATHERS = [("heatwave", w) for w in HEATWAVES] + [("flood", w) for w in FLOODS]
+
+# Assets lacking optional keys, with falsy feeds, unknown types and criticalities
+EDGE_ASSETS = [
+    {"id": "SUB_BARE", "type": "substation"},
+    {"id": "SUB_CRIT", "type": "substation", "criticality": "high", "feeds": "Zone A"},
+    {"id": "SUB_EMPTY_FEEDS", "type": "substation", "criticality": "medium", "feeds": ""},
+    {"id": "SUB_NULL_FEEDS", "type": "substation", "feeds": None, "flood_zone": True},
+    {"id": "EV_ZONE", "type": "ev_hub", "flood_zone": True, "criticality": "low"},
+    {"id": "EV_BARE", "type": "ev_hub"},
+    {"id": "PV", "type": "solar_farm", "feeds": "Grid Export"},
+    {"id": "PV_ZONE", "type": "solar_farm", "flood_zone": True},
+    {"id": "OTHER", "type": "battery", "criticality": "unknown", "flood_zone": True},
+    {"id": "UNTYPED"},
+]
+
+
+def load_assets():
+    with open(ASSETS_FILE) as f:
+        return json.load(f)
+
+
+def assert_same(event_type, weather, assets):
+    expected = simulate_risk_reference(event_type, weather, assets)
+    assert simulate_risk_columnar(event_type, weather, AssetTable.from_assets(assets)) == expected
+
+
+@pytest.mark.parametrize("event_type,weather", WEATHERS)
+def test_matches_reference_on_assets_file(event_type, weather):
+    assert_same(event_type, weather, load_assets())
+
+
+@pytest.mark.parametrize("event_type,weather", WEATHERS)
+def test_matches_reference_on_edge_assets(event_type, weather):
+    assert_same(event_type, weather, EDGE_ASSETS)
+
+
+@pytest.mark.parametrize("event_type,weather", WEATHERS)
+def test_empty_table(event_type, weather):
+    assert simulate_risk_reference(event_type, weather, []) == []
+    assert simulate_risk_columnar(event_type, weather, AssetTable.from_assets([])) == []
+
+
+def test_unknown_event_type():
+    assert_same("earthquake", {"max_temp_celsius": 40}, load_assets())
@@ -0,0 +1,481 @@
+"""
+Bounded store for BAP transaction state.
+
+Each Beckn transaction is one compact TransactionRecord. Finished transactions
+(confirmed, failed or closed) expire BECKN_TX_COMPLETED_TTL_S after their last
+update, unfinished ones BECKN_TX_STALE_TTL_S after it, and the store never holds
+more than BECKN_TX_MAX entries (least recently updated evicted first). A
+background sweeper started from the FastAPI lifespan removes expired entries
+even when no new transactions arrive.
+
+With BECKN_TX_DB set, state lives in a shared SQLite file (WAL mode) so that
+`uvicorn --workers N` works: a callback may land on any worker. Each row
+records the Unix datagram socket of the worker that started the transaction,
+and whichever worker applies an update sends it a one-line notification there,
+waking the waiting flow without polling.
+
+A search broadcast to several BPPs gets one on_search per BPP; add_response
+merges each into the record's `responses` (keyed by bpp_id) in one atomic
+update, so concurrent callbacks on different workers never overwrite each other.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import AbstractSet, Dict, Any, Callable, Optional
+
+from beckn_models import Context, OnSearchRequest, Quote, Order
+
+BECKN_TX_COMPLETED_TTL_S = float(os.getenv("BECKN_TX_COMPLETED_TTL_S", "300"))
+BECKN_TX_STALE_TTL_S = float(os.getenv("BECKN_TX_STALE_TTL_S", "900"))
+BECKN_TX_MAX = int(os.getenv("BECKN_TX_MAX", "10000"))
+BECKN_TX_SWEEP_S = float(os.getenv("BECKN_TX_SWEEP_S", "30"))
+# Shared SQLite file for multi-worker deployments; empty keeps state in-process
+BECKN_TX_DB = os.getenv("BECKN_TX_DB", "")
+
+TERMINAL_STATUSES = frozenset({"CONFIRM_COMPLETED", "FAILED", "CLOSED"})
+
+
+class TransactionRecord:
+    """State of one transaction; payload fields hold the parsed Beckn objects."""
+
+    __slots__ = ("transaction_id", "status", "updated", "context", "responses", "quote", "order", "confirmed_order")
+
+    FIELDS = ("context", "quote", "order", "confirmed_order")
+
+    def __init__(self, transaction_id: str, status: str):
+        self.transaction_id = transaction_id
+        self.status = status
+        self.updated = time.monotonic()
+        self.context = None  # Context of the latest callback
+        self.responses: Dict[str, OnSearchRequest] = {}  # bpp_id -> on_search
+        self.quote = None
+        self.order = None
+        self.confirmed_order = None
+
+    def apply(self, status: str, fields: Dict[str, Any]) -> None:
+        for name, value in fields.items():
+            if name not in self.FIELDS:
+                raise AttributeError(f"TransactionRecord has no field {name!r}")
+            setattr(self, name, value)
+        self.status = status
+        self.updated = time.monotonic()
+
+    def add_response(self, status: str, bpp_id: str, response: OnSearchRequest) -> None:
+        self.responses[bpp_id] = response
+        if self.status not in TERMINAL_STATUSES:
+            self.status = status
+        self.updated = time.monotonic()
+
+
+class TransactionStore(ABC):
+    """Interface for transaction state backends; methods are awaited on the event loop."""
+
+    @abstractmethod
+    async def start(self, transaction_id: str, status: str, **fields: Any) -> None:
+        """Record a new transaction (replacing any with the same id)."""
+
+    @abstractmethod
+    async def update(self, transaction_id: str, status: str, **fields: Any) -> bool:
+        """Apply a state change to a known transaction; False if it is unknown (or already evicted)."""
+
+    @abstractmethod
+    async def add_response(self, transaction_id: str, status: str, bpp_id: str, response: OnSearchRequest) -> bool:
+        """
+        Store one BPP's on_search next to those of other BPPs; False if the transaction is unknown.
+        A finished transaction keeps its status (late responses do not reopen it).
+        """
+
+    @abstractmethod
+    async def get(self, transaction_id: str) -> Optional[TransactionRecord]:
+        """The transaction's record, or None if it is unknown or expired."""
+
+    @abstractmethod
+    async def new_responses(self, transaction_id: str, seen: AbstractSet[str]) -> Optional[Dict[str, OnSearchRequest]]:
+        """On_search responses of BPPs not in `seen` (keys as in record.responses); None if the transaction is unknown."""
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Remove expired transactions; returns how many were removed."""
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        """Counters and settings for /beckn/transactions."""
+
+    def listen(self, on_change: Callable[[str, str], None]) -> None:
+        """Call on_change(transaction_id, status) for updates applied by other processes."""
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryTransactionStore(TransactionStore):
+    """Per-process store, ordered by last update."""
+
+    def __init__(self, completed_ttl_s: float = BECKN_TX_COMPLETED_TTL_S,
+                 stale_ttl_s: float = BECKN_TX_STALE_TTL_S, max_entries: int = BECKN_TX_MAX):
+        self.completed_ttl_s = completed_ttl_s
+        self.stale_ttl_s = stale_ttl_s
+        self.max_entries = max_entries
+        self._records: "OrderedDict[str, TransactionRecord]" = OrderedDict()
+        self.started = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    async def start(self, transaction_id: str, status: str, **fields: Any) -> None:
+        record = TransactionRecord(transaction_id, status)
+        record.apply(status, fields)
+        self._records.pop(transaction_id, None)
+        self._records[transaction_id] = record
+        self.started += 1
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+            self.evicted += 1
+
+    async def update(self, transaction_id: str, status: str, **fields: Any) -> bool:
+        record = await self.get(transaction_id)
+        if record is None:
+            return False
+        record.apply(status, fields)
+        self._records.move_to_end(transaction_id)
+        return True
+
+    async def add_response(self, transaction_id: str, status: str, bpp_id: str, response: OnSearchRequest) -> bool:
+        record = await self.get(transaction_id)
+        if record is None:
+            return False
+        record.add_response(status, bpp_id, response)
+        self._records.move_to_end(transaction_id)
+        return True
+
+    def _expired(self, record: TransactionRecord, now: float) -> bool:
+        ttl = self.completed_ttl_s if record.status in TERMINAL_STATUSES else self.stale_ttl_s
+        return now - record.updated > ttl
+
+    async def get(self, transaction_id: str) -> Optional[TransactionRecord]:
+        record = self._records.get(transaction_id)
+        if record is not None and self._expired(record, time.monotonic()):
+            del self._records[transaction_id]
+            self.expired += 1
+            return None
+        return record
+
+    async def new_responses(self, transaction_id: str, seen: AbstractSet[str]) -> Optional[Dict[str, OnSearchRequest]]:
+        record = await self.get(transaction_id)
+        if record is None:
+            return None
+        return {bpp_id: response for bpp_id, response in record.responses.items() if bpp_id not in seen}
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        horizon = min(self.completed_ttl_s, self.stale_ttl_s)
+        removed = []
+        # Oldest first; nothing updated within the shorter TTL can have expired
+        for transaction_id, record in self._records.items():
+            if now - record.updated <= horizon:
+                break
+            if self._expired(record, now):
+                removed.append(transaction_id)
+        for transaction_id in removed:
+            del self._records[transaction_id]
+        self.expired += len(removed)
+        return len(removed)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "live": len(self._records),
+            "started": self.started,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "max_entries": self.max_entries,
+            "completed_ttl_s": self.completed_ttl_s,
+            "stale_ttl_s": self.stale_ttl_s,
+        }
+
+
+# Payload columns and the models they are parsed back into
+PAYLOAD_MODELS = {"context": Context, "quote": Quote, "order": Order, "confirmed_order": Order}
+
+# SQLite schema; columns missing from an existing file are added on open
+COLUMNS = {
+    "transaction_id": "TEXT PRIMARY KEY", "status": "TEXT NOT NULL", "updated": "REAL NOT NULL", "owner": "TEXT",
+    "context": "TEXT", "responses": "TEXT", "quote": "TEXT", "order": "TEXT", "confirmed_order": "TEXT",
+}
+
+
+class _Notifier:
+    """Unix datagram socket that receives tab-separated (transaction_id, status) messages for this process."""
+
+    def __init__(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.address = str(directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.address)
+        self._sock.setblocking(False)
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send_sock.setblocking(False)
+
+    def listen(self, loop: asyncio.AbstractEventLoop, on_change: Callable[[str, str], None]) -> None:
+        def readable():
+            while True:
+                try:
+                    data = self._sock.recv(1024)
+                except (BlockingIOError, InterruptedError):
+                    return
+                transaction_id, _, status = data.decode().partition("\t")
+                on_change(transaction_id, status)
+        loop.add_reader(self._sock.fileno(), readable)
+
+    def send(self, address: str, transaction_id: str, status: str) -> None:
+        try:
+            self._send_sock.sendto(f"{transaction_id}\t{status}".encode(), address)
+        except OSError:
+            # Owner gone (or its queue is full); its waiter times out as before
+            pass
+
+    def close(self) -> None:
+        try:
+            asyncio.get_event_loop().remove_reader(self._sock.fileno())
+        except Exception:
+            pass
+        self._sock.close()
+        self._send_sock.close()
+        try:
+            os.unlink(self.address)
+        except OSError:
+            pass
+
+
+class SqliteTransactionStore(TransactionStore):
+    """
+    Store shared by all worker processes through one SQLite file in WAL mode.
+
+    Expiry uses wall-clock time since records are shared between processes.
+    started/evicted/expired counters are per process; "live" is the shared count.
+    Queries may wait on another worker's write lock, so they run in a thread
+    (asyncio.to_thread) rather than on the event loop.
+    """
+
+    def __init__(self, path: Path, completed_ttl_s: float = BECKN_TX_COMPLETED_TTL_S,
+                 stale_ttl_s: float = BECKN_TX_STALE_TTL_S, max_entries: int = BECKN_TX_MAX):
+        self.path = Path(path)
+        self.completed_ttl_s = completed_ttl_s
+        self.stale_ttl_s = stale_ttl_s
+        self.max_entries = max_entries
+        self.started = 0
+        self.evicted = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f'"{name}" {kind}' for name, kind in COLUMNS.items())
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS transactions ({columns})")
+        # Files created by older versions lack the newer payload columns
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(transactions)")}
+        for name, kind in COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f'ALTER TABLE transactions ADD COLUMN "{name}" {kind}')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS transactions_updated ON transactions (updated)")
+        self._conn.commit()
+        # Socket paths are limited to ~100 bytes, so keep them short and local
+        notify_dir = Path(tempfile.gettempdir()) / f"beckn-tx-{hashlib.sha1(str(self.path.resolve()).encode()).hexdigest()[:8]}"
+        self._notifier = _Notifier(notify_dir)
+
+    def _expiry_clause(self) -> str:
+        terminal = ",".join(f"'{s}'" for s in sorted(TERMINAL_STATUSES))
+        return (f"((status IN ({terminal}) AND updated < :now - {self.completed_ttl_s})"
+                f" OR (status NOT IN ({terminal}) AND updated < :now - {self.stale_ttl_s}))")
+
+    @staticmethod
+    def _dump(fields: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        for name in fields:
+            if name not in PAYLOAD_MODELS:
+                raise AttributeError(f"TransactionRecord has no field {name!r}")
+        return {name: value.model_dump_json() if hasattr(value, "model_dump_json") else json.dumps(value)
+                for name, value in fields.items()}
+
+    async def start(self, transaction_id: str, status: str, **fields: Any) -> None:
+        await asyncio.to_thread(self._start, transaction_id, status, **fields)
+
+    async def update(self, transaction_id: str, status: str, **fields: Any) -> bool:
+        return await asyncio.to_thread(self._update, transaction_id, status, **fields)
+
+    async def add_response(self, transaction_id: str, status: str, bpp_id: str, response: OnSearchRequest) -> bool:
+        return await asyncio.to_thread(self._add_response, transaction_id, status, bpp_id, response)
+
+    async def get(self, transaction_id: str) -> Optional[TransactionRecord]:
+        return await asyncio.to_thread(self._get, transaction_id)
+
+    async def new_responses(self, transaction_id: str, seen: AbstractSet[str]) -> Optional[Dict[str, OnSearchRequest]]:
+        return await asyncio.to_thread(self._new_responses, transaction_id, frozenset(seen))
+
+    async def sweep(self) -> int:
+        return await asyncio.to_thread(self._sweep)
+
+    async def stats(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._stats)
+
+    def _start(self, transaction_id: str, status: str, **fields: Any) -> None:
+        payload = self._dump(fields)
+        row = {"transaction_id": transaction_id, "status": status, "updated": time.time(),
+               "owner": self._notifier.address, **{name: payload.get(name) for name in PAYLOAD_MODELS}}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transactions (transaction_id, status, updated, owner,"
+                " context, quote, \"order\", confirmed_order) VALUES (:transaction_id, :status, :updated,"
+                " :owner, :context, :quote, :order, :confirmed_order)", row
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM transactions WHERE transaction_id IN"
+                    " (SELECT transaction_id FROM transactions ORDER BY updated LIMIT ?)", (excess,)
+                )
+                self.evicted += excess
+            self._conn.commit()
+        self.started += 1
+
+    def _update(self, transaction_id: str, status: str, **fields: Any) -> bool:
+        payload = self._dump(fields)
+        assignments = "".join(f", \"{name}\" = :{name}" for name in payload)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE transactions SET status = :status, updated = :updated{assignments}"
+                f" WHERE transaction_id = :transaction_id AND NOT {self._expiry_clause()}"
+                f" RETURNING owner",
+                {"transaction_id": transaction_id, "status": status, "updated": time.time(),
+                 "now": time.time(), **payload}
+            )
+            row = cursor.fetchone()
+            self._conn.commit()
+        return self._notify_owner(row, transaction_id, status)
+
+    def _add_response(self, transaction_id: str, status: str, bpp_id: str, response: OnSearchRequest) -> bool:
+        terminal = ",".join(f"'{s}'" for s in sorted(TERMINAL_STATUSES))
+        # JSON paths cannot escape quotes; subscriber ids never contain them in practice
+        key = bpp_id.replace('"', "'")
+        with self._lock:
+            # json_set merges in the same statement, so concurrent callbacks cannot lose each other
+            cursor = self._conn.execute(
+                f"UPDATE transactions SET responses = json_set(COALESCE(responses, '{{}}'), :path, json(:response)),"
+                f" status = CASE WHEN status IN ({terminal}) THEN status ELSE :status END, updated = :updated"
+                f" WHERE transaction_id = :transaction_id AND NOT {self._expiry_clause()}"
+                f" RETURNING owner",
+                {"transaction_id": transaction_id, "status": status, "updated": time.time(), "now": time.time(),
+                 "path": f'$."{key}"', "response": response.model_dump_json()}
+            )
+            row = cursor.fetchone()
+            self._conn.commit()
+        return self._notify_owner(row, transaction_id, status)
+
+    def _notify_owner(self, row: Optional[tuple], transaction_id: str, status: str) -> bool:
+        if row is None:
+            return False
+        if row[0] and row[0] != self._notifier.address:
+            self._notifier.send(row[0], transaction_id, status)
+        return True
+
+    def _get(self, transaction_id: str) -> Optional[TransactionRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, updated, responses, context, quote, \"order\", confirmed_order FROM transactions"
+                " WHERE transaction_id = ?", (transaction_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, updated = row[0], row[1]
+        ttl = self.completed_ttl_s if status in TERMINAL_STATUSES else self.stale_ttl_s
+        if time.time() - updated > ttl:
+            return None
+        record = TransactionRecord(transaction_id, status)
+        if row[2] is not None:
+            record.responses = {bpp_id: OnSearchRequest.model_validate(response)
+                                for bpp_id, response in json.loads(row[2]).items()}
+        for name, raw in zip(PAYLOAD_MODELS, row[3:]):
+            if raw is not None:
+                setattr(record, name, PAYLOAD_MODELS[name].model_validate_json(raw))
+        return record
+
+    def _new_responses(self, transaction_id: str, seen: AbstractSet[str]) -> Optional[Dict[str, OnSearchRequest]]:
+        # Only the unseen responses leave SQLite and get parsed
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT t.status, t.updated, r.key, r.value FROM transactions t"
+                " LEFT JOIN json_each(t.responses) r ON r.key NOT IN (SELECT value FROM json_each(:seen))"
+                " WHERE t.transaction_id = :transaction_id",
+                {"transaction_id": transaction_id, "seen": json.dumps(sorted(seen))}
+            ).fetchall()
+        if not rows:
+            return None
+        status, updated = rows[0][0], rows[0][1]
+        ttl = self.completed_ttl_s if status in TERMINAL_STATUSES else self.stale_ttl_s
+        if time.time() - updated > ttl:
+            return None
+        return {bpp_id: OnSearchRequest.model_validate_json(raw) for _, _, bpp_id, raw in rows if bpp_id is not None}
+
+    def _sweep(self) -> int:
+        with self._lock:
+            removed = self._conn.execute(
+                f"DELETE FROM transactions WHERE {self._expiry_clause()}", {"now": time.time()}
+            ).rowcount
+            self._conn.commit()
+        self.expired += removed
+        return removed
+
+    def _stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": str(self.path),
+            "live": live,
+            "started": self.started,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "max_entries": self.max_entries,
+            "completed_ttl_s": self.completed_ttl_s,
+            "stale_ttl_s": self.stale_ttl_s,
+        }
+
+    def listen(self, on_change: Callable[[str, str], None]) -> None:
+        self._notifier.listen(asyncio.get_running_loop(), on_change)
+
+    def close(self) -> None:
+        self._notifier.close()
+        with self._lock:
+            self._conn.close()
+
+
+def create_transaction_store() -> TransactionStore:
+    """SQLite-backed store when BECKN_TX_DB is set, in-process otherwise."""
+    if BECKN_TX_DB:
+        return SqliteTransactionStore(Path(BECKN_TX_DB))
+    return MemoryTransactionStore()
+
+
+async def sweep_periodically(store: TransactionStore, interval_s: float = BECKN_TX_SWEEP_S) -> None:
+    """Background task: sweep the store every interval_s until cancelled."""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            removed = await store.sweep()
+            if removed:
+                print(f"BAP: Expired {removed} transactions")
+        except Exception as e:
+            print(f"BAP: Transaction sweep failed: {e}")
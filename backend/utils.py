@@ -2,35 +2,33 @@
 Utility functions for data loading, weather API integration, etc.
 """
 
-import json
 from pathlib import Path
 from typing import List, Dict, Any
 
+from asset_store import AssetStore
+
 # Path to data directory (parent of backend directory)
 DATA_DIR = Path(__file__).parent.parent / "data"
 
+# Process-wide cache of the data files (reloads when a file changes on disk)
+ASSET_STORE = AssetStore(DATA_DIR / "assets.json", DATA_DIR / "scenarios.json")
+
 
 def load_assets(location: str = "London") -> List[Dict[str, Any]]:
     """
-    Load DEG assets from JSON file.
-    TODO: Filter by location if needed.
+    Load DEG assets, keeping only those inside `location`.
+    Unknown locations (no entry in spatial_index.REGIONS) return every asset.
+    Rows are shared via ASSET_STORE; treat them as read-only.
     """
-    assets_file = DATA_DIR / "assets.json"
-    with open(assets_file, "r") as f:
-        assets = json.load(f)
-    return assets
+    return ASSET_STORE.assets(location)
 
 
 def load_scenarios() -> Dict[str, Any]:
-    """Load predefined scenarios from JSON file."""
-    scenarios_file = DATA_DIR / "scenarios.json"
-    with open(scenarios_file, "r") as f:
-        scenarios = json.load(f)
-    return scenarios
+    """Load predefined scenarios (cached by ASSET_STORE)."""
+    return ASSET_STORE.scenarios()
 
 
 def get_scenario_by_id(scenario_id: str) -> Dict[str, Any]:
     """Get a specific scenario by ID."""
-    scenarios = load_scenarios()
-    return scenarios.get(scenario_id)
+    return ASSET_STORE.scenario(scenario_id)
 
@@ -3,8 +3,14 @@ Weather data module - mock weather data for scenarios.
 Later can be extended to use Open-Meteo or OpenWeather API.
 """
 
-from typing import Dict, Any
-from datetime import datetime
+import json
+import os
+from typing import Dict, Any, Iterator, Tuple
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from async_cache import AsyncTTLCache
 
 
 def get_mock_weather(scenario: Dict[str, Any], location: str) -> Dict[str, Any]:
@@ -59,3 +65,150 @@ def get_weather_for_scenario(scenario_request: Any) -> Dict[str, Any]:
     }
     return get_mock_weather(scenario_dict, scenario_request.location)
 
+
+
+# ============================================================================
+# Hourly series
+# ============================================================================
+
+def parse_start_date(start_date: str) -> datetime:
+    """Parse an ISO start date ("2025-11-26T00:00:00Z") into an aware datetime."""
+    dt = datetime.fromisoformat(start_date.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class HourlyWeatherSeries:
+    """
+    Hour-by-hour weather over a scenario's duration.
+    
+    `temp_celsius` and `rainfall_mm` have shape (hours,) for a city-wide
+    forecast or (hours, n_assets) when each asset sees its own weather.
+    """
+
+    __slots__ = ("event_type", "start", "temp_celsius", "rainfall_mm")
+
+    def __init__(self, event_type: str, start: datetime, temp_celsius: np.ndarray, rainfall_mm: np.ndarray):
+        self.event_type = event_type
+        self.start = start
+        self.temp_celsius = temp_celsius
+        self.rainfall_mm = rainfall_mm
+
+    def __len__(self) -> int:
+        return len(self.temp_celsius)
+
+    def hours(self) -> Iterator[Tuple[int, datetime, Any, Any]]:
+        """Yield (hour index, timestamp, temperature, rainfall) per hour."""
+        for hour in range(len(self)):
+            yield hour, self.start + timedelta(hours=hour), self.temp_celsius[hour], self.rainfall_mm[hour]
+
+
+def _heatwave_temperature_profile(weather: Dict[str, Any], hours: int) -> np.ndarray:
+    """Diurnal temperature curve peaking at max_temp_celsius around 15:00."""
+    max_temp = weather["max_temp_celsius"]
+    # Heatwave nights stay warm: the peak-to-trough swing is a fraction of the event range
+    swing = (max_temp - weather.get("min_temp_celsius", max_temp)) / 8
+    h = np.arange(hours)
+    return max_temp - swing * (1 - np.cos(2 * np.pi * (h - 15) / 24)) / 2
+
+
+def _flood_rainfall_profile(weather: Dict[str, Any], hours: int) -> np.ndarray:
+    """Triangular storm centred on the event, summing to total_rainfall_mm."""
+    total = weather["total_rainfall_mm"]
+    peak = weather.get("max_rainfall_per_hour_mm") or total
+    if hours <= 0 or total <= 0:
+        return np.zeros(max(hours, 0))
+    half_width = max(total / peak, 0.5)
+    h = np.arange(hours)
+    profile = np.clip(1 - np.abs(h - (hours - 1) / 2) / half_width, 0, None)
+    if profile.sum() == 0:
+        profile[hours // 2] = 1
+    return total * profile / profile.sum()
+
+
+def get_mock_hourly_weather(scenario: Dict[str, Any], location: str) -> HourlyWeatherSeries:
+    """
+    Expand the mock event scalars into an hourly series over duration_hours.
+    
+    Args:
+        scenario: Scenario request with event_type, start_date, duration_hours
+        location: Location string (e.g., "London")
+    
+    Returns:
+        HourlyWeatherSeries with one row per hour
+    """
+    weather = get_mock_weather(scenario, location)
+    event_type = weather["event_type"]
+    hours = int(weather["duration_hours"])
+
+    temp = np.full(hours, weather.get("avg_temp_celsius", 15.0), dtype=np.float64)
+    rain = np.zeros(hours, dtype=np.float64)
+    if event_type == "heatwave":
+        temp = _heatwave_temperature_profile(weather, hours)
+    elif event_type == "flood":
+        rain = _flood_rainfall_profile(weather, hours)
+
+    return HourlyWeatherSeries(event_type, parse_start_date(scenario["start_date"]), temp, rain)
+
+
+def get_hourly_weather_for_scenario(scenario_request: Any) -> HourlyWeatherSeries:
+    """Hourly counterpart of get_weather_for_scenario."""
+    scenario_dict = {
+        "event_type": scenario_request.event_type,
+        "start_date": scenario_request.start_date,
+        "duration_hours": scenario_request.duration_hours
+    }
+    return get_mock_hourly_weather(scenario_dict, scenario_request.location)
+
+
+def get_weather_for_predefined_scenario(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Weather for an entry of scenarios.json.
+    Uses the scenario's own "weather" block when present, else the mock data.
+    """
+    weather = get_mock_weather(scenario, scenario.get("location", "London"))
+    if scenario.get("weather"):
+        weather = {**weather, **scenario["weather"]}
+    return weather
+
+
+# ============================================================================
+# Weather cache
+# ============================================================================
+
+WEATHER_CACHE_TTL_S = float(os.getenv("WEATHER_CACHE_TTL_S", "300"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "1024"))
+WEATHER_CACHE_MAX_BYTES = int(os.getenv("WEATHER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def _approx_size(value: Any) -> int:
+    """Rough in-memory footprint of a cached weather value, for the byte cap."""
+    if isinstance(value, HourlyWeatherSeries):
+        return value.temp_celsius.nbytes + value.rainfall_mm.nbytes
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return len(json.dumps(value, default=str))
+
+
+WEATHER_CACHE = AsyncTTLCache(
+    WEATHER_CACHE_TTL_S, WEATHER_CACHE_MAX_ENTRIES, WEATHER_CACHE_MAX_BYTES, sizeof=_approx_size
+)
+
+
+def weather_cache_key(scenario_request: Any) -> Tuple[str, str, str, int]:
+    return (
+        scenario_request.location.strip().lower(),
+        scenario_request.event_type,
+        scenario_request.start_date,
+        scenario_request.duration_hours,
+    )
+
+
+async def fetch_weather_for_scenario(scenario_request: Any) -> Dict[str, Any]:
+    """
+    Cached, coalesced get_weather_for_scenario.
+    The provider call is the mock today; a real API fetch would be awaited here.
+    """
+    async def fetch() -> Dict[str, Any]:
+        return get_weather_for_scenario(scenario_request)
+
+    return await WEATHER_CACHE.get(weather_cache_key(scenario_request), fetch)
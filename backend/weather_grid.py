@@ -0,0 +1,180 @@
+"""
+Gridded weather fields - memory-mapped time x lat x lon grids on local disk.
+
+A grid directory holds one float32 .npy per variable plus `grid.json`:
+
+    {
+      "start": "2025-11-26T00:00:00Z", "step_hours": 1,
+      "lat0": 51.70, "dlat": -0.05,      # row 0 at lat0, north-up grids use dlat < 0
+      "lon0": -0.55, "dlon": 0.05,
+      "variables": {"temp_celsius": "temp_celsius.npy", "rainfall_mm": "rainfall_mm.npy"}
+    }
+
+Arrays are opened read-only with mmap, and sampling reads only the grid points
+surrounding the requested assets over the requested hours.
+
+Create a synthetic London grid for local testing:
+
+    python weather_grid.py ../data/weather_grid heatwave 2025-11-26T00:00:00Z 168
+"""
+
+import json
+import os
+import sys
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from weather import HourlyWeatherSeries, parse_start_date, get_mock_hourly_weather
+
+GRID_META = "grid.json"
+VARIABLES = ("temp_celsius", "rainfall_mm")
+
+DEFAULT_GRID_DIR = Path(__file__).parent.parent / "data" / "weather_grid"
+WEATHER_GRID_DIR = Path(os.getenv("WEATHER_GRID_DIR", str(DEFAULT_GRID_DIR)))
+
+
+class WeatherGrid:
+    """Read-only, memory-mapped hourly grid of temperature and rainfall."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / GRID_META).read_text())
+        self.start = parse_start_date(meta["start"])
+        self.step_hours = meta.get("step_hours", 1)
+        self.lat0, self.dlat = meta["lat0"], meta["dlat"]
+        self.lon0, self.dlon = meta["lon0"], meta["dlon"]
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.load(self.directory / filename, mmap_mode="r")
+            for name, filename in meta["variables"].items()
+        }
+        self.shape = next(iter(self.arrays.values())).shape  # (time, lat, lon)
+
+    def time_window(self, start_date: str, hours: int) -> Optional[Tuple[int, int]]:
+        """Grid time indices covering [start_date, start_date + hours), or None if not covered."""
+        offset = (parse_start_date(start_date) - self.start).total_seconds() / 3600
+        if offset < 0 or offset % self.step_hours:
+            return None
+        t0 = int(offset // self.step_hours)
+        t1 = t0 + -(-hours // self.step_hours)
+        if t1 > self.shape[0]:
+            return None
+        return t0, t1
+
+    def _corners(self, coord: np.ndarray, origin: float, step: float, size: int):
+        """Lower/upper grid indices and the interpolation weight along one axis."""
+        f = np.clip((np.asarray(coord, dtype=np.float64) - origin) / step, 0, size - 1)
+        i0 = np.floor(f).astype(np.int64)
+        i1 = np.minimum(i0 + 1, size - 1)
+        return i0, i1, f - i0
+
+    def sample(self, variable: str, lat: np.ndarray, lon: np.ndarray, t0: int, t1: int) -> np.ndarray:
+        """
+        Bilinearly interpolate `variable` at every (lat, lon) for hours [t0, t1).
+
+        Points outside the grid take the nearest edge value.
+
+        Returns:
+            float64 array of shape (t1 - t0, len(lat))
+        """
+        data = self.arrays[variable]
+        y0, y1, wy = self._corners(lat, self.lat0, self.dlat, self.shape[1])
+        x0, x1, wx = self._corners(lon, self.lon0, self.dlon, self.shape[2])
+
+        # Fancy indexing on the mapped array only touches the pages holding these points
+        window = data[t0:t1]
+        v00 = window[:, y0, x0]
+        v01 = window[:, y0, x1]
+        v10 = window[:, y1, x0]
+        v11 = window[:, y1, x1]
+        return (v00 * (1 - wy) * (1 - wx) + v01 * (1 - wy) * wx
+                + v10 * wy * (1 - wx) + v11 * wy * wx).astype(np.float64)
+
+    def hourly_series(self, event_type: str, start_date: str, hours: int,
+                      lat: np.ndarray, lon: np.ndarray) -> Optional[HourlyWeatherSeries]:
+        """Per-asset hourly series (shape (hours, assets)), or None if the grid does not cover the window."""
+        window = self.time_window(start_date, hours)
+        if window is None:
+            return None
+        t0, t1 = window
+        series = {name: self.sample(name, lat, lon, t0, t1) for name in VARIABLES}
+        if self.step_hours > 1:
+            series = {name: np.repeat(values, self.step_hours, axis=0)[:hours] for name, values in series.items()}
+        return HourlyWeatherSeries(
+            event_type, parse_start_date(start_date), series["temp_celsius"], series["rainfall_mm"]
+        )
+
+
+_GRID: Optional[WeatherGrid] = None
+
+
+def get_weather_grid() -> Optional[WeatherGrid]:
+    """The configured grid (WEATHER_GRID_DIR), opened once; None if there is none on disk."""
+    global _GRID
+    if _GRID is None and (WEATHER_GRID_DIR / GRID_META).exists():
+        _GRID = WeatherGrid(WEATHER_GRID_DIR)
+    return _GRID
+
+
+def get_gridded_hourly_weather(scenario_request: Any, lat: np.ndarray, lon: np.ndarray) -> Optional[HourlyWeatherSeries]:
+    """
+    Hourly weather sampled at each asset's location.
+    Returns None when no grid is configured or it does not cover the scenario window.
+    """
+    grid = get_weather_grid()
+    if grid is None:
+        return None
+    return grid.hourly_series(
+        scenario_request.event_type, scenario_request.start_date, scenario_request.duration_hours, lat, lon
+    )
+
+
+def write_grid(directory: Path, start_date: str, lat0: float, dlat: float, lon0: float, dlon: float,
+               variables: Dict[str, np.ndarray], step_hours: int = 1) -> None:
+    """Write (time, lat, lon) arrays in the grid layout read by WeatherGrid."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, values in variables.items():
+        np.save(directory / f"{name}.npy", np.asarray(values, dtype=np.float32))
+    meta = {
+        "start": start_date, "step_hours": step_hours,
+        "lat0": lat0, "dlat": dlat, "lon0": lon0, "dlon": dlon,
+        "variables": {name: f"{name}.npy" for name in variables},
+    }
+    # Metadata last, so a reader never sees a grid.json pointing at missing arrays
+    (directory / GRID_META).write_text(json.dumps(meta, indent=2))
+
+
+def synthesize_london_grid(directory: Path, event_type: str, start_date: str, hours: int,
+                           resolution: float = 0.05) -> None:
+    """Demo grid: the mock hourly event plus an urban heat island and a storm cell drifting east."""
+    lats = np.arange(51.70, 51.28 - 1e-9, -resolution)
+    lons = np.arange(-0.55, 0.35 + 1e-9, resolution)
+    lat_g, lon_g = np.meshgrid(lats, lons, indexing="ij")
+    base = get_mock_hourly_weather(
+        {"event_type": event_type, "start_date": start_date, "duration_hours": hours}, "London"
+    )
+
+    # Central London runs up to ~1.5°C hotter than the outskirts
+    heat_island = 1.5 * np.exp(-((lat_g - 51.51) ** 2 + (lon_g + 0.12) ** 2) / (2 * 0.08 ** 2))
+    temp = base.temp_celsius[:, None, None] - 1.0 + heat_island[None]
+
+    # Rain cell centre drifts west -> east across the event
+    t = np.arange(hours)[:, None, None]
+    centre_lon = -0.55 + 0.9 * t / max(hours - 1, 1)
+    cell = np.exp(-((lat_g[None] - 51.5) ** 2 + (lon_g[None] - centre_lon) ** 2) / (2 * 0.15 ** 2))
+    rain = base.rainfall_mm[:, None, None] * 1.6 * cell
+
+    write_grid(directory, start_date, float(lats[0]), -resolution, float(lons[0]), resolution,
+               {"temp_celsius": temp, "rainfall_mm": rain})
+    end = parse_start_date(start_date) + timedelta(hours=hours)
+    print(f"Wrote {hours}h x {len(lats)} x {len(lons)} grid to {directory} (until {end.isoformat()})")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        print(__doc__)
+        sys.exit(1)
+    synthesize_london_grid(Path(sys.argv[1]), sys.argv[2], sys.argv[3], int(sys.argv[4]))